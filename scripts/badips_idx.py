@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Compiled lookup artifact (`data/badips.idx`) for "is this IP bad, and how
+bad" checks without SQLite.
+
+File layout (little-endian). Sections follow the header in this order, and
+each one starts on an 8-byte boundary:
+
+    header   "<8sI6I": magic b"BADIPIDX", format version, then the counts
+             n4, n6 (addresses) and m4, m6 (network intervals), 2 reserved
+    v4 keys  n4 x uint32, ascending
+    v4 sev   n4 x uint8, parallel to the v4 keys
+    v6 keys  n6 x 16-byte big-endian address, ascending
+    v6 sev   n6 x uint8
+    net4     m4 x uint32 start, m4 x uint32 end, m4 x uint8 severity
+    net6     m6 x 16-byte start, m6 x 16-byte end, m6 x uint8 severity
+
+Network intervals are disjoint and ascending: nested CIDR blocks are split
+into segments that carry the highest severity covering them. Readers `mmap`
+the file and binary-search the arrays in place, so opening is constant time
+and every process shares the same pages.
+"""
+import mmap
+import socket
+import sqlite3
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from ipkeys import V4_MAPPED_PREFIX, ip_to_key
+
+IDX_PATH = Path("data/badips.idx")
+MAGIC = b"BADIPIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sI6I")
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _disjoint(intervals):
+    """Split possibly nested (start, end, severity) intervals into disjoint,
+    ascending segments carrying the highest covering severity."""
+    events = {}
+    for start, end, severity in intervals:
+        events.setdefault(start, []).append((1, severity))
+        events.setdefault(end + 1, []).append((-1, severity))
+    active = {}
+    segments = []
+    points = sorted(events)
+    for point, next_point in zip(points, points[1:] + [None]):
+        for delta, severity in events[point]:
+            active[severity] = active.get(severity, 0) + delta
+            if not active[severity]:
+                del active[severity]
+        if active and next_point is not None:
+            severity = max(active)
+            if (
+                segments
+                and segments[-1][1] == point - 1
+                and segments[-1][2] == severity
+            ):
+                segments[-1] = (segments[-1][0], next_point - 1, severity)
+            else:
+                segments.append((point, next_point - 1, severity))
+    return segments
+
+
+def write_index(conn, path=IDX_PATH):
+    """Compile `bad_ips` and `bad_networks` from `conn` into `path`.
+
+    The file is written next to `path` and renamed into place, so readers
+    never see a partial index. Returns the file size in bytes.
+    """
+    v4, v6 = [], []
+    for key, severity in conn.execute(
+        "SELECT ip_key, severity FROM bad_ips WHERE ip_key IS NOT NULL ORDER BY ip_key"
+    ):
+        key = bytes(key)
+        if key.startswith(V4_MAPPED_PREFIX):
+            v4.append((int.from_bytes(key[12:], "big"), severity or 0))
+        else:
+            v6.append((key, severity or 0))
+
+    nets4, nets6 = [], []
+    try:
+        rows = conn.execute("SELECT start_key, end_key, severity FROM bad_networks")
+        for start, end, severity in rows:
+            start, end = bytes(start), bytes(end)
+            if start.startswith(V4_MAPPED_PREFIX):
+                nets4.append(
+                    (
+                        int.from_bytes(start[12:], "big"),
+                        int.from_bytes(end[12:], "big"),
+                        severity or 0,
+                    )
+                )
+            else:
+                nets6.append(
+                    (
+                        int.from_bytes(start, "big"),
+                        int.from_bytes(end, "big"),
+                        severity or 0,
+                    )
+                )
+    except sqlite3.OperationalError:
+        pass  # database predates the bad_networks table
+    nets4, nets6 = _disjoint(nets4), _disjoint(nets6)
+
+    sections = [
+        struct.pack(f"<{len(v4)}I", *(k for k, _ in v4)),
+        bytes(s for _, s in v4),
+        b"".join(k for k, _ in v6),
+        bytes(s for _, s in v6),
+        struct.pack(f"<{len(nets4)}I", *(s for s, _, _ in nets4)),
+        struct.pack(f"<{len(nets4)}I", *(e for _, e, _ in nets4)),
+        bytes(sev for _, _, sev in nets4),
+        b"".join(s.to_bytes(16, "big") for s, _, _ in nets6),
+        b"".join(e.to_bytes(16, "big") for _, e, _ in nets6),
+        bytes(sev for _, _, sev in nets6),
+    ]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(
+            HEADER.pack(MAGIC, VERSION, len(v4), len(v6), len(nets4), len(nets6), 0, 0)
+        )
+        f.write(b"\0" * _pad(HEADER.size))
+        for data in sections:
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+    tmp.replace(path)
+    return path.stat().st_size
+
+
+class _Keys16:
+    """Sequence view of packed 16-byte keys, for `bisect`."""
+
+    def __init__(self, view, count):
+        self.view = view
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return bytes(self.view[i * 16 : i * 16 + 16])
+
+
+class BadIpIndex:
+    """Memory-mapped reader for `badips.idx`.
+
+    `severity(ip)` returns the listed severity of an address (or of the
+    most severe listed network covering it), or None if the address is not
+    listed. Nothing is parsed or copied on open.
+    """
+
+    def __init__(self, path=IDX_PATH):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        magic, version, n4, n6, m4, m6, _, _ = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} badips index")
+        self._views = [view]
+        offset = HEADER.size + _pad(HEADER.size)
+
+        def take(size):
+            nonlocal offset
+            section = view[offset : offset + size]
+            offset += size + _pad(size)
+            self._views.append(section)
+            return section
+
+        self.v4_keys = self._uint32(take(4 * n4))
+        self.v4_sev = take(n4)
+        self.v6_keys = _Keys16(take(16 * n6), n6)
+        self.v6_sev = take(n6)
+        self.net4_start = self._uint32(take(4 * m4))
+        self.net4_end = self._uint32(take(4 * m4))
+        self.net4_sev = take(m4)
+        self.net6_start = _Keys16(take(16 * m6), m6)
+        self.net6_end = _Keys16(take(16 * m6), m6)
+        self.net6_sev = take(m6)
+
+    def _uint32(self, section):
+        if sys.byteorder == "little":
+            section = section.cast("I")
+            self._views.append(section)
+            return section
+        # Big-endian hosts cannot cast in place; decode a copy instead
+        return [v for (v,) in struct.iter_unpack("<I", section)]
+
+    def __len__(self):
+        return len(self.v4_keys) + len(self.v6_keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, ip):
+        return self.severity(ip) is not None
+
+    def severity(self, ip):
+        """Return the severity for `ip`, or None if it is not listed."""
+        try:
+            packed = socket.inet_pton(socket.AF_INET, ip)
+        except OSError:
+            key = ip_to_key(ip)
+            if key is None:
+                raise ValueError(f"invalid address: {ip}") from None
+            return self._lookup(
+                key,
+                self.v6_keys,
+                self.v6_sev,
+                self.net6_start,
+                self.net6_end,
+                self.net6_sev,
+            )
+        return self._lookup(
+            int.from_bytes(packed, "big"),
+            self.v4_keys,
+            self.v4_sev,
+            self.net4_start,
+            self.net4_end,
+            self.net4_sev,
+        )
+
+    @staticmethod
+    def _lookup(key, keys, sev, starts, ends, net_sev):
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return sev[i]
+        j = bisect_right(starts, key) - 1
+        if j >= 0 and ends[j] >= key:
+            return net_sev[j]
+        return None
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mm.close()
@@ -0,0 +1,1069 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the bad IP pipeline. Every benchmark builds synthetic data in
+a temporary directory and bypasses the persistent geolocation cache, so
+nothing under `data/` or `.cache/` is touched.
+
+Usage:
+  python scripts/benchmarks.py ingest [N ...]   - bulk upsert vs per-row INSERT
+  python scripts/benchmarks.py fetch            - sequential vs concurrent fetch
+  python scripts/benchmarks.py parse [N ...]    - in-memory vs streaming vs adapter parsing
+  python scripts/benchmarks.py geoip CITY.mmdb [ASN.mmdb] [N] [WORKERS]
+                                                - per-IP vs bulk GeoIP enrichment
+  python scripts/benchmarks.py geoapi [N]       - async batch API fallback vs mock server
+  python scripts/benchmarks.py search [N] [M]   - per-IP queries vs in-memory index
+  python scripts/benchmarks.py idx [N] [WORKERS] - badips.idx open time and lookups/sec
+  python scripts/benchmarks.py bloom [N] [FP]   - Bloom filter size, false positives, queries/sec
+  python scripts/benchmarks.py export [N ...]   - pandas/fetchall vs streaming export memory
+  python scripts/benchmarks.py columnar [N]     - CSV vs Parquet/Arrow size and load time
+  python scripts/benchmarks.py firewall [N]     - CIDR aggregation vs ipaddress.collapse_addresses
+  python scripts/benchmarks.py server [N] [M]   - lookup server requests/sec, latency, hot reload
+  python scripts/benchmarks.py charts [N]       - per-chart queries vs one aggregate pass
+  python scripts/benchmarks.py render [N] [WORKERS]
+                                                - sequential vs process-pool chart rendering
+  python scripts/benchmarks.py rollups [N]      - trigger-maintained rollups: ingest cost, stats time
+  python scripts/benchmarks.py sqlite [N] [BATCHES]
+                                                - default vs tuned connections: ingest and chart load
+  python scripts/benchmarks.py imports [RUNS]   - generate_visualizations import time vs baseline
+  python scripts/benchmarks.py indexes [N] [BATCHES]
+                                                - v5 vs v6 query indexes: ingest and query time
+"""
+
+import csv
+import gzip
+import http.client
+import ipaddress
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import random
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import badips_idx
+import bloom
+import chart_data
+import columnar
+import db
+import firewall_sets
+import fetch_blacklists
+import generate_visualizations
+import geo_api
+import http_cache
+import ip_index
+import lookup_server
+import process_badips
+import query_plans
+import rollups
+import stand_ins
+import utils
+from ipkeys import ip_to_key
+
+try:
+    import geoip2.database
+except ImportError:
+    geoip2 = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def synthetic_ips(n, seed=1337):
+    """Return `n` unique random IPv4 strings with a score-derived severity."""
+    rng = random.Random(seed)
+    seen = set()
+    while len(seen) < n:
+        seen.update(rng.getrandbits(32) for _ in range(n - len(seen)))
+    return [
+        (f"{v >> 24}.{(v >> 16) & 255}.{(v >> 8) & 255}.{v & 255}", rng.randint(1, 5))
+        for v in seen
+    ]
+
+
+def _legacy_insert(conn, ips):
+    """Row-by-row INSERT with UPDATE fallback (pre bulk-upsert behaviour)."""
+    cursor = conn.cursor()
+    inserted = 0
+    for ip, severity in ips:
+        try:
+            cursor.execute(
+                "INSERT INTO bad_ips (ip_address, severity) VALUES (?, ?)",
+                (ip, severity),
+            )
+            inserted += 1
+        except sqlite3.IntegrityError:
+            cursor.execute(
+                """
+                UPDATE bad_ips
+                SET threat_count = threat_count + 1,
+                    last_updated = CURRENT_TIMESTAMP
+                WHERE ip_address = ?
+            """,
+                (ip,),
+            )
+    conn.commit()
+    return inserted
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_ingest(sizes):
+    """Compare legacy and bulk ingestion on a fresh DB and on a re-run."""
+    print(f"{'rows':>10} {'path':>8} {'fresh rows/s':>14} {'re-run rows/s':>14}")
+    for n in sizes:
+        ips = synthetic_ips(n)
+        paths = (
+            ("legacy", _legacy_insert),
+            ("bulk", process_badips.insert_ips_to_database),
+        )
+        for label, func in paths:
+            with tempfile.TemporaryDirectory() as tmp:
+                conn = process_badips.create_database(Path(tmp) / "bench.db")
+                fresh = _timed(func, conn, ips)
+                rerun = _timed(func, conn, ips)
+                conn.close()
+            print(f"{n:>10,} {label:>8} {n / fresh:>14,.0f} {n / rerun:>14,.0f}")
+
+
+def _canned_blocklist(n, seed):
+    lines = ["# synthetic blocklist"]
+    lines += [f"{ip}\t{sev}" for ip, sev in synthetic_ips(n, seed=seed)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def bench_fetch():
+    """Fetch canned lists with injected latency sequentially, concurrently, and
+    concurrently again against the conditional-GET cache."""
+    routes = {
+        "/ipsum.txt": (_canned_blocklist(50_000, 1), 1.0),
+        "/drop.txt": (b"1.10.16.0/22 ; SBL256894\n", 0.5),
+        "/emerging.txt": (_canned_blocklist(2_000, 2), 1.5),
+        "/missing.txt": (None, 0.2),
+        "/stalled.txt": (b"9.9.9.9\n", 5.0),
+    }
+    with tempfile.TemporaryDirectory() as tmp, stand_ins.local_http_server(
+        routes
+    ) as base:
+        http_cache.CACHE_DIR = Path(tmp)
+        sources = [(path.strip("/"), base + path) for path in routes]
+
+        start = time.perf_counter()
+        for _, url in sources:
+            fetch_blacklists.fetch_url(url, timeout=3)
+        sequential = time.perf_counter() - start
+
+        # Drop validators so the concurrent run downloads full bodies again
+        for path in Path(tmp).glob("*.json"):
+            path.unlink()
+        start = time.perf_counter()
+        results = fetch_blacklists.fetch_all(sources, deadline=3)
+        concurrent = time.perf_counter() - start
+
+        revalidated = fetch_blacklists.fetch_all(sources, deadline=3)
+
+    print(f"{'source':<14} {'ok':>5} {'seconds':>8} {'bytes':>10} {'304':>5}")
+    for r, again in zip(results, revalidated):
+        print(
+            f"{r['name']:<14} {str(r['ok']):>5} {r['seconds']:>8.2f}"
+            f" {r['bytes']:>10,} {str(again['unchanged']):>5}"
+        )
+    print(f"sequential: {sequential:.2f}s  concurrent (3s deadline): {concurrent:.2f}s")
+
+
+def _legacy_parse(body_path, src_path):
+    """Whole-text regex + `ipaddress` validation + sorted write (pre-streaming)."""
+    text = Path(body_path).read_text(encoding="utf-8")
+    ips = set()
+    for m in fetch_blacklists.IPV4_RE.finditer(text):
+        try:
+            ipaddress.ip_address(m.group(0))
+            ips.add(m.group(0))
+        except ValueError:
+            continue
+    with open(src_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["ip", "collected_at", "source"])
+        for ip in sorted(ips):
+            w.writerow([ip, "now", "bench"])
+
+
+def _stream_parse(body_path, src_path, fmt="text"):
+    fetch_blacklists.stream_source(
+        "bench",
+        fetch_blacklists.iter_lines(body_path),
+        Path(src_path),
+        Path(str(src_path) + ".networks"),
+        fmt,
+    )
+
+
+def _ipsum_parse(body_path, src_path):
+    _stream_parse(body_path, src_path, "ipsum")
+
+
+def bench_parse(sizes):
+    """Throughput and peak traced memory of list parsing at several sizes."""
+    print(f"{'lines':>10} {'path':>8} {'lines/s':>12} {'peak MiB':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            body = Path(tmp) / "list.txt"
+            with open(body, "w", encoding="utf-8") as f:
+                f.write("# synthetic ipsum-style list\n")
+                for ip, sev in synthetic_ips(n):
+                    f.write(f"{ip}\t{sev}\n")
+            out = Path(tmp) / "out.csv"
+            paths = (
+                ("legacy", _legacy_parse),
+                ("stream", _stream_parse),
+                ("ipsum", _ipsum_parse),
+            )
+            for label, func in paths:
+                elapsed = _timed(func, body, out)
+                tracemalloc.start()
+                func(body, out)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(
+                    f"{n:>10,} {label:>8} {n / elapsed:>12,.0f} {peak / 2**20:>10.1f}"
+                )
+
+
+def _legacy_enrich(conn, city_db_path, asn_db_path):
+    """Per-IP `Reader.city()`/`Reader.asn()` and one INSERT per row (pre-bulk)."""
+    reader_city = geoip2.database.Reader(city_db_path)
+    reader_asn = geoip2.database.Reader(asn_db_path) if asn_db_path else None
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT bi.ip_address FROM bad_ips bi
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE ig.ip_key IS NULL
+    """
+    )
+    for (ip,) in cursor.fetchall():
+        try:
+            ipaddress.ip_address(ip)
+            response = reader_city.city(ip)
+            asn_val = None
+            if reader_asn:
+                try:
+                    asn_val = f"AS{reader_asn.asn(ip).autonomous_system_number}"
+                except Exception:  # pylint: disable=broad-exception-caught
+                    asn_val = None
+            cursor.execute(
+                """
+                INSERT INTO ip_geolocation
+                (ip_address, country, city, latitude, longitude, asn, ip_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    ip,
+                    response.country.iso_code,
+                    response.city.name,
+                    response.location.latitude,
+                    response.location.longitude,
+                    asn_val,
+                    ip_to_key(ip),
+                ),
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            continue
+    conn.commit()
+    reader_city.close()
+    if reader_asn:
+        reader_asn.close()
+
+
+def bench_geoip(city_db_path, asn_db_path=None, n=200_000, workers=4):
+    """IPs/sec of per-IP vs bulk enrichment against real mmdb files."""
+    paths = [("legacy", _legacy_enrich)] if geoip2 else []
+    for w in sorted({1, workers}):
+        paths.append(
+            (
+                f"bulk x{w}",
+                lambda conn, c, a, w=w: process_badips.enrich_geolocation_data_from_db(
+                    conn, c, a, workers=w, use_cache=False
+                ),
+            )
+        )
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = process_badips.create_database(Path(tmp) / "bench.db")
+        process_badips.insert_ips_to_database(conn, synthetic_ips(n))
+        results = []
+        for label, func in paths:
+            conn.execute("DELETE FROM ip_geolocation")
+            conn.commit()
+            elapsed = _timed(func, conn, city_db_path, asn_db_path)
+            rows = conn.execute("SELECT COUNT(*) FROM ip_geolocation").fetchone()[0]
+            results.append((label, elapsed, rows))
+        conn.close()
+    print(f"{'path':>10} {'IPs/s':>12} {'rows':>10}")
+    for label, elapsed, rows in results:
+        print(f"{label:>10} {n / elapsed:>12,.0f} {rows:>10,}")
+
+
+def bench_geoapi(n=3000):
+    """Enrich `n` IPs through the async batch client against a mock ip-api
+    that allows 15 requests/second, in two resumable runs of n/2."""
+    config = stand_ins.geo_api_config(rate=15, window=1.0, delay=0.2)
+    ips = synthetic_ips(n)
+    geo_api.RATE_PER_MINUTE = config["rate"] * 60
+    with tempfile.TemporaryDirectory() as tmp, stand_ins.local_http_server(
+        config, stand_ins.GeoApiHandler
+    ) as base:
+        conn = process_badips.create_database(Path(tmp) / "bench.db")
+        process_badips.insert_ips_to_database(conn, ips)
+        start = time.perf_counter()
+        for _ in range(2):
+            process_badips.enrich_geolocation_data(
+                conn, limit=-(-n // 2), url=base + "/batch", use_cache=False
+            )
+        elapsed = time.perf_counter() - start
+        rows = conn.execute("SELECT COUNT(*) FROM ip_geolocation").fetchone()[0]
+        conn.close()
+    print(
+        f"{n:,} IPs in {elapsed:.2f}s ({n / elapsed:,.0f} IPs/s), {rows:,} rows,"
+        f" {config['requests']} requests, {config['limited']} rate-limited"
+    )
+
+
+_BENCH_NETWORKS = [
+    ("1.10.16.0/22", 5, "bench"),
+    ("45.148.0.0/16", 4, "bench"),
+    ("103.0.0.0/8", 3, "bench"),
+]
+
+
+def _build_bench_db(path, n):
+    """Create a database with `n` synthetic bad IPs and a few networks."""
+    conn = process_badips.create_database(path)
+    process_badips.insert_ips_to_database(conn, synthetic_ips(n))
+    process_badips.insert_networks_to_database(conn, _BENCH_NETWORKS)
+    return conn
+
+
+def _per_ip_queries(db_path, ips):
+    """The `search_ip` path: a connection, a JOIN and a network probe per IP."""
+    for ip in ips:
+        conn = sqlite3.connect(str(db_path))
+        cursor = conn.cursor()
+        key = ip_to_key(ip)
+        cursor.execute(
+            """
+            SELECT bi.ip_address, bi.severity, bi.threat_count,
+                   ig.country, ig.city, ig.asn
+            FROM bad_ips bi
+            LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+            WHERE bi.ip_key = ?
+        """,
+            (key,),
+        )
+        cursor.fetchone()
+        utils.find_covering_networks(cursor, key)
+        conn.close()
+
+
+def bench_search(n=400_000, m=1_000_000):
+    """Lookups/sec for `m` input lines (half listed) against `n` bad IPs."""
+    listed = [ip for ip, _ in synthetic_ips(n)]
+    clean = [ip for ip, _ in synthetic_ips(m - m // 2, seed=7)]
+    lines = [
+        f"{ip}\n" for pair in zip(listed * (m // len(listed) + 1), clean) for ip in pair
+    ]
+    lines = lines[:m]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _build_bench_db(db_path, n).close()
+
+        sample = [line.strip() for line in lines[:20_000]]
+        per_ip = _timed(_per_ip_queries, db_path, sample)
+
+        start = time.perf_counter()
+        conn = sqlite3.connect(str(db_path))
+        index = ip_index.IpIndex.from_db(conn)
+        conn.close()
+        load = time.perf_counter() - start
+        matches = []
+        checked, matched, _, seconds = ip_index.scan(index, lines, matches.append)
+
+    print(f"{'path':>10} {'lines':>10} {'lookups/s':>12}")
+    print(f"{'per-IP':>10} {len(sample):>10,} {len(sample) / per_ip:>12,.0f}")
+    print(f"{'index':>10} {checked:>10,} {checked / seconds:>12,.0f}")
+    print(f"index load: {load:.2f}s for {n:,} IPs, {matched:,} matches")
+
+
+def _idx_worker(args):
+    """Open the index and probe `probes` (or `count` random addresses);
+    returns (open seconds, lookup seconds, lookups, hits)."""
+    path, probes, seed, count = args
+    if probes is None:
+        rng = random.Random(seed)
+        probes = [int_to_ip(rng.getrandbits(32)) for _ in range(count)]
+    start = time.perf_counter()
+    with badips_idx.BadIpIndex(path) as index:
+        opened = time.perf_counter() - start
+        start = time.perf_counter()
+        hits = sum(1 for ip in probes if index.severity(ip) is not None)
+    return opened, time.perf_counter() - start, len(probes), hits
+
+
+def int_to_ip(value):
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def bench_idx(n=400_000, workers=4):
+    """Build badips.idx for `n` IPs; time opening it, probing 1M addresses
+    (half listed) in one process, and probing from `workers` processes that
+    map the same file at once."""
+    listed = [ip for ip, _ in synthetic_ips(n)]
+    probes = (listed * (500_000 // n + 1))[:500_000]
+    probes += [ip for ip, _ in synthetic_ips(500_000, seed=11)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _build_bench_db(Path(tmp) / "bench.db", n)
+        path = Path(tmp) / "badips.idx"
+        build = _timed(badips_idx.write_index, conn, path)
+        conn.close()
+        size = os.path.getsize(path)
+
+        opens = []
+        for _ in range(5):
+            start = time.perf_counter()
+            badips_idx.BadIpIndex(path).close()
+            opens.append(time.perf_counter() - start)
+
+        _, single, lookups, hits = _idx_worker((path, probes, None, 0))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [(path, None, seed, 250_000) for seed in range(workers)]
+            results = list(executor.map(_idx_worker, jobs))
+
+    print(f"build: {build:.2f}s, {size / 1024:,.0f} KB for {n:,} IPs")
+    print(
+        f"open: best {min(opens) * 1000:.3f} ms, median {sorted(opens)[2] * 1000:.3f} ms"
+    )
+    print(f"1 process: {lookups / single:,.0f} lookups/s ({hits:,} of {lookups:,} hit)")
+    print(
+        f"{workers} processes sharing the mapping:"
+        f" {sum(r[2] / r[1] for r in results):,.0f} lookups/s combined,"
+        f" worker open max {max(r[0] for r in results) * 1000:.3f} ms"
+    )
+
+
+def bench_bloom(n=400_000, fp_rate=0.01, m=1_000_000):
+    """Export a Bloom filter for `n` bad IPs and query `m` random addresses:
+    measured false-positive rate against the target, and queries/sec."""
+    listed = {ip for ip, _ in synthetic_ips(n)}
+    networks = [ipaddress.ip_network(cidr) for cidr, _, _ in _BENCH_NETWORKS]
+    rng = random.Random(23)
+    probes, covered = [], []
+    while len(probes) < m:
+        value = rng.getrandbits(32)
+        ip = int_to_ip(value)
+        if any(ipaddress.ip_address(value) in net for net in networks):
+            covered.append(ip)
+        elif ip not in listed:
+            probes.append(ip)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _build_bench_db(Path(tmp) / "bench.db", n)
+        start = time.perf_counter()
+        bf = bloom.build_from_db(conn, fp_rate)
+        size = bf.save(Path(tmp) / "bad_ips.bloom")
+        build = time.perf_counter() - start
+        conn.close()
+        bf = bloom.BloomFilter.load(Path(tmp) / "bad_ips.bloom")
+
+    missed = sum(1 for ip in listed if ip not in bf)
+    missed += sum(1 for ip in covered if ip not in bf)
+    start = time.perf_counter()
+    false_positives = sum(1 for ip in probes if ip in bf)
+    seconds = time.perf_counter() - start
+
+    print(
+        f"build: {build:.2f}s, {size / 1024:,.0f} KB for {n:,} IPs and"
+        f" {len(networks)} networks (k={bf.k}, {len(bf.prefix_lens)} prefix lengths)"
+    )
+    print(f"false negatives: {missed} ({len(covered):,} network-covered IPs checked)")
+    print(
+        f"false positives: {false_positives:,} of {m:,} clean IPs"
+        f" ({false_positives / m:.4%}, target {fp_rate:.4%})"
+    )
+    print(f"queries: {m / seconds:,.0f}/s")
+
+
+def _legacy_export(conn, out_dir):
+    """pandas DataFrame to CSV, then fetchall + json.dump(indent=2)."""
+    query, _ = utils.export_query()
+    pd.read_sql_query(query, conn).to_csv(out_dir / "export.csv", index=False)
+    cursor = conn.execute(query)
+    columns = [description[0] for description in cursor.description]
+    data = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    with open(out_dir / "export.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def _stream_export(conn, out_dir):
+    """The streaming exporter: CSV plus gzipped JSONL."""
+    with open(out_dir / "export.csv", "w", encoding="utf-8", newline="") as f:
+        utils.write_export(utils.iter_export_rows(conn), f, "csv")
+    with gzip.open(
+        out_dir / "export.jsonl.gz", "wt", encoding="utf-8", compresslevel=6
+    ) as f:
+        utils.write_export(utils.iter_export_rows(conn), f, "jsonl")
+
+
+def bench_export(sizes, legacy_max=1_000_000):
+    """Time and peak traced memory of exporting `bad_ips` at several sizes.
+
+    The pandas/fetchall path is skipped above `legacy_max` rows, where it
+    needs several GB.
+    """
+    print(f"{'rows':>10} {'path':>8} {'seconds':>9} {'peak MiB':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            conn = _build_bench_db(tmp / "bench.db", n)
+            paths = [("stream", _stream_export)]
+            if pd is None:
+                print("pandas not installed; skipping the legacy export")
+            elif n <= legacy_max:
+                paths.insert(0, ("legacy", _legacy_export))
+            for label, func in paths:
+                elapsed = _timed(func, conn, tmp)
+                tracemalloc.start()
+                func(conn, tmp)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{n:>10,} {label:>8} {elapsed:>9.2f} {peak / 2**20:>10.1f}")
+            conn.close()
+
+
+def _read_csv(path):
+    if pd is not None:
+        return pd.read_csv(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def bench_columnar(n=400_000):
+    """Export `n` rows as CSV, Parquet and Arrow IPC; compare file size,
+    write time and the time to load each one back."""
+    if columnar.pa is None:
+        print("pyarrow not installed; run: pip install pyarrow")
+        return
+    countries = ["US", "CN", "RU", "DE", "NL", "BR", "IN", "FR", None]
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        conn = _build_bench_db(tmp / "bench.db", n)
+        rng = random.Random(5)
+        conn.executemany(
+            "INSERT INTO ip_geolocation (ip_address, ip_key, country, city, asn)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                (ip, key, rng.choice(countries), None, f"AS{rng.randint(1, 5000)}")
+                for ip, key in conn.execute("SELECT ip_address, ip_key FROM bad_ips")
+            ),
+        )
+        conn.commit()
+
+        def write_csv(path):
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                utils.write_export(utils.iter_export_rows(conn), f, "csv")
+
+        def write_columnar(path):
+            fmt = "parquet" if path.suffix == ".parquet" else "arrow"
+            columnar.write_snapshot(utils.iter_export_rows(conn), path, fmt)
+
+        print(f"{'format':>8} {'MiB':>8} {'write s':>8} {'load ms':>8}")
+        for name, write, load in (
+            ("csv", write_csv, _read_csv),
+            ("parquet", write_columnar, columnar.load_snapshot),
+            ("arrow", write_columnar, columnar.load_snapshot),
+        ):
+            path = tmp / f"export.{name}"
+            written = _timed(write, path)
+            loaded = min(_timed(load, path) for _ in range(3))
+            size = path.stat().st_size / 2**20
+            print(f"{name:>8} {size:>8.1f} {written:>8.2f} {loaded * 1000:>8.1f}")
+        conn.close()
+
+
+def bench_firewall(n=400_000, dense_blocks=500):
+    """Aggregate `n` random bad IPs plus `dense_blocks` fully listed /24s and
+    the bench networks into CIDRs; compare against
+    `ipaddress.collapse_addresses` on the same input."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _build_bench_db(Path(tmp) / "bench.db", n)
+        rng = random.Random(3)
+        dense = []
+        for _ in range(dense_blocks):
+            base = rng.getrandbits(24) << 8
+            dense.extend((int_to_ip(base + i), 4) for i in range(256))
+        process_badips.insert_ips_to_database(conn, dense)
+
+        start = time.perf_counter()
+        cidrs, entries = firewall_sets.aggregate(conn)
+        ours = time.perf_counter() - start
+
+        start = time.perf_counter()
+        networks = [
+            ipaddress.ip_network(ip)
+            for (ip,) in conn.execute("SELECT ip_address FROM bad_ips")
+        ]
+        networks += [
+            ipaddress.ip_network(net)
+            for (net,) in conn.execute("SELECT network FROM bad_networks")
+        ]
+        expected = list(ipaddress.collapse_addresses(networks))
+        stdlib = time.perf_counter() - start
+        conn.close()
+
+    got = [
+        ipaddress.ip_network(firewall_sets.format_cidr(net, plen, 32))
+        for net, plen in cidrs[32]
+    ]
+    total = len(cidrs[32]) + len(cidrs[128])
+    print(f"input entries: {entries:,}  CIDRs: {total:,}  saved: {entries - total:,}")
+    print(f"aggregate: {ours:.2f}s  collapse_addresses: {stdlib:.2f}s")
+    print(f"matches collapse_addresses: {got == expected}")
+
+
+def _server_client(port, paths):
+    """GET every path over one keep-alive connection; returns latencies."""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        conn.request("GET", path)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+
+def bench_server(n=400_000, m=20_000, clients=4):
+    """Start the lookup server on localhost over `n` bad IPs; measure `m`
+    GET /ip requests from `clients` threads, POST /bulk throughput, and how
+    long a database change takes to show up."""
+    listed = [ip for ip, _ in synthetic_ips(n)]
+    clean = [ip for ip, _ in synthetic_ips(m // 2, seed=9)]
+    paths = [f"/ip/{ip}" for pair in zip(listed, clean) for ip in pair][:m]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        conn = _build_bench_db(db_path, n)
+        start = time.perf_counter()
+        server = lookup_server.LookupServer(
+            ("127.0.0.1", 0), db_path, reload_interval=0.2
+        )
+        load = time.perf_counter() - start
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            chunks = [paths[i::clients] for i in range(clients)]
+            results = []
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(
+                    target=lambda c=c: results.append(_server_client(port, c))
+                )
+                for c in chunks
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            latencies = sorted(x for r in results for x in r)
+
+            client = http.client.HTTPConnection("127.0.0.1", port)
+            batch = json.dumps(listed[:5000] + clean[:5000])
+            start = time.perf_counter()
+            for _ in range(10):
+                client.request("POST", "/bulk", body=batch)
+                client.getresponse().read()
+            bulk = time.perf_counter() - start
+
+            process_badips.insert_ips_to_database(conn, [("198.51.100.77", 5)])
+            start = time.perf_counter()
+            while True:
+                client.request("GET", "/ip/198.51.100.77")
+                if json.loads(client.getresponse().read()).get("listed"):
+                    break
+                time.sleep(0.01)
+            reload = time.perf_counter() - start
+            client.request("GET", "/metrics")
+            metrics = json.loads(client.getresponse().read())
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            conn.close()
+
+    print(f"index load: {load:.2f}s for {n:,} IPs")
+    print(
+        f"GET /ip: {len(latencies) / elapsed:,.0f} req/s with {clients} clients,"
+        f" p50 {latencies[len(latencies) // 2] * 1000:.2f} ms,"
+        f" p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms"
+    )
+    print(f"POST /bulk: {100_000 / bulk:,.0f} lookups/s (10 x 10,000 IPs)")
+    print(f"hot reload: new IP visible after {reload:.2f}s")
+    print(f"server-side /ip histogram: {metrics['/ip']['buckets']}")
+
+
+def _build_geo_db(path, n):
+    """`_build_bench_db` plus a geolocation row (country, city, ASN and
+    coordinates) for every IP."""
+    conn = _build_bench_db(path, n)
+    _add_geo_rows(conn)
+    return conn
+
+
+def _add_geo_rows(conn):
+    rng = random.Random(17)
+    countries = [f"C{i:03d}" for i in range(150)]
+    conn.executemany(
+        "INSERT INTO ip_geolocation"
+        " (ip_address, ip_key, country, city, latitude, longitude, asn)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                ip,
+                key,
+                rng.choice(countries),
+                f"City{rng.randrange(2000)}",
+                rng.uniform(-60, 60),
+                rng.uniform(-170, 170),
+                f"AS{rng.randrange(5000)}",
+            )
+            for ip, key in conn.execute("SELECT ip_address, ip_key FROM bad_ips")
+        ),
+    )
+    conn.commit()
+
+
+_TOP_COUNTRIES = (
+    "SELECT country, COUNT(*) c FROM ip_geolocation WHERE country IS NOT NULL"
+    " GROUP BY country ORDER BY c DESC LIMIT {}"
+)
+_TOP_CITIES = (
+    "SELECT city, country, COUNT(*) c FROM ip_geolocation WHERE city IS NOT NULL"
+    " AND country IS NOT NULL GROUP BY city, country ORDER BY c DESC LIMIT {}"
+)
+# The queries each chart function used to run on its own connection
+_LEGACY_CHART_QUERIES = {
+    "get_statistics": [
+        "SELECT COUNT(*) FROM bad_ips",
+        "SELECT COUNT(DISTINCT country) FROM ip_geolocation"
+        " WHERE country IS NOT NULL",
+        _TOP_COUNTRIES.format(15),
+        _TOP_CITIES.format(10),
+        "SELECT AVG(severity), MAX(severity), MIN(severity) FROM bad_ips",
+    ],
+    "create_steampunk_dashboard": [
+        "SELECT severity, COUNT(*) FROM bad_ips GROUP BY severity ORDER BY severity",
+        _TOP_COUNTRIES.format(12),
+        "SELECT COALESCE(asn, 'AS-Unknown'), COUNT(*) c FROM ip_geolocation"
+        " GROUP BY asn ORDER BY c DESC LIMIT 10",
+        _TOP_CITIES.format(15),
+    ],
+    "create_cyber_attack_origins_dashboard": [
+        _TOP_COUNTRIES.format(15),
+        "SELECT g.country, b.severity, COUNT(*) FROM ip_geolocation g"
+        " JOIN bad_ips b ON b.ip_key = g.ip_key WHERE g.country IN ("
+        " SELECT country FROM ip_geolocation WHERE country IS NOT NULL"
+        " GROUP BY country ORDER BY COUNT(*) DESC LIMIT 5)"
+        " GROUP BY g.country, b.severity ORDER BY g.country, b.severity",
+        "SELECT COUNT(*) FROM ip_geolocation WHERE country IS NOT NULL",
+    ],
+    "create_geo_map": [_TOP_COUNTRIES.format(20)],
+    "create_world_pins_map": [
+        "SELECT country, AVG(latitude), AVG(longitude), COUNT(*) c"
+        " FROM ip_geolocation WHERE country IS NOT NULL AND latitude IS NOT NULL"
+        " AND longitude IS NOT NULL GROUP BY country ORDER BY c DESC"
+    ],
+}
+
+
+def _legacy_chart_queries(db_path):
+    """One connection per chart function, as before the aggregate layer."""
+    for queries in _LEGACY_CHART_QUERIES.values():
+        conn = sqlite3.connect(str(db_path))
+        for query in queries:
+            conn.execute(query).fetchall()
+        conn.close()
+
+
+def bench_charts(n=395_000):
+    """Statements and time to gather chart inputs for `n` geolocated IPs."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _build_geo_db(db_path, n).close()
+        legacy = min(_timed(_legacy_chart_queries, db_path) for _ in range(3))
+        aggregate = min(_timed(chart_data.load, db_path) for _ in range(3))
+
+    print(f"{'path':>10} {'queries':>8} {'seconds':>9}")
+    queries = sum(len(q) for q in _LEGACY_CHART_QUERIES.values())
+    print(f"{'per-chart':>10} {queries:>8} {legacy:>9.2f}")
+    print(f"{'aggregate':>10} {5:>8} {aggregate:>9.2f}")
+
+
+def bench_render(n=395_000, workers=None):
+    """Wall time to render every chart from one ChartData, in-process vs a
+    process pool of `workers` (default: available cores)."""
+    workers = workers or generate_visualizations._available_cores()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _build_geo_db(db_path, n).close()
+        data = chart_data.load(db_path)
+        (Path(tmp) / "data").mkdir()
+        os.chdir(tmp)  # charts are written to data/charts
+        try:
+            timings = {}
+            for label, count in (("sequential", 1), (f"pool x{workers}", workers)):
+                start = time.perf_counter()
+                results = generate_visualizations.render_charts(data, workers=count)
+                timings[label] = (time.perf_counter() - start, results)
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n{'chart':<16}" + "".join(f"{label:>14}" for label in timings))
+    for name in generate_visualizations.CHARTS:
+        cells = []
+        for _, results in timings.values():
+            ok, seconds, _ = results[name]
+            cells.append(f"{seconds:>13.2f}s" if ok else f"{'failed':>14}")
+        print(f"{name:<16}" + "".join(cells))
+    print(f"{'wall':<16}" + "".join(f"{t:>13.2f}s" for t, _ in timings.values()))
+
+
+def _stats_from_rollups(conn):
+    """What show_stats, get_database_statistics and chart_data read."""
+    return (
+        rollups.severity_counts(conn),
+        rollups.country_counts(conn),
+        rollups.city_counts(conn, chart_data.TOP_GROUPS),
+        rollups.asn_counts(conn, chart_data.TOP_GROUPS),
+        rollups.geo_total(conn),
+    )
+
+
+def bench_rollups(n=1_000_000):
+    """Ingest throughput with and without the agg_* triggers, and the time to
+    read every statistic from the rollups vs grouping the source tables."""
+    ips = synthetic_ips(n)
+    rescored = [(ip, severity % 5 + 1) for ip, severity in ips]
+    print(
+        f"{'path':>12} {'insert/s':>10} {'rescore/s':>10} {'geo rows/s':>11}"
+        f" {'stats ms':>9}"
+    )
+    for label, triggers in (("GROUP BY", False), ("rollups", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = process_badips.create_database(Path(tmp) / "bench.db")
+            if not triggers:
+                for table in rollups.ROLLUPS:
+                    conn.execute(f"DROP TABLE {table}")
+                    for event in ("insert", "delete", "update"):
+                        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event}")
+            insert = _timed(process_badips.insert_ips_to_database, conn, ips)
+            rescore = _timed(process_badips.insert_ips_to_database, conn, rescored)
+            geo = _timed(_add_geo_rows, conn)
+            stats = min(_timed(_stats_from_rollups, conn) for _ in range(3))
+            if triggers:
+                assert not rollups.verify(conn), "rollups out of sync"
+            conn.close()
+        print(
+            f"{label:>12} {n / insert:>10,.0f} {n / rescore:>10,.0f}"
+            f" {n / geo:>11,.0f} {stats * 1000:>9.1f}"
+        )
+
+
+def _ingest_run(conn, ips, batches):
+    """The process_badips write pattern: one committed upsert per feed, then
+    geolocation for every row."""
+    size = -(-len(ips) // batches)
+    for i in range(0, len(ips), size):
+        process_badips.insert_ips_to_database(conn, ips[i : i + size])
+    _add_geo_rows(conn)
+
+
+def bench_sqlite(n=400_000, batches=20):
+    """Ingest and chart-load time with bare `sqlite3.connect` (rollback
+    journal, synchronous=FULL, 2 MiB cache) vs the db.py connections."""
+    ips = synthetic_ips(n)
+    print(f"{'connection':>11} {'ingest s':>9} {'optimize s':>11} {'chart load s':>13}")
+    for label, tuned in (("default", False), ("db.py", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "bench.db"
+            conn = process_badips.create_database(db_path)
+            if not tuned:
+                conn.execute("PRAGMA journal_mode = DELETE")
+                conn.close()
+                conn = sqlite3.connect(str(db_path))
+            ingest = _timed(_ingest_run, conn, ips, batches)
+            optimize = _timed(db.optimize, conn) if tuned else 0.0
+            conn.close()
+
+            def chart_load():
+                reader = (db.connect_readonly if tuned else sqlite3.connect)(
+                    str(db_path)
+                )
+                chart_data.aggregate(reader)
+                reader.close()
+
+            load = min(_timed(chart_load) for _ in range(3))
+        print(f"{label:>11} {ingest:>9.2f} {optimize:>11.3f} {load:>13.2f}")
+
+
+def bench_indexes(n=400_000, batches=20):
+    """Ingest time and per-query time of the shipped queries (see
+    query_plans.py) without (v5) and with (v6) the QUERY_INDEXES."""
+    ips = synthetic_ips(n)
+    ingest, timings = {}, {}
+    for label, indexed in (("v5", False), ("v6", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = process_badips.create_database(Path(tmp) / "bench.db")
+            if not indexed:
+                for name in process_badips.QUERY_INDEXES:
+                    conn.execute(f"DROP INDEX {name}")
+            ingest[label] = _timed(_ingest_run, conn, ips, batches)
+            db.optimize(conn)
+            countries = [row[0] for row in rollups.country_counts(conn)[:5]]
+            city = rollups.city_counts(conn, 1)[0][0]
+            asn = rollups.asn_counts(conn, 1)[0][0]
+            queries = query_plans.shipped_queries(countries, city, asn)
+            for name, (sql, params) in queries.items():
+                elapsed = min(
+                    _timed(lambda: conn.execute(sql, params).fetchall())
+                    for _ in range(3)
+                )
+                timings.setdefault(name, {})[label] = elapsed
+            conn.close()
+    print(f"{'ingest s':<40} {ingest['v5']:>9.2f} {ingest['v6']:>9.2f}")
+    print(f"{'query ms':<40} {'v5':>9} {'v6':>9}")
+    for name, times in timings.items():
+        print(f"{name:<40} {times['v5'] * 1000:>9.1f} {times['v6'] * 1000:>9.1f}")
+
+
+# Statement -> `python -X importtime` milliseconds when plotting backends became
+# lazy (1-CPU runner). The first row is what `import generate_visualizations`
+# cost while it imported every backend at module top.
+_IMPORT_STATEMENTS = {
+    "eager backends (old module top)": (
+        "import matplotlib.pyplot, numpy, matplotlib.patheffects,"
+        " plotly.graph_objects, chart_data"
+    ),
+    "import generate_visualizations": "import generate_visualizations",
+    "+ matplotlib backend": (
+        "import generate_visualizations as g; g.use_backend('matplotlib')"
+    ),
+    "+ plotly backend": "import generate_visualizations as g; g.use_backend('plotly')",
+}
+_IMPORT_BASELINE_MS = {
+    "eager backends (old module top)": 1310,
+    "import generate_visualizations": 120,
+    "+ matplotlib backend": 1220,
+    "+ plotly backend": 150,
+}
+
+
+def _import_ms(statement):
+    """Sum of the top-level cumulative `-X importtime` entries for
+    `statement` in a fresh interpreter, in milliseconds."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    for line in proc.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <package, indented by depth>"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            if not parts[2].startswith("  "):
+                total += int(parts[1])
+    return total / 1000
+
+
+def bench_imports(runs=5):
+    """Best-of-`runs` import time per statement, against the checked-in
+    baseline."""
+    print(f"{'statement':<34} {'ms':>9} {'baseline':>9} {'change':>8}")
+    for label, statement in _IMPORT_STATEMENTS.items():
+        ms = min(_import_ms(statement) for _ in range(runs))
+        baseline = _IMPORT_BASELINE_MS[label]
+        change = f"{(ms - baseline) / baseline:+.0%}" if baseline else "-"
+        print(f"{label:<34} {ms:>9.1f} {baseline:>9.1f} {change:>8}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        return
+
+    command = sys.argv[1].lower()
+    args = sys.argv[2:]
+
+    if command == "ingest":
+        sizes = [int(a) for a in args] or [100_000, 1_000_000, 10_000_000]
+        bench_ingest(sizes)
+    elif command == "fetch":
+        bench_fetch()
+    elif command == "parse":
+        bench_parse([int(a) for a in args] or [10_000, 1_000_000, 10_000_000])
+    elif command == "geoip":
+        if not args:
+            print(
+                "Usage: python benchmarks.py geoip CITY.mmdb [ASN.mmdb] [N] [WORKERS]"
+            )
+            return
+        asn = args[1] if len(args) > 1 and args[1].endswith(".mmdb") else None
+        rest = [int(a) for a in args[2 if asn else 1 :]]
+        bench_geoip(args[0], asn, *rest)
+    elif command == "idx":
+        bench_idx(*[int(a) for a in args])
+    elif command == "bloom":
+        n = int(args[0]) if args else 400_000
+        bench_bloom(n, *[float(a) for a in args[1:2]])
+    elif command == "export":
+        bench_export([int(a) for a in args] or [400_000, 5_000_000])
+    elif command == "columnar":
+        bench_columnar(*[int(a) for a in args])
+    elif command == "firewall":
+        bench_firewall(*[int(a) for a in args])
+    elif command == "server":
+        bench_server(*[int(a) for a in args])
+    elif command == "charts":
+        bench_charts(*[int(a) for a in args])
+    elif command == "render":
+        bench_render(*[int(a) for a in args])
+    elif command == "sqlite":
+        bench_sqlite(*[int(a) for a in args])
+    elif command == "rollups":
+        bench_rollups(*[int(a) for a in args])
+    elif command == "indexes":
+        bench_indexes(*[int(a) for a in args])
+    elif command == "imports":
+        bench_imports(*[int(a) for a in args])
+    elif command == "search":
+        bench_search(*[int(a) for a in args])
+    elif command == "geoapi":
+        bench_geoapi(*[int(a) for a in args])
+    else:
+        print(f"Unknown benchmark: {command}")
+
+
+if __name__ == "__main__":
+    main()
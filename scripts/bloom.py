@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Bloom filter over `bad_ips` and `bad_networks` for edge prefiltering.
+
+A negative answer is definite (the address is neither listed nor inside a
+listed network); a positive one must be confirmed with an exact lookup.
+
+File format (little-endian):
+
+    header  "<8sIQIIdI" (40 bytes): magic b"BADBLOOM", format version,
+            m (bit count), k (hash count), n (entries added), target
+            false-positive rate, p (number of prefix lengths)
+    prefix  p bytes: the prefix lengths entries were added at, ascending
+    bits    ceil(m / 8) bytes; bit i lives in byte i >> 3 at position i & 7
+
+Keys are the 16-byte packed addresses from `ipkeys` (IPv4 in ::ffff:a.b.c.d
+form). An entry is a key with its host bits cleared followed by one byte
+holding the prefix length, counted in the key's own family (0-32 for IPv4,
+0-128 for IPv6): a listed address is its own /32 or /128, a listed network
+its start key and prefix length. To query an address, mask it to each
+recorded prefix length that fits its family and test every such entry.
+
+Bit positions use double hashing: h1, h2 are the two little-endian uint64
+halves of blake2b(entry, digest_size=16), and the i-th position is
+((h1 + i * h2) mod 2**64) mod m for i in 0..k-1, i.e. computed in wrapping
+uint64 arithmetic as in C or Go.
+"""
+import hashlib
+import math
+import struct
+from pathlib import Path
+
+from ipkeys import V4_MAPPED_PREFIX, ip_to_key
+
+MAGIC = b"BADBLOOM"
+VERSION = 2
+HEADER = struct.Struct("<8sIQIIdI")
+DEFAULT_FP_RATE = 0.01
+# Prefix lengths of single addresses (IPv4, IPv6)
+HOST_PREFIX_LENS = (32, 128)
+UINT64 = (1 << 64) - 1
+
+
+def _hashes(entry):
+    return struct.unpack("<QQ", hashlib.blake2b(entry, digest_size=16).digest())
+
+
+def _family_bits(key):
+    return 32 if key.startswith(V4_MAPPED_PREFIX) else 128
+
+
+def _entry(key, prefix_len):
+    """`key` masked to `prefix_len` bits of its family, plus the length."""
+    host_bits = _family_bits(key) - prefix_len
+    value = (int.from_bytes(key, "big") >> host_bits) << host_bits
+    return value.to_bytes(16, "big") + bytes([prefix_len])
+
+
+class BloomFilter:
+    """Bloom filter sized for `n` entries so that a query, which tests one
+    entry per prefix length in `prefix_lens`, is a false positive at about
+    `fp_rate`."""
+
+    def __init__(
+        self,
+        n,
+        fp_rate=DEFAULT_FP_RATE,
+        bits=None,
+        k=None,
+        count=0,
+        prefix_lens=HOST_PREFIX_LENS,
+    ):
+        n = max(int(n), 1)
+        self.fp_rate = fp_rate
+        self.prefix_lens = tuple(sorted(set(prefix_lens)))
+        rate = fp_rate / len(self.prefix_lens)
+        self.m = bits or max(8, math.ceil(-n * math.log(rate) / math.log(2) ** 2))
+        self.k = k or max(1, round(self.m / n * math.log(2)))
+        self.count = count
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, entry):
+        h1, h2 = _hashes(entry)
+        m = self.m
+        return [((h1 + i * h2) & UINT64) % m for i in range(self.k)]
+
+    def _add(self, entry):
+        bits = self.bits
+        for pos in self._positions(entry):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def _probe(self, entry):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(entry))
+
+    def add_key(self, key):
+        """Add one listed address given as a packed key."""
+        key = bytes(key)
+        self._add(_entry(key, _family_bits(key)))
+
+    def add_network(self, start_key, prefix_len):
+        """Add a listed network; `prefix_len` must be in `prefix_lens`."""
+        if prefix_len not in self.prefix_lens:
+            raise ValueError(f"prefix length {prefix_len} was not declared")
+        self._add(_entry(bytes(start_key), prefix_len))
+
+    def contains_key(self, key):
+        key = bytes(key)
+        bits = _family_bits(key)
+        return any(
+            self._probe(_entry(key, prefix_len))
+            for prefix_len in self.prefix_lens
+            if prefix_len <= bits
+        )
+
+    def __contains__(self, ip):
+        key = ip_to_key(ip)
+        if key is None:
+            raise ValueError(f"invalid address: {ip}")
+        return self.contains_key(key)
+
+    def save(self, path):
+        """Write the filter in the documented format; returns the size."""
+        path = Path(path)
+        with open(path, "wb") as f:
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    self.m,
+                    self.k,
+                    self.count,
+                    self.fp_rate,
+                    len(self.prefix_lens),
+                )
+            )
+            f.write(bytes(self.prefix_lens))
+            f.write(self.bits)
+        return path.stat().st_size
+
+    @classmethod
+    def load(cls, path):
+        data = Path(path).read_bytes()
+        if data[:12] != struct.pack("<8sI", MAGIC, VERSION):
+            raise ValueError(f"{path} is not a version {VERSION} bad IP Bloom filter")
+        _, _, m, k, count, fp_rate, p = HEADER.unpack_from(data)
+        prefix_lens = data[HEADER.size : HEADER.size + p]
+        bloom = cls(count, fp_rate, bits=m, k=k, count=count, prefix_lens=prefix_lens)
+        bloom.bits = bytearray(data[HEADER.size + p :])
+        return bloom
+
+
+def build_from_db(conn, fp_rate=DEFAULT_FP_RATE):
+    """Return a BloomFilter holding every `bad_ips.ip_key` and every
+    `bad_networks` block in `conn`."""
+    total = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM bad_ips WHERE ip_key IS NOT NULL)"
+        " + (SELECT COUNT(*) FROM bad_networks)"
+    ).fetchone()[0]
+    prefix_lens = HOST_PREFIX_LENS + tuple(
+        p for (p,) in conn.execute("SELECT DISTINCT prefix_len FROM bad_networks")
+    )
+    bloom = BloomFilter(total, fp_rate, prefix_lens=prefix_lens)
+    for (key,) in conn.execute("SELECT ip_key FROM bad_ips WHERE ip_key IS NOT NULL"):
+        bloom.add_key(key)
+    for start_key, prefix_len in conn.execute(
+        "SELECT start_key, prefix_len FROM bad_networks"
+    ):
+        bloom.add_network(start_key, prefix_len)
+    return bloom
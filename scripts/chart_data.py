@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+One-pass aggregates for the charts in `generate_visualizations.py`.
+
+`load()` reads each aggregate once and returns a `ChartData`, an immutable
+NamedTuple of sorted tuples that every chart reads from instead of querying
+the database itself:
+
+    agg_severity                -> severity histogram, total, avg/min/max
+    agg_country                 -> country counts and centroids
+    geo x bad_ips, top countries
+      by (country, severity)    -> severity-by-country
+    agg_city                    -> city counts
+    agg_asn                     -> ASN counts
+
+The agg_* rollups are maintained by triggers (see rollups.py), so only the
+severity-by-country join scans rows.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import db
+import rollups
+
+DB_PATH = Path("data/badips.db")
+# Countries with a severity breakdown in `severity_by_country`
+SEVERITY_COUNTRIES = 5
+# Cities and ASNs kept; the charts show at most the top 15
+TOP_GROUPS = 50
+
+
+class ChartData(NamedTuple):
+    total_ips: int
+    # (severity, count), ascending severity
+    severity_histogram: tuple
+    # (country, count), most IPs first; only rows with a country
+    country_counts: tuple
+    # (city, country, count), the TOP_GROUPS with most IPs
+    city_counts: tuple
+    # (asn or "AS-Unknown", count), the TOP_GROUPS with most IPs
+    asn_counts: tuple
+    # (country, severity, count) for listed IPs in the top SEVERITY_COUNTRIES
+    severity_by_country: tuple
+    # (country, mean latitude, mean longitude, count of located rows)
+    country_centroids: tuple
+    update_time: str
+
+    @property
+    def geo_total(self):
+        """Geolocation rows with a country."""
+        return sum(count for _, count in self.country_counts)
+
+    def top_countries(self, n):
+        return self.country_counts[:n]
+
+    def top_cities(self, n):
+        return self.city_counts[:n]
+
+    def top_asns(self, n):
+        return self.asn_counts[:n]
+
+    def severity_stats(self):
+        """Return (avg, max, min) severity, or (None, None, None)."""
+        rows = [(s, c) for s, c in self.severity_histogram if s is not None]
+        total = sum(c for _, c in rows)
+        if not total:
+            return None, None, None
+        return (
+            sum(s * c for s, c in rows) / total,
+            max(s for s, _ in rows),
+            min(s for s, _ in rows),
+        )
+
+    def stats(self):
+        """The summary dict printed by `main` and passed to the README."""
+        avg, high, low = self.severity_stats()
+        return {
+            "total_ips": self.total_ips,
+            "countries": len(self.country_counts),
+            "top_countries": list(self.top_countries(15)),
+            "top_cities": list(self.top_cities(10)),
+            "severity_avg": avg,
+            "severity_max": high,
+            "severity_min": low,
+            "update_time": self.update_time,
+        }
+
+
+def _sorted_counts(counts):
+    return tuple(sorted(counts, key=lambda row: (-row[-1], str(row[0]))))
+
+
+def load(db_path=DB_PATH):
+    """Aggregate `db_path` into a ChartData, or return None if it is missing."""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        return None
+    conn = db.connect_readonly(db_path)
+    try:
+        return aggregate(conn)
+    finally:
+        conn.close()
+
+
+def severity_by_country_query(countries):
+    """The severity-by-country join for `countries` bound parameters."""
+    return f"""
+        SELECT g.country, b.severity, COUNT(*)
+        FROM ip_geolocation g
+        JOIN bad_ips b ON b.ip_key = g.ip_key
+        WHERE g.country IN ({", ".join("?" * countries)})
+        GROUP BY g.country, b.severity
+        ORDER BY g.country, b.severity
+    """
+
+
+def aggregate(conn):
+    """Build a ChartData from an open connection."""
+    histogram = tuple(rollups.severity_counts(conn))
+
+    countries, centroids = [], []
+    for country, count, located, lat, lon in rollups.country_counts(conn):
+        countries.append((country, count))
+        if located:
+            centroids.append((country, lat, lon, located))
+    countries = _sorted_counts(countries)
+
+    # Joining every geolocation row to bad_ips costs more than all the other
+    # scans together; only the leading countries are charted by severity
+    top = [country for country, _ in countries[:SEVERITY_COUNTRIES]]
+    by_severity = conn.execute(severity_by_country_query(len(top)), top).fetchall()
+
+    cities = rollups.city_counts(conn, TOP_GROUPS)
+    asns = rollups.asn_counts(conn, TOP_GROUPS)
+
+    return ChartData(
+        total_ips=sum(count for _, count in histogram),
+        severity_histogram=histogram,
+        country_counts=countries,
+        city_counts=tuple(cities),
+        asn_counts=tuple(asns),
+        severity_by_country=tuple(by_severity),
+        country_centroids=_sorted_counts(centroids),
+        update_time=datetime.now().isoformat(),
+    )
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Columnar Parquet / Arrow IPC snapshots of `bad_ips` joined with geo data.
+
+Rows are streamed from `utils.iter_export_rows` and written `ROW_GROUP`
+at a time, so memory stays bounded. Columns:
+
+    ip_v4         uint32, the IPv4 address as an integer (null for IPv6)
+    ip_v6         fixed_size_binary(16), the IPv6 address (null for IPv4)
+    severity      uint8
+    threat_count  uint32
+    first_seen    timestamp[s]
+    last_updated  timestamp[s]
+    country       dictionary<int32, string>
+    city          dictionary<int32, string>
+    latitude      float64
+    longitude     float64
+    asn           dictionary<int32, string>
+
+Dictionaries grow across row groups (Arrow IPC files carry them as deltas).
+Requires pyarrow.
+"""
+import socket
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ROW_GROUP = 100_000
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+DICTIONARY_COLUMNS = ("country", "city", "asn")
+
+
+def schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            ("ip_v4", pa.uint32()),
+            ("ip_v6", pa.binary(16)),
+            ("severity", pa.uint8()),
+            ("threat_count", pa.uint32()),
+            ("first_seen", pa.timestamp("s")),
+            ("last_updated", pa.timestamp("s")),
+            ("country", dictionary),
+            ("city", dictionary),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("asn", dictionary),
+        ]
+    )
+
+
+class _Dictionary:
+    """Append-only value -> index mapping shared by every row group, so each
+    batch's dictionary extends the previous one."""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def encode(self, column):
+        indices = []
+        for value in column:
+            if value is None:
+                indices.append(None)
+                continue
+            i = self.index.get(value)
+            if i is None:
+                i = self.index[value] = len(self.values)
+                self.values.append(value)
+            indices.append(i)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), pa.array(self.values, pa.string())
+        )
+
+
+def _timestamps(column):
+    return pc.strptime(
+        pa.array(column, pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s"
+    )
+
+
+def _batch(rows, dictionaries):
+    (
+        ips,
+        severity,
+        threat_count,
+        first_seen,
+        last_updated,
+        country,
+        city,
+        latitude,
+        longitude,
+        asn,
+    ) = zip(*rows)
+    v4, v6 = [], []
+    for ip in ips:
+        try:
+            v4.append(int.from_bytes(socket.inet_aton(ip), "big"))
+            v6.append(None)
+        except OSError:
+            v4.append(None)
+            v6.append(socket.inet_pton(socket.AF_INET6, ip))
+    columns = [
+        pa.array(v4, pa.uint32()),
+        pa.array(v6, pa.binary(16)),
+        pa.array(severity, pa.uint8()),
+        pa.array(threat_count, pa.uint32()),
+        _timestamps(first_seen),
+        _timestamps(last_updated),
+        dictionaries["country"].encode(country),
+        dictionaries["city"].encode(city),
+        pa.array(latitude, pa.float64()),
+        pa.array(longitude, pa.float64()),
+        dictionaries["asn"].encode(asn),
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=schema())
+
+
+def iter_batches(rows):
+    """Turn `utils.iter_export_rows` output into RecordBatches of
+    `ROW_GROUP` rows."""
+    next(rows)  # column names
+    dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == ROW_GROUP:
+            yield _batch(chunk, dictionaries)
+            chunk = []
+    if chunk:
+        yield _batch(chunk, dictionaries)
+
+
+def write_snapshot(rows, path, format_type="parquet"):
+    """Write `utils.iter_export_rows` output to `path` as Parquet or an
+    Arrow IPC file. Returns the row count. Raises RuntimeError if pyarrow is
+    not installed."""
+    if pa is None:
+        raise RuntimeError("pyarrow is required; run: pip install pyarrow")
+    count = 0
+    if format_type == "parquet":
+        writer = pq.ParquetWriter(str(path), schema(), compression="zstd")
+    else:
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        writer = pa.ipc.new_file(str(path), schema(), options=options)
+    with writer:
+        for batch in iter_batches(rows):
+            if format_type == "parquet":
+                writer.write_batch(batch, row_group_size=ROW_GROUP)
+            else:
+                writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def load_snapshot(path):
+    """Return the snapshot at `path` as a pyarrow Table, memory-mapping the
+    file. Arrow IPC columns are zero-copy views of the mapping."""
+    if pa is None:
+        raise RuntimeError("pyarrow is required; run: pip install pyarrow")
+    if Path(path).suffix == FORMATS["parquet"]:
+        return pq.read_table(str(path), memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Connections to `data/badips.db` with the tuned settings every script uses.
+
+`connect()` opens the database read-write in WAL mode (readers never block
+the writer, and commits append to the log instead of rewriting pages) with
+`synchronous=NORMAL`, which stays consistent after a crash but may lose the
+last commits on power loss; the database is rebuilt from the feeds weekly.
+`connect_readonly()` opens a `mode=ro` URI for reports, exports and charts.
+Both memory-map the file and use a larger page cache than SQLite's 2 MiB
+default. Call `optimize()` after bulk loads so the planner has statistics,
+and `release_wal()` before shipping the file.
+"""
+import sqlite3
+from pathlib import Path
+
+DB_PATH = Path("data/badips.db")
+# Seconds to wait for another connection's write lock
+BUSY_TIMEOUT = 30
+# Applied to every connection; negative cache_size is in KiB
+READ_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+WRITE_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", **READ_PRAGMAS}
+# Rows sampled per index by ANALYZE; enough for the planner on large tables
+ANALYSIS_LIMIT = 1000
+
+
+def _apply(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def connect(db_path=DB_PATH, pragmas=WRITE_PRAGMAS):
+    """Open `db_path` read-write with `pragmas` (creating the file)."""
+    conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT)
+    return _apply(conn, pragmas)
+
+
+def connect_readonly(db_path=DB_PATH, pragmas=READ_PRAGMAS):
+    """Open `db_path` read-only; raises sqlite3.OperationalError if it does
+    not exist."""
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT)
+    return _apply(conn, pragmas)
+
+
+def optimize(conn):
+    """Refresh planner statistics after a bulk load: a sampled ANALYZE the
+    first time, then `PRAGMA optimize`, which re-analyzes only tables whose
+    size changed enough to matter."""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    analyzed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+    conn.execute("PRAGMA optimize" if analyzed else "ANALYZE")
+    conn.commit()
+
+
+def release_wal(conn):
+    """Fold the WAL into the main file and switch back to a rollback journal.
+
+    WAL mode is stored in the database, so without this every `mode=ro`
+    reader of the shipped file would leave `-wal`/`-shm` files next to it.
+    The next `connect()` turns WAL back on.
+    """
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode = DELETE")
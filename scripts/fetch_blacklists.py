@@ -2,20 +2,35 @@
 """
 Fetch several public IP blocklists, extract IPv4 addresses, compare to
 `badip_list.csv`, and write results to `data/fetched_ips.csv` and
-`data/new_ips.csv`.
+`data/new_ips.csv`. CIDR blocks from structured lists (Spamhaus DROP, plain
+one-per-line lists) are kept as networks and written to
+`data/<source>_networks.csv` instead of being flattened; blocks shorter than
+MIN_PREFIX_LEN (DROP_MIN_PREFIX_LEN for DROP) or overlapping private and
+reserved space are dropped, and free text never yields networks.
+
+Each source is parsed by the adapter named in `SOURCE_FORMATS` (see
+`PARSERS`), which keeps source scores and references such as SBL ids.
 """
 
 import re
+import io
 import csv
+import gzip
+import json
+import time
 import ipaddress
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 try:
     import requests
 except ImportError:
     requests = None
 
+import http_cache
+from ipkeys import is_public_network
 
 SOURCES = [
     (
@@ -38,38 +53,371 @@ SOURCES = [
     ),
 ]
 
+# Shortest prefix accepted from a structured list ("plain"); DROP lists
+# hijacked allocations and may go shorter. Free text never yields networks.
+MIN_PREFIX_LEN = 16
+DROP_MIN_PREFIX_LEN = 8
+
+# Parser adapter per source (keys of PARSERS); unlisted sources use "text"
+SOURCE_FORMATS = {
+    "stamparm_ipsum": "ipsum",
+    "spamhaus_drop": "drop",
+    "emerging_block_ips": "plain",
+    "ransomwaretracker_rw_ipbl": "plain",
+    "zeus_abusech": "plain",
+    "hackernews_security": "json",
+}
+
+# Per-source timeout in seconds (whole download, not just connect/read)
+DEFAULT_TIMEOUT = 20
+SOURCE_TIMEOUTS = {
+    "hackernews_security": 10,
+}
+# Overall budget for the concurrent fetch stage
+FETCH_DEADLINE = 90
+
 IPV4_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+# Same as IPV4_RE plus an optional /prefix, so CIDR entries stay intact
+IPV4_CIDR_RE = re.compile(r"\b((?:\d{1,3}\.){3}\d{1,3})(?:/(\d{1,2}))?\b")
+
+
+def make_session(pool_size: int = 10):
+    """Return a `requests.Session` with a connection pool sized for `pool_size`
+    concurrent downloads."""
+    if requests is None:
+        raise RuntimeError("requests is required; run: pip install requests")
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def fetch_url(url: str, timeout: int = 20):
+def fetch_url(url: str, timeout: int = 20, session=None):
     """Fetch text content from `url` using `requests`.
 
-    Raises RuntimeError if `requests` is not installed.
-    Returns empty string on error.
+    `timeout` bounds the whole download, so a mirror that trickles bytes
+    cannot stall the caller. Responses are revalidated against the
+    conditional-GET cache in `http_cache`. Raises RuntimeError if `requests`
+    is not installed. Returns empty string on error.
     """
+    response = fetch_cached(url, timeout=timeout, session=session)
+    return http_cache.decode(response) if response else ""
+
+
+def fetch_cached(url: str, timeout: int = 20, session=None):
+    """Return the `http_cache.CachedResponse` for `url`, or None on error."""
     if requests is None:
         raise RuntimeError("requests is required; run: pip install requests")
     try:
-        r = requests.get(url, timeout=timeout)
-        r.raise_for_status()
-        return r.text
+        return http_cache.fetch(url, timeout=timeout, session=session)
     except requests.exceptions.RequestException as exc:  # network/HTTP errors
         print(f"Warning: failed to fetch {url}: {exc}")
-        return ""
+        return None
 
 
-def extract_ips(text: str):
-    """Return a set of valid IPv4 addresses found in `text`."""
-    ips = set()
-    for m in IPV4_RE.finditer(text or ""):
-        ip = m.group(0)
-        try:
-            # ipaddress raises ValueError for invalid addresses
-            ipaddress.ip_address(ip)
-            ips.add(ip)
-        except ValueError:
+def fetch_source(session, name: str, url: str, timeout: int):
+    """Download one source into the HTTP cache and return its body path with
+    wall time and byte count.
+
+    `unchanged` is True when upstream answered 304 and the cached body was
+    reused. The body is streamed to disk and never held in memory.
+    """
+    start = time.perf_counter()
+    response = None
+    if requests is None:
+        raise RuntimeError("requests is required; run: pip install requests")
+    try:
+        response = http_cache.fetch_file(url, timeout=timeout, session=session)
+    except requests.exceptions.RequestException as exc:  # network/HTTP errors
+        print(f"Warning: failed to fetch {url}: {exc}")
+    size = Path(response.path).stat().st_size if response else 0
+    return {
+        "name": name,
+        "url": url,
+        "path": response.path if response else None,
+        "encoding": response.encoding if response else None,
+        "ok": bool(size),
+        "unchanged": bool(response and response.unchanged),
+        "seconds": round(time.perf_counter() - start, 3),
+        "bytes": size,
+    }
+
+
+def fetch_all(sources, deadline: float = FETCH_DEADLINE, session=None):
+    """Download all `(name, url)` sources concurrently over one pooled session.
+
+    Each source gets its `SOURCE_TIMEOUTS` entry (or `DEFAULT_TIMEOUT`),
+    capped by what is left of `deadline`. Sources still running when the
+    deadline passes are reported as failed. Returns results in `sources`
+    order.
+    """
+    sources = list(sources)
+    if not sources:
+        return []
+    session = session or make_session(len(sources))
+    start = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    futures = {}
+    for name, url in sources:
+        timeout = min(SOURCE_TIMEOUTS.get(name, DEFAULT_TIMEOUT), deadline)
+        futures[(name, url)] = executor.submit(
+            fetch_source, session, name, url, timeout
+        )
+    wait(futures.values(), timeout=deadline)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for (name, url), future in futures.items():
+        if future.done() and not future.cancelled():
+            results.append(future.result())
+        else:
+            print(f"Warning: {name} did not finish within the {deadline}s deadline")
+            results.append(
+                {
+                    "name": name,
+                    "url": url,
+                    "path": None,
+                    "encoding": None,
+                    "ok": False,
+                    "unchanged": False,
+                    "seconds": round(time.monotonic() - start, 3),
+                    "bytes": 0,
+                }
+            )
+    return results
+
+
+def is_valid_ipv4(ip: str) -> bool:
+    """Return True if `ip` is a dotted-quad IPv4 address.
+
+    Fast path for hot loops: checks octets directly instead of building
+    `ipaddress` objects, and like `ipaddress` rejects leading zeros.
+    """
+    parts = ip.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not (part.isascii() and part.isdigit()) or len(part) > 3:
+            return False
+        if (part[0] == "0" and len(part) > 1) or int(part) > 255:
+            return False
+    return True
+
+
+def ipv4_to_int(ip: str) -> int:
+    """Return the integer value of a validated dotted-quad address."""
+    a, b, c, d = ip.split(".")
+    return (int(a) << 24) | (int(b) << 16) | (int(c) << 8) | int(d)
+
+
+def int_to_ipv4(value: int) -> str:
+    """Return the dotted-quad form of a 32-bit integer."""
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def iter_lines(path, encoding=None):
+    """Yield text lines from a downloaded body file, gunzipping if needed."""
+    with open(path, "rb") as raw:
+        stream = gzip.GzipFile(fileobj=raw) if raw.peek(2)[:2] == b"\x1f\x8b" else raw
+        yield from io.TextIOWrapper(
+            stream, encoding=encoding or "utf-8", errors="replace"
+        )
+
+
+# kind: "ip" or "network"; score: source score text ("" if none);
+# ref: source-specific reference such as an SBL id or article URL
+Record = namedtuple("Record", "kind value score ref", defaults=("", ""))
+
+PARSERS = {}
+
+
+def register_parser(fmt: str):
+    """Register a `lines -> Record` generator as the adapter for `fmt`."""
+
+    def decorator(func):
+        PARSERS[fmt] = func
+        return func
+
+    return decorator
+
+
+def parse_entry(token: str, score: str = "", ref: str = "", min_prefix=None):
+    """Return a Record for an `a.b.c.d` or `a.b.c.d/N` token, or None.
+
+    `/N` with N < 32 is a network, normalized with host bits cleared; a bare
+    address or a /32 is an address. Networks are only accepted when
+    `min_prefix` is given, N >= `min_prefix` and the block does not overlap
+    private or reserved space.
+    """
+    ip, sep, prefix = token.partition("/")
+    if not is_valid_ipv4(ip):
+        return None
+    if not sep or prefix == "32":
+        return Record("ip", ip, score, ref)
+    if not (prefix.isascii() and prefix.isdigit()) or int(prefix) > 32:
+        return None
+    if min_prefix is None or int(prefix) < min_prefix:
+        return None
+    host_bits = 32 - int(prefix)
+    start = (ipv4_to_int(ip) >> host_bits) << host_bits
+    network = f"{int_to_ipv4(start)}/{int(prefix)}"
+    if not is_public_network(network):
+        return None
+    return Record("network", network, score, ref)
+
+
+def _data_lines(lines):
+    """Yield stripped lines, skipping blanks and `#`/`;` comments."""
+    for line in lines:
+        line = line.strip()
+        if line and line[0] not in "#;":
+            yield line
+
+
+@register_parser("text")
+def parse_text(lines):
+    """Generic fallback: regex-scan free text for addresses. CIDR blocks
+    mentioned in text are skipped rather than listed."""
+    for line in lines:
+        for m in IPV4_CIDR_RE.finditer(line):
+            record = parse_entry(m.group(0))
+            if record:
+                yield record
+
+
+@register_parser("plain")
+def parse_plain(lines):
+    """One address or CIDR per line, optionally followed by a comment."""
+    for line in _data_lines(lines):
+        record = parse_entry(line.split(None, 1)[0], min_prefix=MIN_PREFIX_LEN)
+        if record:
+            yield record
+
+
+@register_parser("ipsum")
+def parse_ipsum(lines):
+    """stamparm/ipsum: `<ip>\t<count>`, where count is the number of
+    blocklists reporting the address; kept as the score."""
+    for line in _data_lines(lines):
+        fields = line.split()
+        score = fields[1] if len(fields) > 1 and fields[1].isdigit() else ""
+        record = parse_entry(fields[0], score)
+        if record:
+            yield record
+
+
+@register_parser("drop")
+def parse_drop(lines):
+    """Spamhaus DROP: `<cidr> ; SBL<id>`; the SBL id is kept as the ref."""
+    for line in _data_lines(lines):
+        entry, _, comment = line.partition(";")
+        record = parse_entry(
+            entry.strip(), ref=comment.strip(), min_prefix=DROP_MIN_PREFIX_LEN
+        )
+        if record:
+            yield record
+
+
+@register_parser("json")
+def parse_json(lines):
+    """JSON Feed (e.g. hnrss): scan item titles and bodies, ref = item URL."""
+    try:
+        doc = json.loads("".join(lines))
+    except ValueError:
+        return
+    items = doc.get("items", []) if isinstance(doc, dict) else []
+    for item in items:
+        if not isinstance(item, dict):
             continue
-    return ips
+        text = " ".join(
+            str(item.get(k) or "")
+            for k in ("title", "summary", "content_text", "content_html")
+        )
+        ref = str(item.get("url") or item.get("id") or "")
+        for record in parse_text([text]):
+            yield record._replace(ref=ref)
+
+
+def iter_records(lines, fmt: str = "text"):
+    """Parse `lines` with the adapter registered for `fmt`."""
+    return PARSERS[fmt](lines)
+
+
+def extract_ips(text: str):
+    """Return a set of valid IPv4 addresses found in `text`.
+
+    CIDR blocks (shorter than /32) are skipped, not flattened into their base
+    address.
+    """
+    return {record.value for record in parse_text((text or "").splitlines())}
+
+
+def stream_source(name: str, lines, src_path: Path, net_path: Path, fmt="text"):
+    """Parse `lines` with the `fmt` adapter and write per-source CSVs
+    incrementally.
+
+    Memory stays flat regardless of list size: nothing is buffered, and
+    duplicates within a source are left for the summary step (and
+    `process_badips.py`) to merge. `net_path` is only kept when the source
+    lists networks. Returns (ip_rows, network_rows).
+    """
+    collected_at = datetime.now(timezone.utc).isoformat()
+    counts = {"ip": 0, "network": 0}
+    nf = None
+    try:
+        with src_path.open("w", newline="", encoding="utf-8") as sf:
+            sw = csv.writer(sf)
+            sw.writerow(["ip", "score", "source", "collected_at", "ref"])
+            for kind, value, score, ref in iter_records(lines, fmt):
+                counts[kind] += 1
+                if kind == "ip":
+                    sw.writerow([value, score, name, collected_at, ref])
+                    continue
+                if nf is None:
+                    nf = net_path.open("w", newline="", encoding="utf-8")
+                    nw = csv.writer(nf)
+                    nw.writerow(["network", "score", "source", "collected_at", "ref"])
+                nw.writerow([value, score, name, collected_at, ref])
+    finally:
+        if nf is not None:
+            nf.close()
+    if nf is None and net_path.exists():
+        net_path.unlink()
+    return counts["ip"], counts["network"]
+
+
+def iter_csv_ips(path: Path):
+    """Yield valid IPv4 addresses from the first column of a per-source CSV."""
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if row and is_valid_ipv4(row[0]):
+                yield row[0]
+
+
+def write_fetch_stats(path: Path, results):
+    """Write per-source wall time and byte counts to `path` as JSON."""
+    stats = {
+        "collected_at": datetime.now(timezone.utc).isoformat(),
+        "sources": [
+            {k: r[k] for k in ("name", "url", "ok", "unchanged", "seconds", "bytes")}
+            for r in results
+        ],
+    }
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+
+def count_csv_rows(path: Path):
+    """Return the number of data rows (excluding header) in a CSV, 0 if absent."""
+    if not path.exists():
+        return 0
+    with path.open("r", encoding="utf-8") as f:
+        return max(sum(1 for line in f if line.strip()) - 1, 0)
 
 
 def load_badip_csv(path: Path):
@@ -105,55 +453,80 @@ def main():
     badips = load_badip_csv(badip_path)
     print(f"Loaded {len(badips)} existing entries from {badip_path}")
 
-    fetched = {}
+    print(f"Fetching {len(SOURCES)} sources concurrently...")
+    results = fetch_all(SOURCES)
+    write_fetch_stats(out_dir / "fetch_stats.json", results)
 
-    for name, url in SOURCES:
-        print(f"Fetching {name} from {url}...")
-        txt = fetch_url(url)
-        ips = extract_ips(txt)
-        print(f"  -> found {len(ips)} IPv4 candidates")
-        # write per-source csv for records
+    for result in results:
+        name = result["name"]
         src_path = out_dir / f"{name}.csv"
-        with src_path.open("w", newline="", encoding="utf-8") as sf:
-            sw = csv.writer(sf)
-            sw.writerow(["ip", "collected_at", "source"])
-            for ip in sorted(ips):
-                sw.writerow([ip, datetime.utcnow().isoformat() + "Z", name])
-        for ip in ips:
-            fetched.setdefault(ip, set()).add(name)
+        net_path = out_dir / f"{name}_networks.csv"
+        print(
+            f"{name}: {result['bytes']:,} bytes in {result['seconds']:.2f}s"
+            + (" (unchanged)" if result["unchanged"] else "")
+            + ("" if result["ok"] else " (failed)")
+        )
+        if result["unchanged"] and src_path.exists():
+            # Upstream answered 304: last run's per-source output is current
+            continue
+        lines = iter_lines(result["path"], result["encoding"]) if result["ok"] else []
+        fmt = SOURCE_FORMATS.get(name, "text")
+        n_ips, n_networks = stream_source(name, lines, src_path, net_path, fmt)
+        print(f"  -> found {n_ips} IPv4 candidates, {n_networks} networks")
 
-    all_fetched = set(fetched.keys())
-    print(f"Total unique fetched IPs: {len(all_fetched)}")
+    # Union of all sources, keyed by packed address with a bitmask of sources
+    names = [result["name"] for result in results]
+    fetched = {}
+    total_networks = 0
+    for idx, name in enumerate(names):
+        bit = 1 << idx
+        for ip in iter_csv_ips(out_dir / f"{name}.csv"):
+            key = ipv4_to_int(ip)
+            fetched[key] = fetched.get(key, 0) | bit
+        total_networks += count_csv_rows(out_dir / f"{name}_networks.csv")
+
+    print(f"Total unique fetched IPs: {len(fetched)}")
+    print(f"Total fetched networks: {total_networks}")
 
     # Compare to existing
-    new_ips = sorted(all_fetched - badips)
-    common = sorted(all_fetched & badips)
-    missing = sorted(badips - all_fetched)
+    badip_keys = {ipv4_to_int(ip) for ip in badips if is_valid_ipv4(ip)}
+    new_ips = sorted(key for key in fetched if key not in badip_keys)
+    common = len(fetched) - len(new_ips)
+    missing = len(badips) - common
 
-    now = datetime.utcnow().isoformat() + "Z"
+    now = datetime.now(timezone.utc).isoformat()
 
     fetched_path = out_dir / "fetched_ips.csv"
     new_path = out_dir / "new_ips.csv"
+    source_labels = {}
+
+    def sources_for(key):
+        mask = fetched[key]
+        if mask not in source_labels:
+            source_labels[mask] = ";".join(
+                sorted(n for i, n in enumerate(names) if mask >> i & 1)
+            )
+        return source_labels[mask]
 
     # Write fetched (ip, sources)
     with fetched_path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["ip", "sources", "collected_at"])
-        for ip in sorted(all_fetched):
-            w.writerow([ip, ";".join(sorted(fetched.get(ip, []))), now])
+        for key in sorted(fetched):
+            w.writerow([int_to_ipv4(key), sources_for(key), now])
 
     # Write new ips (not present in badip_list.csv)
     with new_path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["ip", "sources", "collected_at"])
-        for ip in new_ips:
-            w.writerow([ip, ";".join(sorted(fetched.get(ip, []))), now])
+        for key in new_ips:
+            w.writerow([int_to_ipv4(key), sources_for(key), now])
 
     print("")
     print(f"Wrote {fetched_path} and {new_path}")
     print(f"New IPs (not in badip_list.csv): {len(new_ips)}")
-    print(f"IPs present in both fetched and badip_list.csv: {len(common)}")
-    print(f"badip_list.csv entries not found in these sources: {len(missing)}")
+    print(f"IPs present in both fetched and badip_list.csv: {common}")
+    print(f"badip_list.csv entries not found in these sources: {missing}")
 
     # Fetch-only mode: do not append to master CSV or write to the DB here.
     # The pipeline's `process_badips.py` will merge `data/new_ips.csv` and
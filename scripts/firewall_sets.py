@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+CIDR-aggregated firewall set exports (ipset, nftables, iptables-restore,
+plain CIDR lists).
+
+Listed addresses and networks are read from the database in `ip_key` order
+and handled as integer intervals per address family. Overlapping or adjacent
+intervals are merged in a single pass, and each merged range is split into
+the fewest aligned CIDR blocks that cover it exactly, so the whole collapse
+is linear in the number of sorted inputs.
+"""
+import heapq
+import socket
+
+from ipkeys import V4_MAPPED_PREFIX
+
+SET_NAME = "badips"
+FORMATS = {
+    "ipset": "bad_ips.ipset",
+    "nft": "bad_ips.nft",
+    "iptables": "bad_ips.iptables",
+    "cidr": "bad_ips_cidr.txt",
+}
+# Elements per `add element` statement in nft output
+NFT_CHUNK = 1000
+
+
+def _split(key):
+    """Return (family bits, integer) for a packed 16-byte key."""
+    key = bytes(key)
+    if key.startswith(V4_MAPPED_PREFIX):
+        return 32, int.from_bytes(key[12:], "big")
+    return 128, int.from_bytes(key, "big")
+
+
+def iter_intervals(conn, min_severity=None):
+    """Yield (bits, start, end) for listed addresses and networks in key
+    order, optionally only those with severity >= `min_severity`."""
+    where, params = "", ()
+    if min_severity is not None:
+        where, params = " AND severity >= ?", (int(min_severity),)
+    ips = conn.execute(
+        "SELECT ip_key, ip_key FROM bad_ips WHERE ip_key IS NOT NULL"
+        + where
+        + " ORDER BY ip_key",
+        params,
+    )
+    networks = conn.execute(
+        "SELECT start_key, end_key FROM bad_networks WHERE 1 = 1"
+        + where
+        + " ORDER BY start_key",
+        params,
+    )
+    # Both queries are in key order; merging keeps the combined stream sorted,
+    # and therefore each family's subsequence too
+    for start, end in heapq.merge(ips, networks, key=lambda r: bytes(r[0])):
+        bits, start = _split(start)
+        yield bits, start, _split(end)[1]
+
+
+def collapse(intervals):
+    """Merge sorted (start, end) intervals that overlap or touch; yields the
+    merged (start, end) pairs."""
+    current = None
+    for start, end in intervals:
+        if current is None:
+            current = [start, end]
+        elif start <= current[1] + 1:
+            if end > current[1]:
+                current[1] = end
+        else:
+            yield current[0], current[1]
+            current = [start, end]
+    if current is not None:
+        yield current[0], current[1]
+
+
+def range_to_cidrs(start, end, bits):
+    """Yield (network int, prefix_len) for the minimal CIDR cover of
+    [start, end] in a `bits`-wide address space."""
+    while start <= end:
+        size = start & -start if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        yield start, bits - size.bit_length() + 1
+        start += size
+
+
+def aggregate(conn, min_severity=None):
+    """Return ({bits: [(network, prefix_len), ...]}, input entry count)."""
+    by_family = {32: [], 128: []}
+    for bits, start, end in iter_intervals(conn, min_severity):
+        by_family[bits].append((start, end))
+    entries = len(by_family[32]) + len(by_family[128])
+    cidrs = {}
+    for bits, intervals in by_family.items():
+        cidrs[bits] = [
+            cidr
+            for start, end in collapse(intervals)
+            for cidr in range_to_cidrs(start, end, bits)
+        ]
+    return cidrs, entries
+
+
+def format_cidr(network, prefix_len, bits):
+    family = socket.AF_INET if bits == 32 else socket.AF_INET6
+    text = socket.inet_ntop(family, network.to_bytes(bits // 8, "big"))
+    return text if prefix_len == bits else f"{text}/{prefix_len}"
+
+
+def write_set(cidrs, out, format_type="cidr", name=SET_NAME):
+    """Write aggregated `cidrs` to the text stream `out` in `format_type`
+    (one of `FORMATS`)."""
+    families = [
+        (bits, "inet" if bits == 32 else "inet6", name if bits == 32 else name + "6")
+        for bits in (32, 128)
+        if cidrs.get(bits)
+    ]
+    if format_type == "ipset":
+        for bits, family, set_name in families:
+            out.write(
+                f"create {set_name} hash:net family {family}"
+                f" maxelem {max(65536, len(cidrs[bits]))} -exist\n"
+            )
+            out.write(f"flush {set_name}\n")
+            for network, prefix_len in cidrs[bits]:
+                out.write(f"add {set_name} {format_cidr(network, prefix_len, bits)}")
+                out.write(" -exist\n")
+    elif format_type == "nft":
+        out.write(f"table inet {name} {{\n}}\n")
+        for bits, family, set_name in families:
+            addr_type = "ipv4_addr" if bits == 32 else "ipv6_addr"
+            out.write(
+                f"add set inet {name} {set_name}"
+                f" {{ type {addr_type}; flags interval; }}\n"
+            )
+            out.write(f"flush set inet {name} {set_name}\n")
+            rows = cidrs[bits]
+            for i in range(0, len(rows), NFT_CHUNK):
+                elements = ", ".join(
+                    format_cidr(network, prefix_len, bits)
+                    for network, prefix_len in rows[i : i + NFT_CHUNK]
+                )
+                out.write(f"add element inet {name} {set_name} {{ {elements} }}\n")
+    elif format_type == "iptables":
+        # For `iptables-restore --noflush`: declaring the chain empties it, and
+        # it still has to be jumped to from INPUT/FORWARD. IPv4 only.
+        out.write(f"*filter\n:{name.upper()} - [0:0]\n")
+        for network, prefix_len in cidrs.get(32, []):
+            cidr = format_cidr(network, prefix_len, 32)
+            out.write(f"-A {name.upper()} -s {cidr} -j DROP\n")
+        out.write("COMMIT\n")
+    else:
+        for bits in (32, 128):
+            for network, prefix_len in cidrs.get(bits, []):
+                out.write(format_cidr(network, prefix_len, bits) + "\n")
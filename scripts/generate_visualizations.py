@@ -1,38 +1,73 @@
 #!/usr/bin/env python3
 """
 Generate visualizations and update README with bad IP statistics
+
+Usage:
+  python scripts/generate_visualizations.py [--only CHART ...] [--force]
+
+`--only` (repeatable) renders just the named charts (see CHARTS); `--force`
+re-renders charts whose inputs are unchanged.
 """
 
 # Many functions here are visualization-heavy and intentionally large.
 # pylint: disable=too-many-lines,too-many-statements,too-many-branches,too-many-locals,broad-exception-caught,use-dict-literal,import-outside-toplevel,invalid-name,line-too-long,unused-argument,unused-variable,maybe-no-member,no-member
 
-import sqlite3
 from pathlib import Path
 from datetime import datetime
+import hashlib
+import importlib
+import multiprocessing
+import os
+import queue
 import subprocess
 import sys
+import time
 
 from typing import Any
 
-# plachold for plot errors
+import chart_data
+
+# Set by use_backend() on first use; importing them up front costs seconds
 plt: Any = None
 np: Any = None
 pe: Any = None
-pd: Any = None
 go: Any = None
 
-try:
-    import matplotlib.pyplot as plt
-    import numpy as np
-    from matplotlib import patheffects as pe
-    import pandas as pd
-    import plotly.graph_objects as go
-except ImportError:
-    print("Warning: Some visualization libraries not available")
+# Plotting backend -> (module global, module) pairs it provides
+BACKENDS = {
+    "matplotlib": (
+        ("plt", "matplotlib.pyplot"),
+        ("np", "numpy"),
+        ("pe", "matplotlib.patheffects"),
+    ),
+    "plotly": (("go", "plotly.graph_objects"),),
+}
+_loaded_backends = {}
+
+
+def use_backend(name):
+    """Import backend `name` into this module on first use (applying the
+    themes for matplotlib); returns False if it is not installed."""
+    if name not in _loaded_backends:
+        try:
+            modules = {
+                alias: importlib.import_module(module)
+                for alias, module in BACKENDS[name]
+            }
+        except ImportError as e:
+            print(f"Warning: {name} not available ({e})")
+            _loaded_backends[name] = False
+        else:
+            globals().update(modules)
+            _loaded_backends[name] = True
+            if name == "matplotlib":
+                apply_viz_theme()
+                apply_steampunk_theme()
+    return _loaded_backends[name]
 
 
 def _plotting_ready():
-    return plt is not None and np is not None
+    return use_backend("matplotlib")
 
 
 def apply_viz_theme():
@@ -121,72 +156,30 @@ def apply_gradient_background(fig, ax):
     ax.set_facecolor('#0a0a2e')
 
 
-def create_steampunk_dashboard(stats):
+def create_steampunk_dashboard(data):
     """PNG dashboard."""
     if not _plotting_ready():
         print("Matplotlib not available; skipping dashboard")
         return False
     assert plt is not None and np is not None
     try:
-        db_path = Path("data/badips.db")
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
         # Severity distribution
-        cursor.execute(
-            """
-            SELECT severity, COUNT(*)
-            FROM bad_ips
-            GROUP BY severity
-            ORDER BY severity
-        """
-        )
-        sev_rows = cursor.fetchall()
+        sev_rows = [(s, c) for s, c in data.severity_histogram if s is not None]
         severities = [int(r[0]) for r in sev_rows]
         sev_counts = [int(r[1]) for r in sev_rows]
 
         # Top countries (limit 12 for compactness)
-        cursor.execute(
-            """
-            SELECT country, COUNT(*) as count
-            FROM ip_geolocation
-            WHERE country IS NOT NULL
-            GROUP BY country
-            ORDER BY count DESC
-            LIMIT 12
-        """
-        )
-        country_rows = cursor.fetchall()
+        country_rows = data.top_countries(12)
         countries = [r[0] for r in country_rows]
         country_counts = [int(r[1]) for r in country_rows]
 
         # Top ASNs (limit 10)
-        cursor.execute(
-            """
-            SELECT COALESCE(asn, 'AS-Unknown') AS asn, COUNT(*) as cnt
-            FROM ip_geolocation
-            GROUP BY asn
-            ORDER BY cnt DESC
-            LIMIT 10
-        """
-        )
-        asn_rows = cursor.fetchall()
+        asn_rows = data.top_asns(10)
         asns = [str(r[0]) for r in asn_rows]
         asn_counts = [int(r[1]) for r in asn_rows]
 
         # Top cities bubble data (limit 15)
-        cursor.execute(
-            """
-            SELECT city, country, COUNT(*) as cnt
-            FROM ip_geolocation
-            WHERE city IS NOT NULL AND country IS NOT NULL
-            GROUP BY city, country
-            ORDER BY cnt DESC
-            LIMIT 15
-        """
-        )
-        city_rows = cursor.fetchall()
-        conn.close()
+        city_rows = data.top_cities(15)
 
         # Apply theme
         apply_steampunk_theme()
@@ -226,10 +219,8 @@ def create_steampunk_dashboard(stats):
                 colors=colors,
                 labels=None,
             )
-            if len(_pie) == 3:
-                wedges, texts, _autotexts = _pie
-            else:
-                wedges, texts = _pie
+            # A tuple before matplotlib 3.11, a PieContainer (no len()) since
+            wedges = _pie[0]
             # Center text
             ax1.text(
                 0,
@@ -369,65 +360,28 @@ def create_steampunk_dashboard(stats):
         return False
 
 
-def create_cyber_attack_origins_dashboard(stats):
+def create_cyber_attack_origins_dashboard(data):
     """Create a dashboard focused on cyber attack origins by country."""
     if not _plotting_ready():
         print("Matplotlib not available; skipping cyber attack origins dashboard")
         return False
     assert plt is not None and np is not None
     try:
-        db_path = Path("data/badips.db")
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
         # Top 15 attacking countries
-        cursor.execute(
-            """
-            SELECT country, COUNT(*) as attack_count
-            FROM ip_geolocation
-            WHERE country IS NOT NULL
-            GROUP BY country
-            ORDER BY attack_count DESC
-            LIMIT 15
-        """
-        )
-        country_data = cursor.fetchall()
+        country_data = data.top_countries(15)
         countries = [r[0] for r in country_data]
         attack_counts = [int(r[1]) for r in country_data]
 
-        # Get severity breakdown for top 5 countries
-        cursor.execute(
-            """
-            SELECT g.country, b.severity, COUNT(*) as cnt
-            FROM ip_geolocation g
-            JOIN bad_ips b ON g.ip_address = b.ip_address
-            WHERE g.country IN (
-                SELECT country FROM ip_geolocation
-                WHERE country IS NOT NULL
-                GROUP BY country
-                ORDER BY COUNT(*) DESC
-                LIMIT 5
-            )
-            GROUP BY g.country, b.severity
-            ORDER BY g.country, b.severity
-        """
-        )
-        severity_by_country = cursor.fetchall()
+        # Severity breakdown (only the top 5 countries are plotted)
+        severity_by_country = data.severity_by_country
 
         # Calculate total attacks and find #1 attacker
-        cursor.execute(
-            """
-            SELECT COUNT(*) as total FROM ip_geolocation WHERE country IS NOT NULL
-        """
-        )
-        total_attacks = cursor.fetchone()[0]
-        
+        total_attacks = data.geo_total
+
         top_country = countries[0] if countries else "Unknown"
         top_country_count = attack_counts[0] if attack_counts else 0
         top_country_pct = (top_country_count / total_attacks * 100) if total_attacks > 0 else 0
 
-        conn.close()
-
         # Create figure with gradient background
         fig = plt.figure(figsize=(18, 10), facecolor="#0a0a2e")
         gs = fig.add_gridspec(2, 3, hspace=0.4, wspace=0.35)
@@ -550,81 +504,23 @@ def create_cyber_attack_origins_dashboard(stats):
         return False
 
 
-def get_statistics():
-    """Get statistics from database"""
-    db_path = Path("data/badips.db")
-
-    if not db_path.exists():
-        return None
-
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-
-    # Total IPs
-    cursor.execute("SELECT COUNT(*) FROM bad_ips")
-    total_ips = cursor.fetchone()[0]
-
-    # Countries affected
-    cursor.execute(
-        "SELECT COUNT(DISTINCT country) FROM ip_geolocation WHERE country IS NOT NULL"
-    )
-    countries = cursor.fetchone()[0]
-
-    # Top countries
-    cursor.execute(
-        """
-        SELECT country, COUNT(*) as count 
-        FROM ip_geolocation 
-        WHERE country IS NOT NULL
-        GROUP BY country 
-        ORDER BY count DESC 
-        LIMIT 15
-    """
-    )
-    top_countries = cursor.fetchall()
-
-    # Top cities
-    cursor.execute(
-        """
-        SELECT city, country, COUNT(*) as count 
-        FROM ip_geolocation 
-        WHERE city IS NOT NULL AND country IS NOT NULL
-        GROUP BY city, country
-        ORDER BY count DESC 
-        LIMIT 10
-    """
-    )
-    top_cities = cursor.fetchall()
-
-    # Average threat level
-    cursor.execute("SELECT AVG(severity), MAX(severity), MIN(severity) FROM bad_ips")
-    severity_stats = cursor.fetchone()
-
-    conn.close()
+def get_statistics(data=None):
+    """Get statistics from database (or from already loaded chart data)"""
+    data = data or chart_data.load()
+    return data.stats() if data else None
 
-    return {
-        "total_ips": total_ips,
-        "countries": countries,
-        "top_countries": top_countries,
-        "top_cities": top_cities,
-        "severity_avg": severity_stats[0],
-        "severity_max": severity_stats[1],
-        "severity_min": severity_stats[2],
-        "update_time": datetime.now().isoformat(),
-    }
 
-
-def create_country_chart(stats):
+def create_country_chart(data):
     """Create country distribution chart as PNG image with polished styling"""
-    if not stats or not stats["top_countries"]:
+    if not data or not data.country_counts:
         return False
     if not _plotting_ready():
         print("Matplotlib not available; skipping country chart")
         return False
     assert plt is not None and np is not None
     try:
-        countries = [c[0] for c in stats["top_countries"]]
-        counts = [c[1] for c in stats["top_countries"]]
+        countries = [c[0] for c in data.top_countries(15)]
+        counts = [c[1] for c in data.top_countries(15)]
 
         x = np.arange(len(countries))
         max_count = max(counts) if counts else 1
@@ -671,27 +567,14 @@ def create_country_chart(stats):
         return False
 
 
-def create_severity_chart(stats):
+def create_severity_chart(data):
     """Create severity distribution chart as PNG image with polished styling"""
     if not _plotting_ready():
         print("Matplotlib not available; skipping severity chart")
         return False
     assert plt is not None and np is not None
     try:
-        db_path = Path("data/badips.db")
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT severity, COUNT(*) as count
-            FROM bad_ips
-            GROUP BY severity
-            ORDER BY severity
-        """
-        )
-        severity_data = cursor.fetchall()
-        conn.close()
+        severity_data = [(s, c) for s, c in data.severity_histogram if s is not None]
 
         if not severity_data:
             return False
@@ -754,32 +637,21 @@ def create_severity_chart(stats):
         return False
 
 
-def create_geo_map(stats):
+def create_geo_map(data):
     """Create geographic distribution chart as PNG image with polished styling"""
+    if not _plotting_ready():
+        print("Matplotlib not available; skipping geographic map")
+        return False
     try:
-        db_path = Path("data/badips.db")
-        conn = sqlite3.connect(str(db_path))
-
-        query = """
-            SELECT country, COUNT(*) as count
-            FROM ip_geolocation
-            WHERE country IS NOT NULL
-            GROUP BY country
-            ORDER BY count DESC
-            LIMIT 20
-        """
-
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-
-        if df.empty:
+        rows = data.top_countries(20)
+        if not rows:
             return False
 
         # Matplotlib horizontal bar chart for top 20 countries with vibrant colors
         fig, ax = plt.subplots(figsize=(14, 10), facecolor="#0a0a2e")
 
-        counts = df["count"].to_numpy()
-        labels = df["country"].tolist()
+        counts = np.array([count for _, count in rows])
+        labels = [country for country, _ in rows]
         y = np.arange(len(labels))
         max_count = counts.max() if len(counts) else 1
         palette_colors = steampunk_palette(len(labels))
@@ -825,42 +697,33 @@ def create_geo_map(stats):
         return False
 
 
-def create_world_pins_map(stats):
+def create_world_pins_map(data):
     """Create a world map with colored pins per country using Plotly scattergeo."""
+    if not use_backend("plotly"):
+        print("Plotly not available; skipping world pins map")
+        return False
     try:
-        db_path = Path("data/badips.db")
-        conn = sqlite3.connect(str(db_path))
-        query = """
-            SELECT country, AVG(latitude) AS lat, AVG(longitude) AS lon, COUNT(*) AS cnt
-            FROM ip_geolocation
-            WHERE country IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
-            GROUP BY country
-            ORDER BY cnt DESC
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        if df.empty:
+        rows = data.country_centroids
+        if not rows:
             return False
 
         # Size scaling (area-based): improve legibility across counts
-        counts = df["cnt"]
-        sizeref = (counts.max() / 40.0) if counts.max() else 1
-        texts = [
-            f"{row['country']}: {int(row['cnt']):,} IPs" for _, row in df.iterrows()
-        ]
+        counts = [count for _, _, _, count in rows]
+        sizeref = (max(counts) / 40.0) if max(counts) else 1
+        texts = [f"{country}: {int(count):,} IPs" for country, _, _, count in rows]
 
         # Map IP counts to neon colors cyclically
         neon_colors = ["#ff6b35", "#00d4ff", "#ff00ff", "#00ff88", "#ffaa00", "#ff0080", "#00ffff", "#ffff00"]
-        marker_colors = [neon_colors[i % len(neon_colors)] for i in range(len(df))]
+        marker_colors = [neon_colors[i % len(neon_colors)] for i in range(len(rows))]
 
         fig = go.Figure(
             go.Scattergeo(
-                lon=df["lon"],
-                lat=df["lat"],
+                lon=[lon for _, _, lon, _ in rows],
+                lat=[lat for _, lat, _, _ in rows],
                 text=texts,
                 mode="markers",
                 marker=dict(
-                    size=(counts / sizeref).clip(lower=6),
+                    size=[max(count / sizeref, 6) for count in counts],
                     color=marker_colors,
                     line=dict(width=1.0, color="#00d4ff"),
                     opacity=0.95,
@@ -896,7 +759,8 @@ def create_world_pins_map(stats):
         except Exception as e:
             # Fallback to HTML if kaleido is unavailable
             out_html = charts_path / "map_pins.html"
-            fig.write_html(str(out_html), include_plotlyjs="cdn")
+            # A fixed div id keeps the file identical for identical input
+            fig.write_html(str(out_html), include_plotlyjs="cdn", div_id="map_pins")
             print(f"World pins map created (HTML fallback): {e}")
         return True
     except Exception as e:
@@ -1123,19 +987,205 @@ def create_hn_cyberattack_pie():
         return False
 
 
+# Chart name -> renderer; each takes the ChartData and returns True on success
+CHARTS = {
+    "countries": create_country_chart,
+    "worldmap": create_geo_map,
+    "map_pins": create_world_pins_map,
+    "dashboard": create_steampunk_dashboard,
+    "attack_origins": create_cyber_attack_origins_dashboard,
+    "hn_pie": lambda data: create_hn_cyberattack_pie(),
+}
+
+
+CHARTS_DIR = Path("data/charts")
+# Chart name -> plotting backends it needs
+CHART_BACKENDS = {
+    "countries": ("matplotlib",),
+    "worldmap": ("matplotlib",),
+    "map_pins": ("plotly",),
+    "dashboard": ("matplotlib",),
+    "attack_origins": ("matplotlib",),
+    "hn_pie": ("matplotlib",),
+}
+# Chart name -> (ChartData fields it is drawn from, other input files)
+CHART_INPUTS = {
+    "countries": (("country_counts",), ()),
+    "worldmap": (("country_counts",), ()),
+    "map_pins": (("country_centroids",), ()),
+    "dashboard": (
+        ("severity_histogram", "country_counts", "asn_counts", "city_counts"),
+        (),
+    ),
+    "attack_origins": (("country_counts", "severity_by_country"), ()),
+    "hn_pie": ((), ("data/hn_country_mentions.json",)),
+}
+# Chart name -> files it may write under CHARTS_DIR
+CHART_OUTPUTS = {
+    "countries": ("countries.png",),
+    "worldmap": ("worldmap.png",),
+    "map_pins": ("map_pins.png", "map_pins.html"),
+    "dashboard": ("dashboard.png",),
+    "attack_origins": ("attack_origins.png",),
+    "hn_pie": ("hn_cyberattack_pie.png",),
+}
+
+
+def _version(package):
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def input_digest(name, data):
+    """SHA-256 over everything chart `name` is drawn from: its ChartData fields
+    and input files, this module's source (which holds the themes) and the
+    plotting library versions. Nothing is imported to compute it."""
+    fields, files = CHART_INPUTS[name]
+    h = hashlib.sha256(name.encode())
+    h.update(repr([(field, getattr(data, field)) for field in fields]).encode())
+    for path in map(Path, files):
+        h.update(path.read_bytes() if path.exists() else b"<missing>")
+    for package in ("matplotlib", "numpy", "plotly", "kaleido"):
+        h.update(f"{package} {_version(package)}".encode())
+    h.update(Path(__file__).read_bytes())
+    return h.hexdigest()
+
+
+def _hash_path(name):
+    return CHARTS_DIR / f"{name}.hash"
+
+
+def is_unchanged(name, digest):
+    """True if chart `name` was last rendered from `digest` and its output is
+    still on disk."""
+    try:
+        stored = _hash_path(name).read_text(encoding="utf-8").strip()
+    except OSError:
+        return False
+    return stored == digest and any(
+        (CHARTS_DIR / out).exists() for out in CHART_OUTPUTS[name]
+    )
+
+
+def _available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _render_one(name, data):
+    """Render chart `name`; returns (name, ok, seconds, error)."""
+    start = time.perf_counter()
+    missing = [b for b in CHART_BACKENDS[name] if not use_backend(b)]
+    if missing:
+        return name, False, 0.0, f"{', '.join(missing)} not installed"
+    try:
+        ok, error = bool(CHARTS[name](data)), None
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+    return name, ok, time.perf_counter() - start, error
+
+
+def _chart_worker(name, data, results):
+    os.environ["MPLBACKEND"] = "Agg"
+    if plt is not None:
+        plt.switch_backend("Agg")
+    results.put(_render_one(name, data))
+
+
+def _next_result(results, running):
+    """Wait for the next chart result, or synthesize a failure for a worker
+    that exited without reporting one."""
+    while True:
+        try:
+            return results.get(timeout=0.5)
+        except queue.Empty:
+            pass
+        for name, (proc, started) in running.items():
+            if not proc.is_alive() and proc.exitcode != 0:
+                return (
+                    name,
+                    False,
+                    time.perf_counter() - started,
+                    f"worker exited with code {proc.exitcode}",
+                )
+
+
+def render_charts(data, names=None, workers=None):
+    """Render `names` (default: all of CHARTS) from pre-aggregated `data`.
+
+    Each chart runs in its own process, at most `workers` at a time (default:
+    available cores, or $CHART_WORKERS), using the Agg backend; a chart that
+    raises or kills its process is reported as failed without stopping the
+    others. Returns {name: (ok, seconds, error)}.
+    """
+    names = list(CHARTS if names is None else names)
+    workers = workers or int(os.environ.get("CHART_WORKERS", _available_cores()))
+    workers = max(1, min(workers, len(names)))
+    if workers == 1:
+        return {r[0]: r[1:] for r in (_render_one(name, data) for name in names)}
+
+    # Each worker imports only the backends its chart needs
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    results = ctx.Queue()
+    pending, running, done = list(names), {}, {}
+    while pending or running:
+        while pending and len(running) < workers:
+            name = pending.pop(0)
+            proc = ctx.Process(target=_chart_worker, args=(name, data, results))
+            proc.start()
+            running[name] = (proc, time.perf_counter())
+        name, ok, seconds, error = _next_result(results, running)
+        done[name] = (ok, seconds, error)
+        proc, _ = running.pop(name)
+        proc.join()
+    return {name: done[name] for name in names}
+
+
+def render_changed(data, names=None, workers=None, force=False):
+    """Render the charts in `names` (default: all) whose input digest differs
+    from the one stored next to their output, then store the new digests.
+
+    Unchanged charts are neither rendered nor rewritten, and their plotting
+    backends are never imported. Returns (render_charts results, names of the
+    unchanged charts).
+    """
+    digests = {name: input_digest(name, data) for name in (names or CHARTS)}
+    stale = [
+        name
+        for name, digest in digests.items()
+        if force or not is_unchanged(name, digest)
+    ]
+    results = render_charts(data, stale, workers)
+    for name, (ok, _, _) in results.items():
+        if ok:
+            _hash_path(name).write_text(digests[name] + "\n", encoding="utf-8")
+    return results, [name for name in digests if name not in stale]
+
+
 def main():
     """Main visualization generation function"""
     print("Generating visualizations and updating documentation...")
 
-    # Apply consistent theme
-    apply_viz_theme()
-    apply_steampunk_theme()
+    args = sys.argv[1:]
+    only = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == "--only"]
+    unknown = [name for name in only if name not in CHARTS]
+    if unknown:
+        print(f"Unknown chart: {', '.join(unknown)} (choose from {', '.join(CHARTS)})")
+        return
 
-    stats = get_statistics()
+    data = chart_data.load()
 
-    if not stats:
+    if not data:
         print("No database found. Run process_badips.py first.")
         return
+    stats = data.stats()
 
     print("\nDatabase Statistics:")
     print(f"  Total IPs: {stats['total_ips']:,}")
@@ -1143,12 +1193,14 @@ def main():
     print(f"  Avg Severity: {stats['severity_avg']:.2f}/5")
 
     print("\nCreating visualizations...")
-    create_country_chart(stats)
-    create_geo_map(stats)
-    create_world_pins_map(stats)
-    create_steampunk_dashboard(stats)
-    create_cyber_attack_origins_dashboard(stats)
-    create_hn_cyberattack_pie()
+    start = time.perf_counter()
+    results, unchanged = render_changed(data, only or None, force="--force" in args)
+    print(f"\nRendered charts in {time.perf_counter() - start:.1f}s:")
+    for name, (ok, seconds, error) in results.items():
+        status = "ok" if ok else f"FAILED{f' ({error})' if error else ''}"
+        print(f"  {name:<16} {seconds:6.1f}s  {status}")
+    for name in unchanged:
+        print(f"  {name:<16}    -    unchanged, skipped")
     print("\nUpdating README statistics (safe update)...")
     # Use the lightweight updater that patches only the Database Statistics block
     try:
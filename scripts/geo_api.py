@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Asynchronous, rate-limited client for the ip-api.com batch endpoint.
+
+Used as the geolocation fallback when the GeoLite2 databases are missing.
+Addresses are POSTed `BATCH_SIZE` at a time; a token bucket keeps requests
+under the free-tier limit, a semaphore bounds the number of requests in
+flight, and results are handed back in input order so callers can record
+progress after every batch. Every response's `X-Rl` (requests left in the
+window) and `X-Ttl` (seconds until it resets) are honoured: when the window
+is used up, or on a 429, the bucket pauses every request until the reset.
+"""
+import asyncio
+import time
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+API_BATCH_URL = "http://ip-api.com/batch"
+API_FIELDS = "status,message,query,country,city,lat,lon,as,isp"
+BATCH_SIZE = 100
+# ip-api free tier: 15 batch requests per minute
+RATE_PER_MINUTE = 15
+CONCURRENCY = 4
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts of up to `burst`.
+
+    The bucket starts full, so any `window` seconds see at most
+    `burst + rate * window` acquisitions.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Hand out nothing for `seconds` (until the server's window resets),
+        then start again from a full burst."""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+        self.tokens = self.burst
+        self.updated = self.resume_at
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    await asyncio.sleep(self.resume_at - now)
+                    continue
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_result(item):
+    """Return (ip, country, city, latitude, longitude, asn, isp) for one
+    successful batch result, or None."""
+    if not isinstance(item, dict) or item.get("status") != "success":
+        return None
+    return (
+        item.get("query"),
+        item.get("country"),
+        item.get("city"),
+        item.get("lat"),
+        item.get("lon"),
+        item.get("as"),
+        item.get("isp"),
+    )
+
+
+def _header_int(response, name, default):
+    try:
+        return int(response.headers.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+async def _post_batch(session, url, ips, bucket, semaphore, timeout, retries=3):
+    for _ in range(retries):
+        async with semaphore:
+            await bucket.acquire()
+            response = await asyncio.to_thread(
+                session.post,
+                url,
+                params={"fields": API_FIELDS},
+                json=ips,
+                timeout=timeout,
+            )
+        # Window used up, or rate limited anyway (shared IP?): hold every
+        # request until it resets; the semaphore is already released
+        limited = response.status_code == 429
+        if limited or _header_int(response, "X-Rl", 1) <= 0:
+            bucket.pause(_header_int(response, "X-Ttl", 60))
+        if limited:
+            continue
+        response.raise_for_status()
+        return [row for row in map(parse_result, response.json()) if row]
+    raise requests.exceptions.RetryError(f"still rate limited after {retries} tries")
+
+
+async def _lookup(
+    ips, on_batch, url, batch_size, rate_per_minute, concurrency, timeout
+):
+    batches = [ips[i : i + batch_size] for i in range(0, len(ips), batch_size)]
+    # Start with `burst` tokens and refill the rest of the per-minute limit
+    # over the minute, so no 60 s window exceeds `rate_per_minute`
+    burst = max(1, min(concurrency, rate_per_minute - 1))
+    bucket = TokenBucket(max(rate_per_minute - burst, 1) / 60, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    session = requests.Session()
+    tasks = [
+        asyncio.create_task(
+            _post_batch(session, url, batch, bucket, semaphore, timeout)
+        )
+        for batch in batches
+    ]
+    done = 0
+    try:
+        # Hand results back strictly in order so progress is never ahead of data
+        for batch, task in zip(batches, tasks):
+            try:
+                rows = await task
+            except (requests.exceptions.RequestException, ValueError) as exc:
+                print(f"Warning: geolocation batch failed, stopping: {exc}")
+                break
+            on_batch(batch, rows)
+            done += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        session.close()
+    return done
+
+
+def lookup(
+    ips,
+    on_batch,
+    url=None,
+    batch_size=None,
+    rate_per_minute=None,
+    concurrency=None,
+    timeout=15,
+):
+    """Geolocate `ips` through the batch endpoint (module defaults apply to
+    arguments left as None).
+
+    `on_batch(batch_ips, rows)` is called once per batch, in input order,
+    with the rows from `parse_result`. Stops at the first failed batch.
+    Returns the number of batches completed. Raises RuntimeError if
+    `requests` is not installed.
+    """
+    if requests is None:
+        raise RuntimeError("requests is required; run: pip install requests")
+    return asyncio.run(
+        _lookup(
+            list(ips),
+            on_batch,
+            url or API_BATCH_URL,
+            batch_size or BATCH_SIZE,
+            rate_per_minute or RATE_PER_MINUTE,
+            concurrency or CONCURRENCY,
+            timeout,
+        )
+    )
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Persistent geolocation result cache keyed by network prefix.
+
+Each entry covers the address range of the prefix a lookup answered for
+(`start_key`..`end_key`, packed as in `ipkeys`), so one entry serves every
+address in that block. Entries live in `<repo>/.cache/geo.db`, are namespaced per
+data source (e.g. `ip-api`, `city:<build_epoch>`), expire after `ttl`
+seconds and are trimmed least-recently-used first beyond `max_entries`.
+"""
+import json
+import time
+from pathlib import Path
+
+import db
+from ipkeys import V4_MAPPED_PREFIX, ip_to_key
+
+# At the repository root whatever the working directory (CI caches it there)
+CACHE_PATH = Path(__file__).resolve().parent.parent / ".cache" / "geo.db"
+DEFAULT_TTL = 30 * 86400
+MAX_ENTRIES = 1_000_000
+
+
+def prefix_range(key, prefix_len):
+    """Return (start_key, end_key) of the `prefix_len` block containing `key`.
+
+    For IPv4 keys `prefix_len` counts IPv4 bits (0-32).
+    """
+    if key.startswith(V4_MAPPED_PREFIX):
+        prefix_len += 96
+    host_bits = 128 - max(0, min(prefix_len, 128))
+    start = (int.from_bytes(key, "big") >> host_bits) << host_bits
+    end = start | ((1 << host_bits) - 1)
+    return start.to_bytes(16, "big"), end.to_bytes(16, "big")
+
+
+class GeoCache:
+    """Prefix-keyed LRU + TTL cache for one `namespace`, backed by SQLite.
+
+    `hits` and `misses` count lookups so callers can report how many
+    external lookups were avoided. Use as a context manager, or call
+    `close()` to persist recency updates and evict.
+    """
+
+    def __init__(self, namespace, path=None, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self._pending = []
+        path = Path(path or CACHE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = db.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                namespace TEXT NOT NULL,
+                start_key BLOB NOT NULL,
+                end_key BLOB NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, start_key)
+            ) WITHOUT ROWID
+        """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_geo_cache_last_used "
+            "ON geo_cache(last_used)"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_range(self, ip):
+        """Return (start_key, end_key, value) of the live entry covering `ip`,
+        or None."""
+        key = ip_to_key(ip)
+        row = None
+        if key is not None:
+            row = self.conn.execute(
+                """
+                SELECT start_key, end_key, value, stored_at FROM geo_cache
+                WHERE namespace = ? AND start_key <= ?
+                ORDER BY start_key DESC LIMIT 1
+            """,
+                (self.namespace, key),
+            ).fetchone()
+        now = time.time()
+        if row is None or row[1] < key or row[3] < now - self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched[row[0]] = now
+        return row[0], row[1], json.loads(row[2])
+
+    def get(self, ip):
+        """Return the cached value for `ip`, or None."""
+        entry = self.get_range(ip)
+        return entry[2] if entry else None
+
+    def put(self, ip, prefix_len, value):
+        """Cache `value` for the `prefix_len` block containing `ip`."""
+        key = ip_to_key(ip)
+        if key is not None:
+            self.put_range(*prefix_range(key, prefix_len), value)
+
+    def put_range(self, start_key, end_key, value):
+        """Cache `value` for [start_key, end_key]; written on `close()`."""
+        now = time.time()
+        self._pending.append(
+            (self.namespace, start_key, end_key, json.dumps(value), now, now)
+        )
+
+    def close(self):
+        """Write new entries, persist recency, and drop expired and
+        least-recently-used entries.
+
+        Writes are batched here so concurrent workers sharing the file only
+        hold the write lock briefly.
+        """
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO geo_cache
+            (namespace, start_key, end_key, value, stored_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            self._pending,
+        )
+        self._pending = []
+        self.conn.executemany(
+            "UPDATE geo_cache SET last_used = ? WHERE namespace = ? AND start_key = ?",
+            [(t, self.namespace, k) for k, t in self._touched.items()],
+        )
+        self._touched = {}
+        self.conn.execute(
+            "DELETE FROM geo_cache WHERE stored_at < ?", (time.time() - self.ttl,)
+        )
+        self.conn.execute(
+            """
+            DELETE FROM geo_cache WHERE (namespace, start_key) IN (
+                SELECT namespace, start_key FROM geo_cache
+                ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """,
+            (self.max_entries,),
+        )
+        self.conn.commit()
+        self.conn.close()
+
+    def report(self):
+        """Print hit/miss counts for this namespace."""
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0
+        print(
+            f"Geo cache [{self.namespace}]: {self.hits} hits, {self.misses} misses"
+            f" ({rate:.0f}% of lookups avoided)"
+        )
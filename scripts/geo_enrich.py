@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Bulk GeoIP lookups against the GeoLite2 City/ASN `.mmdb` files.
+
+Readers are opened memory-mapped, addresses are looked up in sorted order,
+and each result is reused for every following address inside the network
+prefix the database returned for it (one lookup per /24-ish block instead of
+one per address). Lookups can be split across worker processes; each worker
+maps the same files, so pages are shared through the OS cache.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+from geo_cache import GeoCache, prefix_range
+from ipkeys import ip_to_key
+
+
+def open_mmdb(path):
+    """Open an mmdb memory-mapped, using the C extension when it is built."""
+    if maxminddb is None:
+        raise RuntimeError("maxminddb is required; run: pip install geoip2")
+    try:
+        return maxminddb.open_database(str(path), maxminddb.MODE_MMAP_EXT)
+    except (ImportError, ValueError):
+        return maxminddb.open_database(str(path), maxminddb.MODE_MMAP)
+
+
+class PrefixCache:
+    """Look up addresses in one reader, reusing the record for the network
+    prefix of the previous lookup.
+
+    Callers feed addresses in sorted order, so every address inside a cached
+    prefix arrives back to back and a single cached range is enough. With a
+    `geo_cache.GeoCache` as `store`, prefixes resolved by earlier runs are
+    reused and new ones are saved.
+    """
+
+    def __init__(self, reader, extract, store=None):
+        self.reader = reader
+        self.extract = extract
+        self.store = store
+        self.range = None  # (start_key, end_key)
+        self.value = None
+
+    def get(self, ip):
+        key = ip_to_key(ip)
+        if key is None:
+            raise ValueError(f"invalid address: {ip}")
+        if self.range and self.range[0] <= key <= self.range[1]:
+            return self.value
+        entry = self.store.get_range(ip) if self.store else None
+        if entry:
+            start, end, value = entry
+            value = tuple(value) if value else None
+        else:
+            record, prefix_len = self.reader.get_with_prefix_len(ip)
+            start, end = prefix_range(key, prefix_len)
+            value = self.extract(record) if record else None
+            if self.store:
+                self.store.put_range(start, end, value)
+        self.range = (start, end)
+        self.value = value
+        return value
+
+
+def _name(entry):
+    return ((entry or {}).get("names") or {}).get("en")
+
+
+def city_fields(record):
+    """(country_iso, city, latitude, longitude) from a GeoLite2-City record."""
+    location = record.get("location") or {}
+    subdivisions = record.get("subdivisions") or [{}]
+    return (
+        (record.get("country") or {}).get("iso_code"),
+        _name(record.get("city")) or _name(subdivisions[0]),
+        location.get("latitude"),
+        location.get("longitude"),
+    )
+
+
+def asn_fields(record):
+    """(`AS<number>`, organization) from a GeoLite2-ASN record."""
+    number = record.get("autonomous_system_number")
+    return (
+        f"AS{number}" if number else None,
+        record.get("autonomous_system_organization"),
+    )
+
+
+def build_epoch(*paths):
+    """Return the newest `build_epoch` among the given mmdb files (0 if none)."""
+    epochs = [0]
+    for path in paths:
+        if path:
+            reader = open_mmdb(path)
+            try:
+                epochs.append(reader.metadata().build_epoch)
+            finally:
+                reader.close()
+    return max(epochs)
+
+
+def lookup_sorted(ips, city_db_path, asn_db_path=None, cache_path=None, stats=None):
+    """Yield (ip, country, city, latitude, longitude, asn, isp) for sorted
+    `ips` in a single pass over both databases.
+
+    Addresses found in neither database are skipped. With `cache_path`,
+    prefixes are also looked up in / saved to the persistent `GeoCache`,
+    namespaced by each database's build epoch; its hit/miss counts are added
+    to `stats` (namespace -> [hits, misses]) or printed if `stats` is None.
+    """
+    readers = [open_mmdb(city_db_path)]
+    if asn_db_path:
+        readers.append(open_mmdb(asn_db_path))
+    stores = []
+    if cache_path:
+        for kind, reader in zip(("city", "asn"), readers):
+            namespace = f"{kind}:{reader.metadata().build_epoch}"
+            stores.append(GeoCache(namespace, cache_path))
+    try:
+        city = PrefixCache(readers[0], city_fields, stores[0] if stores else None)
+        asn = None
+        if len(readers) > 1:
+            asn = PrefixCache(readers[1], asn_fields, stores[1] if stores else None)
+        for ip in ips:
+            try:
+                fields = city.get(ip)
+                org = asn.get(ip) if asn else None
+            except (OSError, ValueError):  # malformed or wrong-family address
+                continue
+            if fields is None and org is None:
+                continue
+            yield (ip,) + (fields or (None,) * 4) + (org or (None, None))
+    finally:
+        for reader in readers:
+            reader.close()
+        for store in stores:
+            if stats is None:
+                store.report()
+            else:
+                counts = stats.setdefault(store.namespace, [0, 0])
+                counts[0] += store.hits
+                counts[1] += store.misses
+            store.close()
+
+
+def _lookup_chunk(args):
+    stats = {}
+    return list(lookup_sorted(*args, stats=stats)), stats
+
+
+def bulk_lookup(ips, city_db_path, asn_db_path=None, workers=1, cache_path=None):
+    """Yield lookup rows for `ips` (already sorted by address).
+
+    With `workers > 1` the list is cut into contiguous slices, so each process
+    still walks neighbouring addresses and keeps its prefix cache warm.
+    """
+    ips = list(ips)
+    if workers <= 1 or len(ips) < 2 * workers:
+        yield from lookup_sorted(ips, city_db_path, asn_db_path, cache_path)
+        return
+    size = -(-len(ips) // workers)
+    chunks = [
+        (ips[i : i + size], city_db_path, asn_db_path, cache_path)
+        for i in range(0, len(ips), size)
+    ]
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows, stats in executor.map(_lookup_chunk, chunks):
+            for namespace, (hits, misses) in stats.items():
+                counts = totals.setdefault(namespace, [0, 0])
+                counts[0] += hits
+                counts[1] += misses
+            yield from rows
+    for namespace, (hits, misses) in totals.items():
+        print(f"Geo cache [{namespace}]: {hits} hits, {misses} misses")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Persistent conditional-GET cache for feed and database downloads.
+
+Validators (ETag / Last-Modified) and bodies are stored per URL under
+`<repo>/.cache/http/`. Later requests send `If-None-Match` /
+`If-Modified-Since`; on `304 Not Modified` the cached body is reused and the
+result is flagged `unchanged` so callers can skip reparsing.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+# At the repository root whatever the working directory (CI caches it there)
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "http"
+
+# body: bytes (None unless read via `fetch`), unchanged: served from cache after
+# a 304, path: where the body lives on disk
+CachedResponse = namedtuple(
+    "CachedResponse", "body encoding unchanged status path", defaults=(None,)
+)
+
+
+def _entry_paths(url, cache_dir=None):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    return cache_dir / f"{key}.json", cache_dir / f"{key}.body"
+
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _save_meta(meta_path, url, response, size):
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "encoding": response.encoding,
+        "size": size,
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _write_atomic(meta_path, json.dumps(meta, indent=2).encode("utf-8"))
+
+
+def _validator_headers(meta):
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def _iter_body(response, timeout=None):
+    """Yield body chunks, giving up once the whole download exceeds `timeout`."""
+    give_up = time.monotonic() + timeout if timeout else None
+    for chunk in response.iter_content(chunk_size=65536):
+        if give_up is not None and time.monotonic() > give_up:
+            raise requests.exceptions.Timeout(f"download exceeded {timeout}s")
+        yield chunk
+
+
+def fetch(url, timeout=20, session=None, cache_dir=None):
+    """GET `url`, revalidating against the cache; returns a `CachedResponse`
+    with the body loaded into memory.
+
+    `timeout` bounds the whole download. Raises `requests` exceptions on
+    network/HTTP errors and RuntimeError if `requests` is not installed.
+    """
+    response = fetch_file(url, timeout=timeout, session=session, cache_dir=cache_dir)
+    return response._replace(body=Path(response.path).read_bytes())
+
+
+def fetch_file(url, timeout=20, session=None, cache_dir=None):
+    """Like `fetch`, but stream the body into the cache without loading it;
+    read it from `response.path`."""
+    _, body_path = _entry_paths(url, cache_dir)
+    return download(
+        url,
+        body_path,
+        timeout=timeout,
+        session=session,
+        cache_dir=cache_dir,
+        max_seconds=timeout,
+    )
+
+
+def download(
+    url, target_path, timeout=30, session=None, cache_dir=None, max_seconds=None
+):
+    """Download `url` to `target_path` unless upstream reports it unchanged.
+
+    Validators are cached under `cache_dir`; the body is streamed to
+    `target_path`, which is replaced atomically. `timeout` is the
+    connect/read timeout and `max_seconds` optionally bounds the whole
+    download. Returns a `CachedResponse` with `body=None`.
+    """
+    if requests is None:
+        raise RuntimeError("requests is required; run: pip install requests")
+    target = Path(target_path)
+    meta_path, _ = _entry_paths(url, cache_dir)
+    meta = _load_meta(meta_path) if target.exists() else {}
+
+    http = session or requests
+    with http.get(
+        url, timeout=timeout, stream=True, headers=_validator_headers(meta)
+    ) as r:
+        if r.status_code == 304 and meta:
+            return CachedResponse(None, meta.get("encoding"), True, 304, target)
+        r.raise_for_status()
+        tmp = target.with_name(target.name + ".part")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        with open(tmp, "wb") as f:
+            for chunk in _iter_body(r, max_seconds):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp, target)
+        _save_meta(meta_path, url, r, size)
+        return CachedResponse(None, r.encoding, False, r.status_code, target)
+
+
+def decode(response):
+    """Return the text of a `CachedResponse` body."""
+    return (response.body or b"").decode(response.encoding or "utf-8", errors="replace")
@@ -7,13 +7,15 @@ store them in data/feeds_ips.csv to be merged into the main database.
 import re
 import csv
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 try:
     import feedparser
 except ImportError:
     feedparser = None
 
+import http_cache
+
 IPV4_REGEX = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
 
 
@@ -72,11 +74,20 @@ def ingest():
     feeds = load_feeds_list()
     seen_ips = set()
     rows = []
-    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
+    unchanged = 0
     for url in feeds:
         try:
-            feed = feedparser.parse(url)
+            if http_cache.requests is not None:
+                response = http_cache.fetch(url, timeout=20)
+                if response.unchanged:
+                    # 304: entries were already ingested on a previous run
+                    unchanged += 1
+                    continue
+                feed = feedparser.parse(response.body)
+            else:
+                feed = feedparser.parse(url)
             if getattr(feed, "bozo", 0):
                 continue
             for entry in feed.entries:
@@ -108,7 +119,10 @@ def ingest():
             writer = csv.writer(f)
             writer.writerows(rows)
 
-    print(f"RSS ingest complete: {len(rows)} new IPs from {len(feeds)} feeds")
+    print(
+        f"RSS ingest complete: {len(rows)} new IPs from {len(feeds)} feeds "
+        f"({unchanged} unchanged)"
+    )
     return len(rows)
 
 
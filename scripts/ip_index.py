@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+In-memory index of `bad_ips` and `bad_networks` for bulk lookups.
+
+The whole table is read once; afterwards each lookup is one dict probe for
+the address plus one per network prefix length in use, with no SQL.
+"""
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+
+from ipkeys import V4_MAPPED_PREFIX, ip_to_key
+
+# Output columns of `IpIndex.lookup`
+FIELDS = (
+    "ip",
+    "match",
+    "severity",
+    "threat_count",
+    "network",
+    "country",
+    "city",
+    "asn",
+)
+
+
+class IpIndex:
+    """Exact addresses keyed by packed `ip_key`, networks by aligned start.
+
+    Networks are grouped per (family, prefix length) so that a covering
+    network is found by masking the address once per group.
+    """
+
+    def __init__(self):
+        self.ips = {}
+        # [(is_v4, host_bits, {start_int: row})], most specific first
+        self.networks = []
+        # Sorted `ips` keys, built on the first range query
+        self.sorted_keys = None
+
+    @classmethod
+    def from_db(cls, conn):
+        index = cls()
+        cursor = conn.execute(
+            """
+            SELECT bi.ip_key, bi.severity, bi.threat_count,
+                   ig.country, ig.city, ig.asn
+            FROM bad_ips bi
+            LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+            WHERE bi.ip_key IS NOT NULL
+        """
+        )
+        index.ips = {row[0]: row[1:] for row in cursor}
+        groups = {}
+        try:
+            cursor = conn.execute(
+                "SELECT network, start_key, prefix_len, severity, threat_count "
+                "FROM bad_networks"
+            )
+            for network, start_key, prefix_len, severity, threat_count in cursor:
+                is_v4 = bytes(start_key).startswith(V4_MAPPED_PREFIX)
+                host_bits = (32 if is_v4 else 128) - prefix_len
+                table = groups.setdefault((is_v4, host_bits), {})
+                table[int.from_bytes(start_key, "big")] = (
+                    network,
+                    severity,
+                    threat_count,
+                )
+        except sqlite3.OperationalError:
+            pass  # database predates the bad_networks table
+        index.networks = [
+            (is_v4, host_bits, table)
+            for (is_v4, host_bits), table in sorted(
+                groups.items(), key=lambda g: g[0][1]
+            )
+        ]
+        return index
+
+    def find_network(self, key):
+        """Return the most specific listed network row covering `key`."""
+        value = int.from_bytes(key, "big")
+        is_v4 = key.startswith(V4_MAPPED_PREFIX)
+        for net_v4, host_bits, table in self.networks:
+            if net_v4 == is_v4:
+                row = table.get((value >> host_bits) << host_bits)
+                if row:
+                    return row
+        return None
+
+    def keys_in_range(self, start_key, end_key):
+        """Return the listed address keys in [start_key, end_key], ascending."""
+        if self.sorted_keys is None:
+            self.sorted_keys = sorted(self.ips)
+        lo = bisect_left(self.sorted_keys, start_key)
+        hi = bisect_right(self.sorted_keys, end_key)
+        return self.sorted_keys[lo:hi]
+
+    def networks_overlapping(self, start_key, end_key):
+        """Return (network, severity, threat_count) rows for listed networks
+        that overlap [start_key, end_key], i.e. contain or lie inside it."""
+        start = int.from_bytes(start_key, "big")
+        end = int.from_bytes(end_key, "big")
+        is_v4 = start_key.startswith(V4_MAPPED_PREFIX)
+        rows = []
+        for net_v4, host_bits, table in self.networks:
+            if net_v4 != is_v4:
+                continue
+            for net_start, row in table.items():
+                if net_start <= end and net_start | ((1 << host_bits) - 1) >= start:
+                    rows.append(row)
+        return rows
+
+    def lookup(self, ip):
+        """Return a `FIELDS` tuple if `ip` is listed or inside a listed
+        network, else None. Raises ValueError for invalid addresses."""
+        key = ip_to_key(ip)
+        if key is None:
+            raise ValueError(ip)
+        network = self.find_network(key) if self.networks else None
+        row = self.ips.get(key)
+        if row:
+            severity, threat_count, country, city, asn = row
+            name = network[0] if network else None
+            return (ip, "ip", severity, threat_count, name, country, city, asn)
+        if network:
+            name, severity, threat_count = network
+            return (ip, "network", severity, threat_count, name, None, None, None)
+        return None
+
+
+def iter_addresses(lines):
+    """Yield the first whitespace/comma separated field of each input line."""
+    for line in lines:
+        field = line.strip().split(None, 1)
+        if field:
+            yield field[0].split(",", 1)[0]
+
+
+def scan(index, lines, on_match):
+    """Check every address in `lines`, calling `on_match(row)` for hits.
+
+    Returns (checked, matched, invalid, seconds).
+    """
+    checked = matched = invalid = 0
+    start = time.perf_counter()
+    lookup = index.lookup
+    for ip in iter_addresses(lines):
+        try:
+            row = lookup(ip)
+        except ValueError:
+            invalid += 1
+            continue
+        checked += 1
+        if row:
+            matched += 1
+            on_match(row)
+    return checked, matched, invalid, time.perf_counter() - start
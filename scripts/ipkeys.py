@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Packed IP keys shared by the database scripts.
+
+Every address is stored as a 16-byte big-endian blob; IPv4 addresses use the
+IPv4-mapped IPv6 form (::ffff:a.b.c.d). Byte order therefore equals numeric
+order, so one indexed `ip_key` column serves IPv4 and IPv6 equality joins and
+`BETWEEN` range scans alike.
+"""
+import ipaddress
+import socket
+
+V4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+# Special-purpose blocks (RFC 6890): private, loopback, link-local, shared,
+# documentation, benchmarking, multicast and reserved space
+RESERVED_NETWORKS = tuple(
+    ipaddress.ip_network(cidr)
+    for cidr in (
+        "0.0.0.0/8",
+        "10.0.0.0/8",
+        "100.64.0.0/10",
+        "127.0.0.0/8",
+        "169.254.0.0/16",
+        "172.16.0.0/12",
+        "192.0.0.0/24",
+        "192.0.2.0/24",
+        "192.88.99.0/24",
+        "192.168.0.0/16",
+        "198.18.0.0/15",
+        "198.51.100.0/24",
+        "203.0.113.0/24",
+        "224.0.0.0/4",
+        "240.0.0.0/4",
+        "::/8",
+        "100::/64",
+        "2001::/23",
+        "2001:db8::/32",
+        "2002::/16",
+        "fc00::/7",
+        "fe80::/10",
+        "ff00::/8",
+    )
+)
+
+
+def ip_to_key(ip):
+    """Return the 16-byte key for `ip`, or None if it is not a valid address."""
+    try:
+        return V4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip)
+    except (OSError, TypeError):
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip)
+    except (OSError, TypeError):
+        return None
+
+
+def key_to_ip(key):
+    """Return the canonical address string for a 16-byte key."""
+    key = bytes(key)
+    if key.startswith(V4_MAPPED_PREFIX):
+        return socket.inet_ntop(socket.AF_INET, key[12:])
+    return socket.inet_ntop(socket.AF_INET6, key)
+
+
+def network_bounds(cidr):
+    """Return (start_key, end_key) for a CIDR block such as `45.148.0.0/16`.
+
+    Host bits are ignored. Raises ValueError for malformed networks.
+    """
+    net = ipaddress.ip_network(cidr.strip(), strict=False)
+    return (
+        ip_to_key(str(net.network_address)),
+        ip_to_key(str(net.broadcast_address)),
+    )
+
+
+def parse_network(cidr):
+    """Return (network, start_key, end_key, prefix_len) for a CIDR string.
+
+    `network` is the canonical text form with host bits cleared. Raises
+    ValueError for malformed networks.
+    """
+    net = ipaddress.ip_network(cidr.strip(), strict=False)
+    start_key, end_key = network_bounds(str(net))
+    return str(net), start_key, end_key, net.prefixlen
+
+
+def is_public_network(cidr):
+    """True unless CIDR block `cidr` overlaps private, loopback, link-local,
+    multicast or otherwise reserved space (so 0.0.0.0/0 is not public)."""
+    net = ipaddress.ip_network(cidr, strict=False)
+    return not any(
+        net.overlaps(reserved)
+        for reserved in RESERVED_NETWORKS
+        if reserved.version == net.version
+    )
+
+
+def covering_starts(key, prefix_lens):
+    """Return the start keys of all networks with a prefix length in
+    `prefix_lens` that could contain `key`.
+
+    CIDR blocks are aligned, so for each prefix length there is exactly one
+    candidate: the address with its host bits cleared. Prefix lengths are
+    interpreted in the address family of `key`.
+    """
+    value = int.from_bytes(bytes(key), "big")
+    bits = 32 if bytes(key).startswith(V4_MAPPED_PREFIX) else 128
+    starts = []
+    for prefix_len in sorted(set(prefix_lens), reverse=True):
+        if 0 <= prefix_len <= bits:
+            host_bits = bits - prefix_len
+            starts.append(((value >> host_bits) << host_bits).to_bytes(16, "big"))
+    return starts
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Long-running HTTP lookup service over `data/badips.db`.
+
+The database is loaded once into an `ip_index.IpIndex` and reloaded in the
+background whenever the file changes, so requests never touch SQLite.
+
+Endpoints (all JSON):
+  GET  /ip/<addr>             - is the address listed (directly or by network)
+  POST /bulk                  - JSON list (or newline-separated text) of IPs
+  GET  /network/<cidr>[?limit=N]
+                              - listed IPs inside a block, overlapping networks
+  GET  /health                - index size and load time
+  GET  /metrics               - per-endpoint latency histograms
+
+Usage:
+  python scripts/lookup_server.py [--db PATH] [--host HOST] [--port PORT]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import db
+import ip_index
+from ipkeys import key_to_ip, parse_network
+
+DB_PATH = Path("data/badips.db")
+RELOAD_INTERVAL = 5
+MAX_BULK = 100_000
+NETWORK_LIMIT = 100
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class LatencyHistogram:
+    """Thread-safe request latency counts per endpoint."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = {}
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, seconds):
+        ms = seconds * 1000
+        i = next((i for i, b in enumerate(self.buckets) if ms <= b), len(self.buckets))
+        with self._lock:
+            counts = self.counts.setdefault(endpoint, [0] * (len(self.buckets) + 1))
+            counts[i] += 1
+            self.totals[endpoint] = self.totals.get(endpoint, 0) + ms
+
+    def snapshot(self):
+        """Return {endpoint: {count, mean_ms, buckets: {"<=X ms": n}}}."""
+        labels = [f"<={b}ms" for b in self.buckets] + [f">{self.buckets[-1]}ms"]
+        with self._lock:
+            return {
+                endpoint: {
+                    "count": sum(counts),
+                    "mean_ms": round(self.totals[endpoint] / sum(counts), 4),
+                    "buckets": dict(zip(labels, counts)),
+                }
+                for endpoint, counts in self.counts.items()
+            }
+
+
+class IndexHolder:
+    """The current `IpIndex` for `db_path`, swapped atomically on reload."""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = Path(db_path)
+        self.index = None
+        self.loaded_at = None
+        self.stamp = None
+
+    def _stamp(self):
+        stamp = []
+        for path in (self.db_path, Path(str(self.db_path) + "-wal")):
+            try:
+                st = path.stat()
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def reload_if_changed(self):
+        """Rebuild the index if the database changed; returns True if it did.
+
+        Readers keep using the previous index until the new one is complete.
+        """
+        stamp = self._stamp()
+        if stamp == self.stamp:
+            return False
+        conn = db.connect_readonly(self.db_path)
+        try:
+            index = ip_index.IpIndex.from_db(conn)
+        finally:
+            conn.close()
+        index.keys_in_range(b"", b"")  # build the sorted keys up front
+        self.index, self.stamp, self.loaded_at = index, stamp, time.time()
+        return True
+
+    def watch(self, interval, stop):
+        """Poll for changes every `interval` seconds until `stop` is set."""
+        while not stop.wait(interval):
+            try:
+                if self.reload_if_changed():
+                    print(f"Reloaded {self.db_path}: {len(self.index.ips):,} IPs")
+            except sqlite3.Error as exc:
+                # Mid-write or briefly missing: keep serving the old index
+                print(f"Warning: reload of {self.db_path} failed: {exc}")
+
+
+def _row(ip, index):
+    try:
+        row = index.lookup(ip)
+    except ValueError:
+        return {"ip": ip, "error": "invalid address"}
+    if row is None:
+        return {"ip": ip, "listed": False}
+    return {"listed": True, **dict(zip(ip_index.FIELDS, row))}
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY every
+    # keep-alive response waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _timed(self, handler):
+        start = time.perf_counter()
+        endpoint = "/" + urlsplit(self.path).path.split("/")[1]
+        try:
+            status, payload = handler()
+        except Exception as exc:  # keep serving other requests
+            status, payload = 500, {"error": str(exc)}
+        self._send(status, payload)
+        self.server.histogram.observe(endpoint, time.perf_counter() - start)
+
+    def do_GET(self):
+        self._timed(self._get)
+
+    def do_POST(self):
+        self._timed(self._post)
+
+    def _get(self):
+        url = urlsplit(self.path)
+        holder = self.server.holder
+        index = holder.index
+        if url.path.startswith("/ip/"):
+            row = _row(url.path[len("/ip/") :], index)
+            return (400 if "error" in row else 200), row
+        if url.path.startswith("/network/"):
+            cidr = url.path[len("/network/") :]
+            try:
+                network, start_key, end_key, _ = parse_network(cidr)
+                limit = int(parse_qs(url.query).get("limit", [NETWORK_LIMIT])[0])
+            except ValueError:
+                return 400, {"error": f"invalid network: {cidr}"}
+            keys = index.keys_in_range(start_key, end_key)
+            return 200, {
+                "network": network,
+                "listed_ips": len(keys),
+                "ips": [key_to_ip(key) for key in keys[:limit]],
+                "networks": [
+                    {"network": name, "severity": severity, "threat_count": count}
+                    for name, severity, count in index.networks_overlapping(
+                        start_key, end_key
+                    )
+                ],
+            }
+        if url.path == "/health":
+            return 200, {
+                "ips": len(index.ips),
+                "network_groups": len(index.networks),
+                "loaded_at": holder.loaded_at,
+            }
+        if url.path == "/metrics":
+            return 200, self.server.histogram.snapshot()
+        return 404, {"error": "not found"}
+
+    def _post(self):
+        if urlsplit(self.path).path != "/bulk":
+            return 404, {"error": "not found"}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            ips = json.loads(body)
+        except ValueError:
+            ips = body.decode("utf-8", "replace").split()
+        if not isinstance(ips, list) or not all(isinstance(ip, str) for ip in ips):
+            return 400, {"error": "expected a JSON list of addresses"}
+        if len(ips) > MAX_BULK:
+            return 413, {"error": f"at most {MAX_BULK} addresses per request"}
+        index = self.server.holder.index
+        results = [_row(ip, index) for ip in ips]
+        return 200, {
+            "checked": len(results),
+            "listed": sum(1 for r in results if r.get("listed")),
+            "results": results,
+        }
+
+
+class LookupServer(ThreadingHTTPServer):
+    """Threaded server holding the index, the latency histogram and the
+    reload thread; `shutdown()` stops both the server and the watcher."""
+
+    daemon_threads = True
+
+    def __init__(self, address, db_path=DB_PATH, reload_interval=RELOAD_INTERVAL):
+        self.holder = IndexHolder(db_path)
+        self.holder.reload_if_changed()
+        self.histogram = LatencyHistogram()
+        self._stop = threading.Event()
+        super().__init__(address, LookupHandler)
+        threading.Thread(
+            target=self.holder.watch, args=(reload_interval, self._stop), daemon=True
+        ).start()
+
+    def shutdown(self):
+        self._stop.set()
+        super().shutdown()
+
+
+def main():
+    args = sys.argv[1:]
+
+    def option(name, default):
+        if name in args and args.index(name) + 1 < len(args):
+            return args[args.index(name) + 1]
+        return default
+
+    db_path = Path(option("--db", DB_PATH))
+    if not db_path.exists():
+        print("ERROR: Database not found. Run process_badips.py first.")
+        return
+    host = option("--host", "127.0.0.1")
+    port = int(option("--port", os.environ.get("LOOKUP_PORT", "8080")))
+    server = LookupServer((host, port), db_path)
+    print(
+        f"Serving {len(server.holder.index.ips):,} IPs from {db_path}"
+        f" on http://{host}:{server.server_port}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ import csv
 from pathlib import Path
 from datetime import datetime
 import json
+import os
+import time
 
 import ipaddress
 
@@ -15,20 +17,30 @@ try:
 except ImportError:
     requests = None
 
-try:
-    import geoip2.database
-except ImportError:
-    geoip2 = None
-
 import random
 
+import badips_idx
+import db
+import geo_api
+import geo_cache
+import geo_enrich
+import http_cache
+import rollups
+from ipkeys import ip_to_key, is_public_network, parse_network
+
+# Bump together with a new entry in MIGRATIONS
+SCHEMA_VERSION = 6
+# data/*.csv files that summarize or report on the sources rather than list
+# them; their IPs are already in the per-source CSVs, without scores
+DERIVED_CSVS = ("fetched_ips.csv", "new_ips.csv", "resolved_domains.csv")
 
-def create_database():
+
+def create_database(db_path="data/badips.db"):
     """Create SQLite database"""
-    db_path = Path("data/badips.db")
+    db_path = Path(db_path)
     db_path.parent.mkdir(exist_ok=True)
 
-    conn = sqlite3.connect(str(db_path))
+    conn = db.connect(db_path)
     cursor = conn.cursor()
 
     # Create tables
@@ -86,9 +98,132 @@ def create_database():
     )
 
     conn.commit()
+    migrate_database(conn)
     return conn
 
 
+def _column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _migrate_ip_keys(conn):
+    """v1: add packed `ip_key` columns with indexes and backfill them in place."""
+    cursor = conn.cursor()
+    conn.create_function("pack_ip", 1, ip_to_key, deterministic=True)
+    for table in ("bad_ips", "ip_geolocation"):
+        if not _column_exists(cursor, table, "ip_key"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN ip_key BLOB")
+        cursor.execute(
+            f"UPDATE {table} SET ip_key = pack_ip(ip_address) WHERE ip_key IS NULL"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_ip_key ON {table}(ip_key)"
+        )
+
+
+def _migrate_bad_networks(conn):
+    """v2: `bad_networks` table holding CIDR blocks as [start_key, end_key]."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bad_networks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            network TEXT UNIQUE NOT NULL,
+            start_key BLOB NOT NULL,
+            end_key BLOB NOT NULL,
+            prefix_len INTEGER NOT NULL,
+            severity INTEGER DEFAULT 3,
+            sources TEXT,
+            first_seen TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
+            threat_count INTEGER DEFAULT 1
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bad_networks_start_key "
+        "ON bad_networks(start_key, end_key)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bad_networks_prefix_len "
+        "ON bad_networks(prefix_len)"
+    )
+
+
+def _migrate_geo_build_epoch(conn):
+    """v3: record which GeoLite2 build enriched each `ip_geolocation` row."""
+    cursor = conn.cursor()
+    if not _column_exists(cursor, "ip_geolocation", "geo_build_epoch"):
+        cursor.execute("ALTER TABLE ip_geolocation ADD COLUMN geo_build_epoch INTEGER")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ip_geolocation_build_epoch "
+        "ON ip_geolocation(geo_build_epoch)"
+    )
+
+
+def _migrate_enrichment_progress(conn):
+    """v4: per-task resume cursor for long-running enrichment."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS enrichment_progress (
+            task TEXT PRIMARY KEY,
+            last_ip_key BLOB,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    )
+
+
+def _migrate_rollups(conn):
+    """v5: trigger-maintained `agg_*` rollup tables (see rollups.py)."""
+    rollups.install(conn)
+
+
+# Index name -> indexed columns, matched to the filters and orderings of the
+# shipped queries (checked by query_plans.py). Trailing columns make the
+# ranked and time-window reads covering; SQLite scans them in either direction.
+QUERY_INDEXES = {
+    "idx_bad_ips_rank": "bad_ips(severity, threat_count, ip_address, ip_key)",
+    "idx_bad_ips_threat_count": "bad_ips(threat_count)",
+    "idx_bad_ips_last_updated": "bad_ips(last_updated, ip_address, severity)",
+    "idx_bad_ips_first_seen": "bad_ips(first_seen, ip_address, severity)",
+    "idx_ip_geolocation_country": "ip_geolocation(country, ip_key)",
+    "idx_ip_geolocation_city": "ip_geolocation(city, country)",
+    "idx_ip_geolocation_asn": "ip_geolocation(asn)",
+}
+
+
+def _migrate_query_indexes(conn):
+    """v6: secondary indexes for the shipped queries (QUERY_INDEXES)."""
+    for name, columns in QUERY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+MIGRATIONS = [
+    (1, _migrate_ip_keys),
+    (2, _migrate_bad_networks),
+    (3, _migrate_geo_build_epoch),
+    (4, _migrate_enrichment_progress),
+    (5, _migrate_rollups),
+    (6, _migrate_query_indexes),
+]
+
+
+def migrate_database(conn):
+    """Apply pending schema migrations, tracked in `PRAGMA user_version`."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if version >= target:
+            continue
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {int(target)}")
+        conn.commit()
+        version = target
+        print(f"Migrated database schema to v{target}")
+    return version
+
+
 def map_score_to_severity(score) -> int:
     """Map a threat score to 1-5 severity scale."""
     try:
@@ -107,8 +242,14 @@ def map_score_to_severity(score) -> int:
 
 
 def load_ips_from_csv(csv_file="badip_list.csv"):
-    """Load IPs and optional scores from CSV file; returns list of (ip, severity)."""
+    """Load IPs and optional scores from CSV file; returns list of (ip, severity).
+
+    Without a header row the second column is the score (`badip_list.csv`);
+    with one, only a column named `score` is, so timestamps or source names
+    in other columns never become severities.
+    """
     results = []
+    score_col = 1
     try:
         with open(csv_file, "r", encoding="utf-8") as f:
             reader = csv.reader(f)
@@ -122,305 +263,409 @@ def load_ips_from_csv(csv_file="badip_list.csv"):
                 try:
                     ipaddress.ip_address(ip)
                 except ValueError:
+                    if reader.line_num == 1:
+                        header = [(col or "").strip().lower() for col in row]
+                        score_col = header.index("score") if "score" in header else None
                     continue
                 # Severity mapping from optional score column
-                if len(row) >= 2 and (row[1] or "").strip():
-                    sev = map_score_to_severity((row[1] or "").strip())
-                    results.append((ip, sev))
-                else:
-                    results.append((ip, 3))
+                score = ""
+                if score_col is not None and len(row) > score_col:
+                    score = (row[score_col] or "").strip()
+                results.append((ip, map_score_to_severity(score) if score else 3))
     except FileNotFoundError:
         print(f"Warning: {csv_file} not found")
     return results
 
 
-def insert_ips_to_database(conn, ips):
-    """Insert IPs into database; accepts list of (ip, severity) tuples."""
+def load_networks_from_csv(csv_file):
+    """Load CIDR networks from a `*_networks.csv` file (header row required).
+
+    Reads the `network` column plus optional `score` and `source` columns.
+    Returns list of (network, severity, source) with canonical network text;
+    blocks overlapping private or reserved space are skipped.
+    """
+    results = []
+    try:
+        with open(csv_file, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    network = parse_network(row.get("network") or "")[0]
+                except ValueError:
+                    continue
+                if not is_public_network(network):
+                    print(f"Warning: skipping non-public network {network}")
+                    continue
+                score = (row.get("score") or "").strip()
+                sev = map_score_to_severity(score) if score else 3
+                results.append((network, sev, (row.get("source") or "").strip()))
+    except FileNotFoundError:
+        print(f"Warning: {csv_file} not found")
+    return results
+
+
+def load_source_csvs(data_dir="data"):
+    """Load every per-source CSV in `data_dir`.
+
+    Returns (ips, networks): a list of (ip, severity) and a dict of
+    network -> (severity, set of sources). `DERIVED_CSVS` are skipped.
+    """
+    ips = []
+    networks = {}
+    data_dir = Path(data_dir)
+    if not data_dir.exists():
+        return ips, networks
+    for p in sorted(data_dir.glob("*.csv")):
+        if p.name in DERIVED_CSVS:
+            continue
+        if p.name.endswith("_networks.csv"):
+            new_networks = load_networks_from_csv(str(p))
+            for network, sev, source in new_networks:
+                prev_sev, sources = networks.get(network, (0, set()))
+                networks[network] = (max(sev, prev_sev), sources | {source})
+            print(f"Loaded {len(new_networks)} networks from {p}")
+            continue
+        try:
+            new_items = load_ips_from_csv(str(p))
+            if new_items:
+                ips.extend(new_items)
+                print(f"Loaded {len(new_items)} IPs from {p}")
+        except Exception:  # pylint: disable=broad-exception-caught
+            print(f"Warning: failed loading {p}")
+    return ips, networks
+
+
+def merge_ips(ips):
+    """Dedupe (ip, severity) pairs, keeping the highest severity per IP."""
+    merged = {}
+    for ip, sev in ips:
+        merged[ip] = max(sev, merged.get(ip, 0))
+    return list(merged.items())
+
+
+def insert_networks_to_database(conn, networks):
+    """Bulk upsert networks; accepts list of (network, severity, sources) tuples.
+
+    Existing networks get `threat_count + 1`, a fresh `last_updated` and the
+    latest source list. Returns the number of newly inserted networks.
+    """
     cursor = conn.cursor()
-    inserted = 0
 
+    cursor.execute("SELECT COUNT(*) FROM bad_networks")
+    before = cursor.fetchone()[0]
+
+    rows = []
+    for network, severity, sources in networks:
+        try:
+            network, start_key, end_key, prefix_len = parse_network(network)
+        except ValueError:
+            continue
+        rows.append((network, start_key, end_key, prefix_len, int(severity), sources))
+
+    cursor.executemany(
+        """
+        INSERT INTO bad_networks
+        (network, start_key, end_key, prefix_len, severity, sources)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(network) DO UPDATE
+        SET threat_count = threat_count + 1,
+            sources = excluded.sources,
+            last_updated = CURRENT_TIMESTAMP
+    """,
+        sorted(rows, key=lambda r: r[1]),
+    )
+    conn.commit()
+
+    cursor.execute("SELECT COUNT(*) FROM bad_networks")
+    inserted = cursor.fetchone()[0] - before
+    print(
+        f"Inserted {inserted} new networks to database, "
+        f"updated {len(rows) - inserted} existing networks"
+    )
+    return inserted
+
+
+def _normalize_ip_rows(ips):
+    """Yield (ip, severity, ip_key) tuples from tuples or bare IP strings."""
     for item in ips:
         if isinstance(item, (list, tuple)) and len(item) >= 2:
             ip, severity = item[0], int(item[1])
         else:
             ip, severity = str(item), 3
-        try:
-            cursor.execute(
-                """
-                INSERT INTO bad_ips (ip_address, severity)
-                VALUES (?, ?)
-            """,
-                (ip, severity),
-            )
-            inserted += 1
-        except sqlite3.IntegrityError:
-            # IP already exists, update threat count
-            cursor.execute(
-                """
-                UPDATE bad_ips 
-                SET threat_count = threat_count + 1,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE ip_address = ?
-            """,
-                (ip,),
-            )
+        yield ip, severity, ip_to_key(ip)
 
-    conn.commit()
-    print(f"Inserted {inserted} new IPs to database")
-    return inserted
 
+def insert_ips_to_database(conn, ips):
+    """Bulk upsert IPs into database; accepts list of (ip, severity) tuples.
 
-def fetch_geolocation(ip_address):
-    """Fetch geolocation for an IP address using ip-api.com (free, no key required)"""
-    try:
-        if requests is None:
-            return None
+    Rows are staged in a temp table with `executemany` and merged with a
+    single `INSERT ... ON CONFLICT` statement: new IPs are inserted with their
+    severity, existing IPs get `threat_count + 1` and a fresh `last_updated`.
+    Returns the number of newly inserted IPs.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM bad_ips")
+    before = cursor.fetchone()[0]
 
-        response = requests.get(
-            f"http://ip-api.com/json/{ip_address}?fields=country,city,lat,lon,as",
-            timeout=5,
+    cursor.execute("DROP TABLE IF EXISTS temp.staged_ips")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE staged_ips (
+            ip_address TEXT NOT NULL,
+            severity INTEGER NOT NULL,
+            ip_key BLOB
         )
+    """
+    )
+    cursor.executemany(
+        "INSERT INTO staged_ips (ip_address, severity, ip_key) VALUES (?, ?, ?)",
+        _normalize_ip_rows(ips),
+    )
+    cursor.execute("SELECT COUNT(*) FROM staged_ips")
+    staged = cursor.fetchone()[0]
 
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success":
-                return {
-                    "country": data.get("country"),
-                    "city": data.get("city"),
-                    "latitude": data.get("lat"),
-                    "longitude": data.get("lon"),
-                    "asn": data.get("as"),
-                }
-    except Exception as e:
-        print(f"Error fetching geolocation for {ip_address}: {e}")
+    # Sorted input keeps UNIQUE index writes local; `WHERE true` disambiguates
+    # the upsert clause from a join constraint
+    cursor.execute(
+        """
+        INSERT INTO bad_ips (ip_address, severity, ip_key)
+        SELECT ip_address, severity, ip_key FROM staged_ips WHERE true
+        ORDER BY ip_address
+        ON CONFLICT(ip_address) DO UPDATE
+        SET threat_count = threat_count + 1,
+            last_updated = CURRENT_TIMESTAMP
+    """
+    )
+    cursor.execute("DROP TABLE staged_ips")
+    conn.commit()
 
-    return None
+    cursor.execute("SELECT COUNT(*) FROM bad_ips")
+    inserted = cursor.fetchone()[0] - before
+    updated = staged - inserted
+    print(f"Inserted {inserted} new IPs to database, updated {updated} existing IPs")
+    return inserted
 
 
-def enrich_geolocation_data_from_db(conn, city_db_path, asn_db_path=None):
+def enrich_geolocation_data_from_db(
+    conn, city_db_path, asn_db_path=None, workers=1, batch_size=10000, use_cache=True
+):
+    """Resolve country, city, coordinates, ASN and ISP org from the GeoLite2
+    mmdb files in one pass.
+
+    Only IPs without geolocation, or whose row was built from an older mmdb
+    (`geo_build_epoch`), are looked up, so refreshes scale with what changed.
+    IPs are read in `ip_key` order and looked up through `geo_enrich`, which
+    reuses one result per network prefix; rows are upserted with batched
+    `executemany`. `workers` splits lookups across processes. With
+    `use_cache`, prefixes are shared across runs through `geo_cache`.
+    """
     try:
-        if not geoip2 or not Path(city_db_path).exists():
+        if not geo_enrich.maxminddb or not Path(city_db_path).exists():
             print(
                 f"GeoIP City database not available at {city_db_path}, using fallback"
             )
             return 0
+        if asn_db_path and not Path(asn_db_path).exists():
+            asn_db_path = None
+        epoch = geo_enrich.build_epoch(city_db_path, asn_db_path)
 
-        reader_city = geoip2.database.Reader(city_db_path)
-        reader_asn = None
-        if asn_db_path and Path(asn_db_path).exists():
-            try:
-                reader_asn = geoip2.database.Reader(asn_db_path)
-            except Exception:
-                reader_asn = None
         cursor = conn.cursor()
-
-        # Get all IPs without geolocation data
+        # Sorted by packed key so neighbouring lookups share mmdb prefixes
         cursor.execute(
             """
-            SELECT DISTINCT bi.ip_address 
+            SELECT bi.ip_address
             FROM bad_ips bi
-            LEFT JOIN ip_geolocation ig ON bi.ip_address = ig.ip_address
-            WHERE ig.ip_address IS NULL
-        """
+            LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+            WHERE bi.ip_key IS NOT NULL
+              AND (ig.ip_key IS NULL
+                   OR ig.geo_build_epoch IS NULL
+                   OR ig.geo_build_epoch < ?)
+            ORDER BY bi.ip_key
+        """,
+            (epoch,),
         )
-
         ips_to_enrich = [row[0] for row in cursor.fetchall()]
-        enriched = 0
-
-        for ip in ips_to_enrich:
-            try:
-                # Validate IP format
-                ipaddress.ip_address(ip)
-                response = reader_city.city(ip)
-                asn_val = None
-                if reader_asn:
-                    try:
-                        a = reader_asn.asn(ip)
-                        if getattr(a, "autonomous_system_number", None):
-                            asn_val = f"AS{a.autonomous_system_number}"
-                    except Exception:
-                        asn_val = None
-
-                try:
-                    cursor.execute(
-                        """
-                        INSERT INTO ip_geolocation 
-                        (ip_address, country, city, latitude, longitude, asn)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            ip,
-                            response.country.iso_code,
-                            (
-                                response.city.name or response.subdivisions[0].name
-                                if response.subdivisions
-                                else None
-                            ),
-                            response.location.latitude,
-                            response.location.longitude,
-                            asn_val,
-                        ),
-                    )
-                    enriched += 1
-                except sqlite3.IntegrityError:
-                    pass
-            except Exception:
-                continue
 
-        try:
-            reader_city.close()
-        except Exception:
-            pass
-        if reader_asn:
-            try:
-                reader_asn.close()
-            except Exception:
-                pass
+        start = time.perf_counter()
+        enriched = 0
+        batch = []
+        upsert_sql = """
+            INSERT INTO ip_geolocation
+            (ip_address, country, city, latitude, longitude, asn, isp, ip_key,
+             geo_build_epoch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ip_address) DO UPDATE SET
+                country = excluded.country,
+                city = excluded.city,
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                asn = excluded.asn,
+                isp = excluded.isp,
+                ip_key = excluded.ip_key,
+                geo_build_epoch = excluded.geo_build_epoch,
+                last_updated = CURRENT_TIMESTAMP
+        """
+        rows = geo_enrich.bulk_lookup(
+            ips_to_enrich,
+            city_db_path,
+            asn_db_path,
+            workers=workers,
+            cache_path=geo_cache.CACHE_PATH if use_cache else None,
+        )
+        for row in rows:
+            batch.append(row + (ip_to_key(row[0]), epoch))
+            if len(batch) >= batch_size:
+                cursor.executemany(upsert_sql, batch)
+                enriched += cursor.rowcount
+                batch = []
+        if batch:
+            cursor.executemany(upsert_sql, batch)
+            enriched += cursor.rowcount
         conn.commit()
-        print(f"Enriched {enriched} IPs with geolocation data from GeoIP database")
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(
+            f"Enriched {enriched} of {len(ips_to_enrich)} new or stale IPs from"
+            f" GeoIP database build {epoch}"
+            f" ({len(ips_to_enrich) / elapsed:,.0f} IPs/sec, {workers} worker(s))"
+        )
         return enriched
     except Exception as e:
         print(f"Error enriching geolocation from database: {e}")
         return 0
 
 
-def download_geoip_database(target_path="data/GeoLite2-City.mmdb"):
-    """Download free GeoLite2-City database for geolocation enrichment"""
+def _download_mmdb(url, target_path, label):
+    """Download an mmdb file via the conditional-GET cache; True on success."""
     try:
-        target = Path(target_path)
-        target.parent.mkdir(exist_ok=True)
-
-        # Use mirror as a source 
-        url = "https://raw.githubusercontent.com/P3TERX/GeoLite.mmdb/download/GeoLite2-City.mmdb"
-
-        print("Downloading GeoLite2 database...")
+        print(f"Downloading {label} database...")
         if requests is None:
             raise RuntimeError("requests not available")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        with open(target_path, "wb") as f:
-            f.write(response.content)
-
-        print(
-            "GeoLite2 database downloaded successfully ("
-            + f"{len(response.content) / 1024 / 1024:.1f} MB)"
-        )
+        response = http_cache.download(url, target_path, timeout=30)
+        size_mb = Path(target_path).stat().st_size / 1024 / 1024
+        if response.unchanged:
+            print(f"{label} database unchanged upstream ({size_mb:.1f} MB cached)")
+        else:
+            print(f"{label} database downloaded successfully ({size_mb:.1f} MB)")
         return True
-    except Exception as e:  # pylint
-        print(f"Warning: Could not download or write GeoLite2 database: {e}")
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f"Warning: Could not download or write {label} database: {e}")
         return False
 
 
+def download_geoip_database(target_path="data/GeoLite2-City.mmdb"):
+    """Download free GeoLite2-City database for geolocation enrichment"""
+    # Use mirror as a source
+    url = "https://raw.githubusercontent.com/P3TERX/GeoLite.mmdb/download/GeoLite2-City.mmdb"
+    return _download_mmdb(url, target_path, "GeoLite2")
+
+
 def download_geoip_asn_database(target_path="data/GeoLite2-ASN.mmdb"):
     """Download free GeoLite2-ASN database for ASN enrichment"""
-    try:
-        target = Path(target_path)
-        target.parent.mkdir(exist_ok=True)
-        url = "https://raw.githubusercontent.com/P3TERX/GeoLite.mmdb/download/GeoLite2-ASN.mmdb"
-        print("Downloading GeoLite2 ASN database...")
-        if requests is None:
-            raise RuntimeError("requests not available")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        with open(target_path, "wb") as f:
-            f.write(response.content)
-        print(
-            "GeoLite2 ASN database downloaded successfully ("
-            + f"{len(response.content) / 1024 / 1024:.1f} MB)"
-        )
-        return True
-    except Exception as e:  # pylint: disable=broad-exception-caught
-        print(f"Warning: Could not download or write GeoLite2 ASN database: {e}")
-        return False
+    url = "https://raw.githubusercontent.com/P3TERX/GeoLite.mmdb/download/GeoLite2-ASN.mmdb"
+    return _download_mmdb(url, target_path, "GeoLite2 ASN")
 
 
-def enrich_geolocation_data(conn, limit=100):
-    """Enrich database with geolocation data (limited to avoid rate limits)"""
-    cursor = conn.cursor()
+def _get_progress(cursor, task):
+    cursor.execute(
+        "SELECT last_ip_key FROM enrichment_progress WHERE task = ?", (task,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
 
-    # Get IPs without geolocation data
+def _set_progress(cursor, task, last_ip_key):
     cursor.execute(
         """
-        SELECT DISTINCT bi.ip_address 
-        FROM bad_ips bi
-        LEFT JOIN ip_geolocation ig ON bi.ip_address = ig.ip_address
-        WHERE ig.ip_address IS NULL
-        LIMIT ?
+        INSERT INTO enrichment_progress (task, last_ip_key) VALUES (?, ?)
+        ON CONFLICT(task) DO UPDATE SET
+            last_ip_key = excluded.last_ip_key,
+            updated_at = CURRENT_TIMESTAMP
     """,
-        (limit,),
+        (task, last_ip_key),
     )
 
+
+def enrich_geolocation_data(conn, limit=3000, url=None, use_cache=True):
+    """Enrich IPs without geolocation through the ip-api.com batch endpoint.
+
+    Lookups run concurrently under the free-tier rate limit (see `geo_api`).
+    Progress is stored in `enrichment_progress` after every batch, so each
+    run resumes after the last address handled and wraps around once the end
+    is reached; `limit` caps the addresses sent per run. With `use_cache`,
+    answers are kept per /24 (IPv4) or /48 (IPv6) in `geo_cache`, and
+    addresses in an already answered block are not sent again.
+    """
+    task = "ip-api"
+    cursor = conn.cursor()
+    select_sql = """
+        SELECT bi.ip_address
+        FROM bad_ips bi
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE ig.ip_key IS NULL AND bi.ip_key > ?
+        ORDER BY bi.ip_key
+        LIMIT ?
+    """
+    last_key = _get_progress(cursor, task) or b""
+    cursor.execute(select_sql, (last_key, limit))
     ips_to_enrich = [row[0] for row in cursor.fetchall()]
+    if not ips_to_enrich and last_key:
+        # Reached the end last time: start over for addresses that failed
+        cursor.execute(select_sql, (b"", limit))
+        ips_to_enrich = [row[0] for row in cursor.fetchall()]
+
     enriched = 0
+    insert_sql = """
+        INSERT OR IGNORE INTO ip_geolocation
+        (ip_address, country, city, latitude, longitude, asn, isp, ip_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    cache = geo_cache.GeoCache(task) if use_cache else None
+
+    def store(batch, rows):
+        nonlocal enriched
+        rows = [row + (ip_to_key(row[0]),) for row in rows if ip_to_key(row[0])]
+        cursor.executemany(insert_sql, rows)
+        enriched += cursor.rowcount
+        if cache:
+            for row in rows:
+                cache.put(row[0], 48 if ":" in row[0] else 24, row[1:7])
+        _set_progress(cursor, task, ip_to_key(batch[-1]))
+        conn.commit()
 
-    for ip in ips_to_enrich:
-        geo_data = fetch_geolocation(ip)
-        if geo_data:
-            try:
-                cursor.execute(
-                    """
-                    INSERT INTO ip_geolocation 
-                    (ip_address, country, city, latitude, longitude, asn)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        ip,
-                        geo_data.get("country"),
-                        geo_data.get("city"),
-                        geo_data.get("latitude"),
-                        geo_data.get("longitude"),
-                        geo_data.get("asn"),
-                    ),
+    try:
+        to_fetch = ips_to_enrich
+        if cache:
+            cached, to_fetch = [], []
+            for ip in ips_to_enrich:
+                value = cache.get(ip)
+                if value:
+                    cached.append((ip, *value))
+                else:
+                    to_fetch.append(ip)
+            if cached:
+                cursor.executemany(
+                    insert_sql, [row + (ip_to_key(row[0]),) for row in cached]
                 )
-                enriched += 1
-            except sqlite3.IntegrityError:
-                pass
+                enriched += cursor.rowcount
+                conn.commit()
+        if to_fetch:
+            start = time.perf_counter()
+            try:
+                geo_api.lookup(to_fetch, store, url=url)
+            except RuntimeError as e:
+                print(f"Geolocation API unavailable: {e}")
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"Looked up {len(to_fetch)} IPs in {elapsed:.1f}s via ip-api batch")
+    finally:
+        if cache:
+            cache.report()
+            cache.close()
 
-    conn.commit()
     print(f"Enriched {enriched} IPs with geolocation data")
     return enriched
 
 
-def backfill_asn_from_db(conn, asn_db_path):
-    """Fill missing ASN values using the GeoLite2-ASN database."""
-    try:
-        if not geoip2 or not Path(asn_db_path).exists():
-            return 0
-        reader_asn = geoip2.database.Reader(asn_db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT ip_address FROM ip_geolocation WHERE asn IS NULL OR asn = ''
-        """
-        )
-        ips = [r[0] for r in cursor.fetchall()]
-        updated = 0
-        for ip in ips:
-            try:
-                a = reader_asn.asn(ip)
-                if getattr(a, "autonomous_system_number", None):
-                    asn_val = f"AS{a.autonomous_system_number}"
-                    cursor.execute(
-                        "UPDATE ip_geolocation SET asn = ? WHERE ip_address = ?",
-                        (asn_val, ip),
-                    )
-                    updated += 1
-            except Exception:
-                continue
-        try:
-            reader_asn.close()
-        except Exception:
-            pass
-        conn.commit()
-        if updated:
-            print(f"Backfilled ASN for {updated} IPs")
-        return updated
-    except Exception as e:
-        print(f"Error backfilling ASN: {e}")
-        return 0
-
-
 def generate_sample_geolocation_data(conn):
     """Generate sample geolocation data for testing"""
     cursor = conn.cursor()
@@ -444,8 +689,8 @@ def generate_sample_geolocation_data(conn):
         """
         SELECT DISTINCT bi.ip_address 
         FROM bad_ips bi
-        LEFT JOIN ip_geolocation ig ON bi.ip_address = ig.ip_address
-        WHERE ig.ip_address IS NULL
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE ig.ip_key IS NULL
         ORDER BY RANDOM()
         LIMIT 500
     """
@@ -460,10 +705,18 @@ def generate_sample_geolocation_data(conn):
             cursor.execute(
                 """
                 INSERT INTO ip_geolocation 
-                (ip_address, country, city, latitude, longitude, asn)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (ip_address, country, city, latitude, longitude, asn, ip_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-                (ip, country, city, lat, lon, f"AS{random.randint(1000, 65000)}"),
+                (
+                    ip,
+                    country,
+                    city,
+                    lat,
+                    lon,
+                    f"AS{random.randint(1000, 65000)}",
+                    ip_to_key(ip),
+                ),
             )
             inserted += 1
         except sqlite3.IntegrityError:
@@ -478,29 +731,16 @@ def get_database_statistics(conn):
     """Generate database statistics"""
     cursor = conn.cursor()
 
-    cursor.execute("SELECT COUNT(*) FROM bad_ips")
-    total_ips = cursor.fetchone()[0]
+    # Read from the rollup tables: O(groups), not O(rows)
+    severity_rows = rollups.severity_counts(conn)
+    total_ips = sum(count for _, count in severity_rows)
+    rated = [(s, c) for s, c in severity_rows if s is not None]
+    rated_ips = sum(c for _, c in rated)
+    avg_severity = sum(s * c for s, c in rated) / rated_ips if rated_ips else 0.0
 
-    cursor.execute(
-        "SELECT COUNT(DISTINCT country) FROM ip_geolocation WHERE country IS NOT NULL"
-    )
-    countries = cursor.fetchone()[0]
-
-    # Calculate average severity
-    cursor.execute("SELECT AVG(severity) FROM bad_ips")
-    avg_severity = cursor.fetchone()[0] or 0.0
-
-    cursor.execute(
-        """
-        SELECT country, COUNT(*) as count 
-        FROM ip_geolocation 
-        WHERE country IS NOT NULL
-        GROUP BY country 
-        ORDER BY count DESC 
-        LIMIT 10
-    """
-    )
-    top_countries = cursor.fetchall()
+    country_rows = rollups.country_counts(conn)
+    countries = len(country_rows)
+    top_countries = [row[:2] for row in country_rows[:10]]
 
     stats = {
         "total_ips": total_ips,
@@ -535,34 +775,29 @@ def main():
     ips = load_ips_from_csv()
     print(f"Loaded {len(ips)} IPs from CSV")
 
-    # Load additional IPs from ingest sources (per-source CSVs, fetched/new)
-    extra = []
-    data_dir = Path("data")
-    if data_dir.exists():
-        for p in sorted(data_dir.glob("*.csv")):
-            # skip any files that shouldn't be treated as source lists
-            if p.name in ("badips.db",):
-                continue
-            # Skip files that are outputs but still safe; we prefer explicit includes
-            if p.name == "stats.json":
-                continue
-            try:
-                new_items = load_ips_from_csv(str(p))
-                if new_items:
-                    extra.extend(new_items)
-                    print(f"Loaded {len(new_items)} IPs from {p}")
-            except Exception:  # pylint: disable=broad-exception-caught
-                print(f"Warning: failed loading {p}")
-
-    # Merge, dedupe by IP keeping highest severity
-    merged = {}
-    for ip, sev in ips + extra:
-        merged[ip] = max(sev, merged.get(ip, 0))
-    merged_list = list(merged.items())
+    # Load additional IPs and networks from per-source CSVs in data/
+    extra, networks = load_source_csvs()
+    merged_list = merge_ips(ips + extra)
 
     # Insert IPs
     insert_ips_to_database(conn, merged_list)
 
+    # Insert CIDR networks (kept as ranges, never expanded to addresses)
+    if networks:
+        insert_networks_to_database(
+            conn,
+            [
+                (network, sev, ";".join(sorted(s for s in sources if s)))
+                for network, (sev, sources) in networks.items()
+            ],
+        )
+
+    db.optimize(conn)
+
+    # Compiled lookup artifact for consumers that only need membership/severity
+    idx_size = badips_idx.write_index(conn, badips_idx.IDX_PATH)
+    print(f"Wrote {badips_idx.IDX_PATH} ({idx_size / 1024:.0f} KB)")
+
     # Try to use GeoLite2 databases first, then fall back to API
     geoip_city_path = "data/GeoLite2-City.mmdb"
     geoip_asn_path = "data/GeoLite2-ASN.mmdb"
@@ -571,21 +806,24 @@ def main():
         asn_ok = download_geoip_asn_database(geoip_asn_path)
         if city_ok:
             enrich_geolocation_data_from_db(
-                conn, geoip_city_path, geoip_asn_path if asn_ok else None
+                conn,
+                geoip_city_path,
+                geoip_asn_path if asn_ok else None,
+                workers=int(os.environ.get("GEOIP_WORKERS", "1")),
             )
-            if asn_ok:
-                backfill_asn_from_db(conn, geoip_asn_path)
         else:
             print("Fallback: Using API-based geolocation (limited)...")
-            enrich_geolocation_data(conn, limit=100)
+            enrich_geolocation_data(conn)
     # Generate sample data if needed (for local demo/testing)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM ip_geolocation")
-    geo_count = cursor.fetchone()[0]
+    geo_count = rollups.geo_total(conn)
     if geo_count < 100:  # If not enough geolocation data, generate sample (local/testing)
         print("Generating sample geolocation data for testing...")
         generate_sample_geolocation_data(conn)
 
+    db.optimize(conn)
+    # Self-contained file for the commit: readers must not leave -wal/-shm
+    db.release_wal(conn)
+
     # Generate statistics
     stats = get_database_statistics(conn)
     print("\nDatabase Statistics:")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Check that the queries this project ships read through an index.
+
+Each query in `shipped_queries()` (the README wall of shame, the workflow's
+dig step, the severity-by-country chart join, filtered exports and the
+docs/API.md examples) is run through `EXPLAIN QUERY PLAN`; a plan step that
+reads a whole table or a whole index is reported, and the script exits
+non-zero. Walking an index in order is accepted only under a LIMIT. The
+indexes are `QUERY_INDEXES` in process_badips.py; add a query here when
+shipping a new access path.
+
+Usage:
+    python scripts/query_plans.py                  # fresh schema, temporary file
+    python scripts/query_plans.py data/badips.db   # existing database, read-only
+"""
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+import chart_data
+import db
+import process_badips
+import update_readme
+import utils
+
+# "SCAN bi" (SQLite >= 3.36) or "SCAN TABLE bad_ips AS bi" reads the table;
+# "SCAN bi USING [COVERING] INDEX ..." walks a whole index, which only stops
+# early under a LIMIT; "SEARCH ..." seeks into an index
+TABLE_SCAN = re.compile(r"^SCAN (TABLE )?\w+( AS \w+)?$")
+INDEX_SCAN = re.compile(r"^SCAN (TABLE )?\w+( AS \w+)? USING (COVERING )?INDEX ")
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+# Copied verbatim from the dig step in .github/workflows/update-badip.yml
+DIG_QUERY = (
+    "SELECT ip_address FROM bad_ips"
+    " ORDER BY severity DESC, threat_count DESC LIMIT 20;"
+)
+
+# Examples from docs/API.md that filter or order on indexed columns
+API_QUERIES = {
+    "API: high-severity IPs": """
+        SELECT bi.ip_address, bi.severity, bi.threat_count,
+               ig.country, ig.city
+        FROM bad_ips bi
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE bi.severity >= 4
+        ORDER BY bi.threat_count DESC
+        LIMIT 100
+    """,
+    "API: IPs from a country": """
+        SELECT ip_address, city, latitude, longitude
+        FROM ip_geolocation
+        WHERE country = :country
+        ORDER BY ip_address
+    """,
+    "API: most frequently detected": """
+        SELECT ip_address, threat_count, last_updated
+        FROM bad_ips
+        ORDER BY threat_count DESC
+        LIMIT 20
+    """,
+    "API: recently updated": """
+        SELECT ip_address, severity, last_updated
+        FROM bad_ips
+        WHERE last_updated > datetime('now', '-7 days')
+        ORDER BY last_updated DESC
+        LIMIT 50
+    """,
+    "API: first detection dates": """
+        SELECT ip_address, first_seen, severity
+        FROM bad_ips
+        WHERE first_seen > datetime('now', '-30 days')
+        ORDER BY first_seen DESC
+    """,
+}
+
+# `utils.py export --where` filters, one per indexed column
+EXPORT_FILTERS = (
+    "severity>=4",
+    "threat_count>=10",
+    "last_updated>2024-01-01",
+    "first_seen>2024-01-01",
+    "country={country}",
+    "city={city}",
+    "asn={asn}",
+)
+SAMPLE_COUNTRIES = ("United States", "China", "Russia", "Germany", "Brazil")
+
+
+def shipped_queries(countries=SAMPLE_COUNTRIES, city="Berlin", asn="AS13335"):
+    """Query name -> (SQL, parameters); `countries[0]`, `city` and `asn` are
+    the filter values."""
+    sample = {"country": countries[0], "city": city, "asn": asn}
+    queries = {
+        "README wall of shame": (update_readme.WALL_OF_SHAME_QUERY, (20,)),
+        "workflow dig step": (DIG_QUERY, ()),
+        "chart severity by country": (
+            chart_data.severity_by_country_query(len(countries)),
+            list(countries),
+        ),
+    }
+    for expr in EXPORT_FILTERS:
+        expr = expr.format(**sample)
+        queries[f"export --where {expr}"] = utils.export_query([expr])
+    for name, sql in API_QUERIES.items():
+        queries[name] = (sql, sample)
+    return queries
+
+
+def is_full_scan(detail, sql):
+    """True if plan step `detail` of `sql` reads a whole table or index."""
+    if TABLE_SCAN.match(detail):
+        return True
+    return bool(INDEX_SCAN.match(detail)) and not LIMIT.search(sql)
+
+
+def full_scans(conn):
+    """Return (query name, plan step) for every full table scan, and print
+    each plan."""
+    scans = []
+    for name, (sql, params) in shipped_queries().items():
+        print(name)
+        for _, _, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            flagged = is_full_scan(detail, sql)
+            print(f"    {detail}{'   <-- FULL SCAN' if flagged else ''}")
+            if flagged:
+                scans.append((name, detail))
+    return scans
+
+
+def main():
+    if len(sys.argv) > 1:
+        db_path = Path(sys.argv[1])
+        if not db_path.exists():
+            print(f"ERROR: {db_path} not found")
+            sys.exit(2)
+        conn = db.connect_readonly(db_path)
+        scans = full_scans(conn)
+        conn.close()
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = process_badips.create_database(Path(tmp) / "plans.db")
+            scans = full_scans(conn)
+            conn.close()
+
+    if scans:
+        print(f"\n{len(scans)} full table scan(s):")
+        for name, detail in scans:
+            print(f"  {name}: {detail}")
+        sys.exit(1)
+    print("\nAll shipped queries search an index or stop at a LIMIT.")
+
+
+if __name__ == "__main__":
+    main()
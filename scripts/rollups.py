@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Rollup tables holding per-group counts of `bad_ips` and `ip_geolocation`,
+kept current by triggers so statistics cost O(groups) instead of O(rows):
+
+    agg_severity  bad_ips by severity
+    agg_country   ip_geolocation by country, plus coordinate sums for centroids
+    agg_city      ip_geolocation by (city, country)
+    agg_asn       ip_geolocation by asn
+
+Every INSERT, DELETE and UPDATE (including `ON CONFLICT DO UPDATE`) applies a
+delta to the affected groups inside the same transaction: one upsert per
+rollup for an added row, an update (and a delete once the group is empty) for
+a removed one. `INSERT OR REPLACE` only fires the delete side with
+`PRAGMA recursive_triggers = ON`; the ingestion code uses upserts instead.
+
+The rollups are WITHOUT ROWID tables keyed by the group columns. A NULL key
+is stored as NULL_KEY, an empty blob that no TEXT or INTEGER value equals,
+and the reader functions turn it back into NULL. They also fall back to
+grouping the source tables on databases that predate the rollups (< v5).
+"""
+
+# Rollup table -> (source table, key columns, extra measures). Each measure is
+# (column, SQL type, expression over the source row `{row}`); every rollup
+# also has `ip_count`.
+ROLLUPS = {
+    "agg_severity": ("bad_ips", ("severity",), ()),
+    "agg_country": (
+        "ip_geolocation",
+        ("country",),
+        (
+            ("located", "INTEGER", "{row}.latitude IS NOT NULL"),
+            ("lat_sum", "REAL", "IFNULL({row}.latitude, 0)"),
+            ("lon_sum", "REAL", "IFNULL({row}.longitude, 0)"),
+        ),
+    ),
+    "agg_city": ("ip_geolocation", ("city", "country"), ()),
+    "agg_asn": ("ip_geolocation", ("asn",), ()),
+}
+NULL_KEY = "X''"
+# Centroids are rounded so that incrementally maintained sums and a rebuild
+# give identical results (about 1 m at the equator)
+CENTROID_DIGITS = 5
+
+
+def _measures(table):
+    return (("ip_count", "INTEGER", "1"),) + ROLLUPS[table][2]
+
+
+def _key(row, key):
+    return f"IFNULL({row}.{key}, {NULL_KEY})"
+
+
+def _add(table, row):
+    """Upsert adding source row `row` (NEW or OLD) to rollup `table`."""
+    _, keys, _ = ROLLUPS[table]
+    measures = _measures(table)
+    columns = ", ".join(keys + tuple(column for column, _, _ in measures))
+    values = [_key(row, key) for key in keys]
+    values += [expr.format(row=row) for _, _, expr in measures]
+    deltas = ", ".join(
+        f"{column} = {column} + excluded.{column}" for column, _, _ in measures
+    )
+    return (
+        f"INSERT INTO {table} ({columns}) VALUES ({', '.join(values)})"
+        f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {deltas};"
+    )
+
+
+def _remove(table, row):
+    """Statements removing source row `row` from rollup `table`."""
+    _, keys, _ = ROLLUPS[table]
+    match = " AND ".join(f"{key} = {_key(row, key)}" for key in keys)
+    deltas = ", ".join(
+        f"{column} = {column} - ({expr.format(row=row)})"
+        for column, _, expr in _measures(table)
+    )
+    return (
+        f"UPDATE {table} SET {deltas} WHERE {match};\n"
+        f"    DELETE FROM {table} WHERE {match} AND ip_count = 0;"
+    )
+
+
+def install(conn):
+    """Create the rollup tables and their triggers, then fill them from the
+    source tables."""
+    for table, (source, keys, extra) in ROLLUPS.items():
+        columns = [
+            f"{key} {'INTEGER' if key == 'severity' else 'TEXT'} NOT NULL"
+            for key in keys
+        ]
+        columns += [
+            f"{column} {sql_type} NOT NULL DEFAULT 0"
+            for column, sql_type, _ in _measures(table)
+        ]
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)},"
+            f" PRIMARY KEY ({', '.join(keys)})) WITHOUT ROWID"
+        )
+        watched = list(keys) + (["latitude", "longitude"] if extra else [])
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in watched)
+        triggers = {
+            "insert": ("AFTER INSERT", _add(table, "NEW")),
+            "delete": ("AFTER DELETE", _remove(table, "OLD")),
+            "update": (
+                f"AFTER UPDATE OF {', '.join(watched)}",
+                _remove(table, "OLD") + "\n    " + _add(table, "NEW"),
+            ),
+        }
+        for event, (timing, body) in triggers.items():
+            when = f" WHEN {changed}" if event == "update" else ""
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event}"
+                f" {timing} ON {source} FOR EACH ROW{when}\n"
+                f"BEGIN\n    {body}\nEND"
+            )
+    rebuild(conn)
+
+
+def rebuild(conn):
+    """Recompute every rollup from its source table."""
+    for table, (source, keys, _) in ROLLUPS.items():
+        measures = _measures(table)
+        conn.execute(f"DELETE FROM {table}")
+        columns = ", ".join(keys + tuple(column for column, _, _ in measures))
+        values = [_key(source, key) for key in keys]
+        values += [f"SUM({expr.format(row=source)})" for _, _, expr in measures]
+        conn.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {', '.join(values)}"
+            f" FROM {source} GROUP BY {', '.join(keys)}"
+        )
+
+
+def available(conn):
+    return all(
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        for table in ROLLUPS
+    )
+
+
+def severity_counts(conn):
+    """(severity, count) ascending by severity; NULL severity first."""
+    if available(conn):
+        query = f"SELECT NULLIF(severity, {NULL_KEY}) AS s, ip_count FROM agg_severity"
+    else:
+        query = "SELECT severity AS s, COUNT(*) FROM bad_ips GROUP BY severity"
+    return conn.execute(query + " ORDER BY s").fetchall()
+
+
+def country_counts(conn):
+    """(country, count, located count, mean latitude, mean longitude) for rows
+    with a country, most IPs first; the means are None without located rows."""
+    if available(conn):
+        query = (
+            "SELECT country, ip_count, located, lat_sum, lon_sum FROM agg_country"
+            f" WHERE country <> {NULL_KEY} ORDER BY ip_count DESC, country"
+        )
+    else:
+        query = (
+            "SELECT country, COUNT(*) AS n, COUNT(latitude), TOTAL(latitude),"
+            " TOTAL(longitude) FROM ip_geolocation WHERE country IS NOT NULL"
+            " GROUP BY country ORDER BY n DESC, country"
+        )
+    rows = []
+    for country, count, located, lat_sum, lon_sum in conn.execute(query):
+        lat = lon = None
+        if located:
+            lat = round(lat_sum / located, CENTROID_DIGITS)
+            lon = round(lon_sum / located, CENTROID_DIGITS)
+        rows.append((country, count, located, lat, lon))
+    return rows
+
+
+def city_counts(conn, limit=None):
+    """(city, country, count) for rows with both, most IPs first; the top
+    `limit` only if given."""
+    if available(conn):
+        query = (
+            "SELECT city, country, ip_count AS n FROM agg_city"
+            f" WHERE city <> {NULL_KEY} AND country <> {NULL_KEY}"
+        )
+    else:
+        query = (
+            "SELECT city, country, COUNT(*) AS n FROM ip_geolocation"
+            " WHERE city IS NOT NULL AND country IS NOT NULL GROUP BY city, country"
+        )
+    query += " ORDER BY n DESC, city, country LIMIT ?"
+    return conn.execute(query, (-1 if limit is None else limit,)).fetchall()
+
+
+def asn_counts(conn, limit=None):
+    """(asn or "AS-Unknown", count) over all geolocation rows, most IPs first;
+    the top `limit` only if given."""
+    if available(conn):
+        query = (
+            f"SELECT COALESCE(NULLIF(asn, {NULL_KEY}), 'AS-Unknown') AS a,"
+            " ip_count AS n FROM agg_asn"
+        )
+    else:
+        query = (
+            "SELECT COALESCE(asn, 'AS-Unknown') AS a, COUNT(*) AS n"
+            " FROM ip_geolocation GROUP BY asn"
+        )
+    query += " ORDER BY n DESC, a LIMIT ?"
+    return conn.execute(query, (-1 if limit is None else limit,)).fetchall()
+
+
+def geo_total(conn):
+    """Number of `ip_geolocation` rows."""
+    if available(conn):
+        query = "SELECT TOTAL(ip_count) FROM agg_asn"
+    else:
+        query = "SELECT COUNT(*) FROM ip_geolocation"
+    return int(conn.execute(query).fetchone()[0])
+
+
+def verify(conn):
+    """Return the rollup tables whose counts differ from a full recount."""
+    stale = []
+    for table, (source, keys, _) in ROLLUPS.items():
+        expected = conn.execute(
+            f"SELECT {', '.join(keys)}, COUNT(*) FROM {source}"
+            f" GROUP BY {', '.join(keys)}"
+        ).fetchall()
+        actual = conn.execute(
+            f"SELECT {', '.join(f'NULLIF({key}, {NULL_KEY})' for key in keys)},"
+            f" ip_count FROM {table}"
+        ).fetchall()
+        if sorted(expected, key=repr) != sorted(actual, key=repr):
+            stale.append(table)
+    return stale
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-ins for the services the pipeline talks to, shared by
+`tests/` and `benchmarks.py`:
+
+    CannedHandler    blocklist mirror: canned bodies with injected latency
+                     and ETag revalidation
+    GeoApiHandler    ip-api.com `POST /batch` with a fixed-window rate limit
+
+`local_http_server()` runs either on 127.0.0.1 in a background thread.
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CannedHandler(BaseHTTPRequestHandler):
+    """Serve `server.routes[path] = (body, delay_seconds)` with injected latency
+    and ETag revalidation; a None body is a 404."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        body, delay = self.server.routes.get(self.path, (None, 0))
+        time.sleep(delay)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (deadline tests)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def geo_api_config(rate=15, window=1.0, delay=0.0):
+    """Routes for GeoApiHandler: `rate` requests per `window` seconds, each
+    answered after `delay` seconds. `requests` and `limited` count calls."""
+    return {
+        "lock": threading.Lock(),
+        "rate": rate,
+        "window": window,
+        "window_start": time.monotonic(),
+        "count": 0,
+        "delay": delay,
+        "requests": 0,
+        "limited": 0,
+    }
+
+
+class GeoApiHandler(BaseHTTPRequestHandler):
+    """Mock ip-api.com `POST /batch` configured by `geo_api_config()`.
+
+    Like the real service, every response carries `X-Rl` (requests left in
+    the window) and `X-Ttl` (seconds until it resets), and requests over the
+    limit get a 429. Addresses in 10.0.0.0/8 fail as a private range; every
+    other address is in "Mockland".
+    """
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        config = self.server.routes
+        with config["lock"]:
+            now = time.monotonic()
+            if now - config["window_start"] >= config["window"]:
+                config["window_start"], config["count"] = now, 0
+            config["count"] += 1
+            over = config["count"] > config["rate"]
+            config["requests"] += 1
+            config["limited"] += over
+            left = max(0, config["rate"] - config["count"])
+            ttl = config["window"] - (now - config["window_start"])
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if over:
+            self.send_response(429)
+            self.send_header("X-Rl", "0")
+            self.send_header("X-Ttl", str(max(1, round(ttl))))
+            self.end_headers()
+            return
+        time.sleep(config["delay"])
+        results = []
+        for ip in json.loads(body):
+            if ip.startswith("10."):
+                results.append({"status": "fail", "message": "private range"})
+            else:
+                results.append(
+                    {
+                        "status": "success",
+                        "query": ip,
+                        "country": "Mockland",
+                        "city": "Mock City",
+                        "lat": 1.0,
+                        "lon": 2.0,
+                        "as": "AS64500 Mock Networks",
+                        "isp": "Mock ISP",
+                    }
+                )
+        data = json.dumps(results).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Rl", str(left))
+        self.send_header("X-Ttl", str(max(1, round(ttl))))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # Stalled handlers must not hold up shutdown
+    daemon_threads = True
+    block_on_close = False
+
+
+@contextmanager
+def local_http_server(routes, handler=CannedHandler):
+    """Run a threaded HTTP stand-in on 127.0.0.1 and yield its base URL;
+    `handler` reads its configuration from `server.routes`."""
+    server = _Server(("127.0.0.1", 0), handler)
+    server.routes = routes
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
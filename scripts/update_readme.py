@@ -62,6 +62,18 @@ def build_block(stats):
     return block
 
 
+WALL_OF_SHAME_QUERY = """
+    SELECT bi.ip_address,
+           COALESCE(ig.asn, ig.isp, 'N/A') AS domain,
+           bi.severity,
+           bi.threat_count
+    FROM bad_ips bi
+    LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+    ORDER BY bi.severity DESC, bi.threat_count DESC
+    LIMIT ?
+"""
+
+
 def load_wall_of_shame(db_path="data/badips.db", limit=20):
     """Load top offenders for Wall of Shame from SQLite database.
     Returns list of dicts: {ip, domain, severity, threats}
@@ -69,24 +81,12 @@ def load_wall_of_shame(db_path="data/badips.db", limit=20):
     p = Path(db_path)
     if not p.exists():
         return []
-    import sqlite3
+    import db
 
     try:
-        conn = sqlite3.connect(str(p))
+        conn = db.connect_readonly(p)
         cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT bi.ip_address,
-                   COALESCE(ig.asn, ig.isp, 'N/A') AS domain,
-                   bi.severity,
-                   bi.threat_count
-            FROM bad_ips bi
-            LEFT JOIN ip_geolocation ig ON ig.ip_address = bi.ip_address
-            ORDER BY bi.severity DESC, bi.threat_count DESC
-            LIMIT ?
-            """,
-            (int(limit),),
-        )
+        cursor.execute(WALL_OF_SHAME_QUERY, (int(limit),))
         rows = cursor.fetchall()
         conn.close()
         results = [
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
+import csv
+import functools
+import gzip
 import sqlite3
 import sys
 from pathlib import Path
 import json
 
-try:
-    import pandas as pd
-except ImportError:
-    pd = None
+import bloom
+import columnar
+import db
+import firewall_sets
+import ip_index
+import rollups
+from ipkeys import covering_starts, ip_to_key, network_bounds
 
 
 def show_stats():
@@ -17,70 +23,85 @@ def show_stats():
         print("ERROR: Database not found. Run process_badips.py first.")
         return
 
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
+    conn = db.connect_readonly(db_path)
 
     print("\nBad IP Database Statistics")
     print("=" * 50)
 
-    cursor.execute("SELECT COUNT(*) FROM bad_ips")
-    total_ips = cursor.fetchone()[0]
+    # Every figure comes from the agg_* rollups (see rollups.py)
+    severity_rows = rollups.severity_counts(conn)
+    total_ips = sum(count for _, count in severity_rows)
     print(f"Total Malicious IPs: {total_ips:,}")
 
-    cursor.execute(
-        "SELECT COUNT(DISTINCT country) FROM ip_geolocation WHERE country IS NOT NULL"
-    )
-    countries = cursor.fetchone()[0]
-    print(f"Countries Affected: {countries}")
+    country_rows = rollups.country_counts(conn)
+    print(f"Countries Affected: {len(country_rows)}")
 
-    cursor.execute("SELECT AVG(severity) FROM bad_ips")
-    avg_severity = cursor.fetchone()[0] or 0
+    rated = [(s, c) for s, c in severity_rows if s is not None]
+    rated_ips = sum(c for _, c in rated)
+    avg_severity = sum(s * c for s, c in rated) / rated_ips if rated_ips else 0
     print(f"Average Severity: {avg_severity:.2f}/5")
 
-    cursor.execute("SELECT COUNT(*) FROM ip_geolocation")
-    geo_enriched = cursor.fetchone()[0]
+    geo_enriched = rollups.geo_total(conn)
     print(f"IPs with Geolocation: {geo_enriched:,}")
 
     print("\nTop 5 Countries:")
     print("-" * 50)
-    cursor.execute(
-        """
-        SELECT country, COUNT(*) as count 
-        FROM ip_geolocation 
-        WHERE country IS NOT NULL
-        GROUP BY country 
-        ORDER BY count DESC 
-        LIMIT 5
-    """
-    )
-    for country, count in cursor.fetchall():
+    for country, count, *_ in country_rows[:5]:
         print(f"  {country}: {count:,} IPs")
 
     print("\nThreat Severity Distribution:")
     print("-" * 50)
-    cursor.execute(
-        """
-        SELECT severity, COUNT(*) as count
-        FROM bad_ips
-        GROUP BY severity
-        ORDER BY severity
-    """
-    )
-    for severity, count in cursor.fetchall():
+    for severity, count in severity_rows:
         bar_str = "#" * (count // max(1, total_ips // 20))
         print(f"  Level {severity}: {count:,} IPs {bar_str}")
 
     conn.close()
 
 
+def find_covering_networks(cursor, ip_key):
+    """Return listed networks containing `ip_key`, most specific first.
+
+    Each prefix length in use contributes one aligned candidate start key, so
+    the lookup is a handful of index probes regardless of table size.
+    """
+    try:
+        cursor.execute("SELECT DISTINCT prefix_len FROM bad_networks")
+    except sqlite3.OperationalError:
+        # Database predates the bad_networks table
+        return []
+    starts = covering_starts(ip_key, [r[0] for r in cursor.fetchall()])
+    if not starts:
+        return []
+    placeholders = ",".join("?" * len(starts))
+    cursor.execute(
+        f"""
+        SELECT network, severity, threat_count, sources
+        FROM bad_networks
+        WHERE start_key IN ({placeholders}) AND end_key >= ?
+        ORDER BY prefix_len DESC
+    """,
+        (*starts, ip_key),
+    )
+    return cursor.fetchall()
+
+
 def search_ip(ip_address):
+    if "/" in ip_address:
+        search_network(ip_address)
+        return
+
     db_path = Path("data/badips.db")
 
     if not db_path.exists():
         print("ERROR: Database not found.")
         return
 
-    conn = sqlite3.connect(str(db_path))
+    ip_key = ip_to_key(ip_address.strip())
+    if ip_key is None:
+        print(f"Invalid IP address: {ip_address}")
+        return
+
+    conn = db.connect_readonly(db_path)
     cursor = conn.cursor()
 
     cursor.execute(
@@ -89,13 +110,14 @@ def search_ip(ip_address):
                bi.first_seen, bi.last_updated,
                ig.country, ig.city, ig.latitude, ig.longitude, ig.asn
         FROM bad_ips bi
-        LEFT JOIN ip_geolocation ig ON bi.ip_address = ig.ip_address
-        WHERE bi.ip_address = ?
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE bi.ip_key = ?
     """,
-        (ip_address,),
+        (ip_key,),
     )
 
     result = cursor.fetchone()
+    networks = find_covering_networks(cursor, ip_key)
     conn.close()
 
     if result:
@@ -116,47 +138,276 @@ def search_ip(ip_address):
     else:
         print(f"IP {ip_address} not found in malicious database.")
 
+    if networks:
+        print("\nCovered by listed network(s):")
+        for network, severity, threat_count, sources in networks:
+            print(
+                f"  {network}  severity {severity}/5"
+                f"  ({sources or 'unknown source'})"
+            )
+
     print()
 
 
-def export_data(format_type="csv"):
-    """Export database to CSV/ JSON"""
+def search_network(cidr, limit=50):
+    """List malicious IPs inside a CIDR block using an `ip_key` range scan."""
     db_path = Path("data/badips.db")
 
     if not db_path.exists():
         print("ERROR: Database not found.")
         return
 
-    conn = sqlite3.connect(str(db_path))
+    try:
+        start_key, end_key = network_bounds(cidr)
+    except ValueError:
+        print(f"Invalid network: {cidr}")
+        return
 
-    query = """
-        SELECT bi.ip_address, bi.severity, bi.threat_count,
-               bi.first_seen, bi.last_updated,
-               ig.country, ig.city, ig.latitude, ig.longitude, ig.asn
+    conn = db.connect_readonly(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM bad_ips WHERE ip_key BETWEEN ? AND ?",
+        (start_key, end_key),
+    )
+    total = cursor.fetchone()[0]
+
+    cursor.execute(
+        """
+        SELECT bi.ip_address, bi.severity, bi.threat_count, ig.country, ig.asn
         FROM bad_ips bi
-        LEFT JOIN ip_geolocation ig ON bi.ip_address = ig.ip_address
-        ORDER BY bi.threat_count DESC
+        LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+        WHERE bi.ip_key BETWEEN ? AND ?
+        ORDER BY bi.ip_key
+        LIMIT ?
+    """,
+        (start_key, end_key, int(limit)),
+    )
+    rows = cursor.fetchall()
+    conn.close()
+
+    print(f"\nMalicious IPs in {cidr}: {total:,}")
+    print("=" * 50)
+    for ip, severity, threat_count, country, asn in rows:
+        print(
+            f"  {ip:<39} severity {severity}/5  threats {threat_count}"
+            f"  {country or '-'}  {asn or '-'}"
+        )
+    if total > len(rows):
+        print(f"  ... {total - len(rows):,} more")
+    print()
+
+
+def search_file(path, format_type="csv"):
+    """Check every address in a file (or stdin for `-`) against the database.
+
+    The bad-IP set and network ranges are loaded into memory once; matches
+    stream to stdout as CSV or JSONL and the summary goes to stderr.
     """
+    db_path = Path("data/badips.db")
+
+    if not db_path.exists():
+        print("ERROR: Database not found.", file=sys.stderr)
+        return
+
+    if format_type not in ("csv", "jsonl"):
+        print(f"Unknown output format: {format_type}", file=sys.stderr)
+        return
+
+    conn = db.connect_readonly(db_path)
+    index = ip_index.IpIndex.from_db(conn)
+    conn.close()
+
+    if format_type == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(ip_index.FIELDS)
+        on_match = writer.writerow
+    else:
 
-    if format_type.lower() == "csv":
-        if pd is None:
-            print("ERROR: pandas not installed. Install with: pip install pandas")
+        def on_match(row):
+            sys.stdout.write(json.dumps(dict(zip(ip_index.FIELDS, row))) + "\n")
+
+    if path == "-":
+        checked, matched, invalid, seconds = ip_index.scan(index, sys.stdin, on_match)
+    else:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            checked, matched, invalid, seconds = ip_index.scan(index, f, on_match)
+    sys.stdout.flush()
+
+    rate = checked / seconds if seconds else 0
+    print(
+        f"Checked {checked:,} addresses: {matched:,} matches, {invalid:,} invalid"
+        f" lines, {rate:,.0f} lookups/sec",
+        file=sys.stderr,
+    )
+
+
+EXPORT_QUERY = """
+    SELECT bi.ip_address, bi.severity, bi.threat_count,
+           bi.first_seen, bi.last_updated,
+           ig.country, ig.city, ig.latitude, ig.longitude, ig.asn
+    FROM bad_ips bi
+    LEFT JOIN ip_geolocation ig ON ig.ip_key = bi.ip_key
+    {where}
+    ORDER BY {order}
+"""
+# Unfiltered exports list the most-seen IPs first; filtered ones are ordered
+# by the first filter's column before that, so its index can drive the query
+EXPORT_ORDER = "bi.threat_count DESC"
+EXPORT_BATCH = 5000
+# Columns accepted by `--where`, mapped to their SQL expression
+EXPORT_FILTERS = {
+    "severity": "bi.severity",
+    "threat_count": "bi.threat_count",
+    "first_seen": "bi.first_seen",
+    "last_updated": "bi.last_updated",
+    "country": "ig.country",
+    "city": "ig.city",
+    "asn": "ig.asn",
+}
+FILTER_OPS = (">=", "<=", "!=", "=", ">", "<")
+
+
+def parse_filter(expr):
+    """Turn `column<op>value` (e.g. `severity>=4`, `country=US`) into a SQL
+    condition and its parameter. Raises ValueError for anything else."""
+    for op in FILTER_OPS:
+        column, sep, value = expr.partition(op)
+        if sep:
+            column = column.strip().lower()
+            if column not in EXPORT_FILTERS:
+                raise ValueError(
+                    f"cannot filter on {column!r}; use one of "
+                    + ", ".join(EXPORT_FILTERS)
+                )
+            value = value.strip()
+            if column in ("severity", "threat_count"):
+                value = int(value)
+            return f"{EXPORT_FILTERS[column]} {op} ?", value
+    raise ValueError(f"expected column<op>value, got {expr!r}")
+
+
+def export_query(filters=()):
+    """EXPORT_QUERY restricted by `parse_filter` expressions, and its
+    parameters."""
+    conditions = [parse_filter(expr) for expr in filters]
+    where, order = "", EXPORT_ORDER
+    if conditions:
+        where = "WHERE " + " AND ".join(sql for sql, _ in conditions)
+        leading = conditions[0][0].split()[0]
+        if leading != "bi.threat_count":
+            order = f"{leading} DESC, {order}"
+    query = EXPORT_QUERY.format(where=where, order=order)
+    return query, [value for _, value in conditions]
+
+
+def iter_export_rows(conn, filters=()):
+    """Yield the column names, then every export row, `EXPORT_BATCH` at a
+    time from the cursor. `filters` are `parse_filter` expressions."""
+    cursor = conn.execute(*export_query(filters))
+    yield [description[0] for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH)
+        if not rows:
+            break
+        yield from rows
+
+
+def write_export(rows, out, format_type="csv"):
+    """Write `iter_export_rows` output to the text stream `out` as csv,
+    jsonl or json (an array with one object per line). Returns the row
+    count."""
+    columns = next(rows)
+    count = 0
+    if format_type == "csv":
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif format_type == "jsonl":
+        for row in rows:
+            out.write(json.dumps(dict(zip(columns, row))) + "\n")
+            count += 1
+    else:
+        out.write("[")
+        for row in rows:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(dict(zip(columns, row))))
+            count += 1
+        out.write("\n]\n")
+    return count
+
+
+def export_data(
+    format_type="csv", fp_rate=None, filters=(), compress=False, min_severity=None
+):
+    """Export database to CSV/ JSON/ JSONL (optionally gzipped), a Parquet/
+    Arrow snapshot, an aggregated firewall set, or a Bloom filter of listed
+    IPs and networks"""
+    db_path = Path("data/badips.db")
+
+    if not db_path.exists():
+        print("ERROR: Database not found.")
+        return
+
+    format_type = format_type.lower()
+    try:
+        for expr in filters:
+            parse_filter(expr)
+    except ValueError as exc:
+        print(f"ERROR: invalid --where filter: {exc}")
+        return
+
+    conn = db.connect_readonly(db_path)
+
+    if format_type in ("csv", "json", "jsonl"):
+        output_file = f"bad_ips_export.{format_type}"
+        opener = open
+        if compress:
+            output_file += ".gz"
+            opener = functools.partial(gzip.open, compresslevel=6)
+        with opener(output_file, "wt", encoding="utf-8", newline="") as f:
+            count = write_export(iter_export_rows(conn, filters), f, format_type)
+        print(f"Exported {count:,} rows to {output_file}")
+
+    elif format_type in columnar.FORMATS:
+        output_file = "bad_ips_export" + columnar.FORMATS[format_type]
+        try:
+            count = columnar.write_snapshot(
+                iter_export_rows(conn, filters), output_file, format_type
+            )
+        except RuntimeError as exc:
+            print(f"ERROR: {exc}")
         else:
-            df = pd.read_sql_query(query, conn)
-            output_file = "bad_ips_export.csv"
-            df.to_csv(output_file, index=False)
-            print(f"Exported to {output_file}")
-
-    elif format_type.lower() == "json":
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [description[0] for description in cursor.description]
-        data = [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-        output_file = "bad_ips_export.json"
+            print(f"Exported {count:,} rows to {output_file}")
+
+    elif format_type in firewall_sets.FORMATS:
+        cidrs, entries = firewall_sets.aggregate(conn, min_severity)
+        total = sum(len(rows) for rows in cidrs.values())
+        output_file = firewall_sets.FORMATS[format_type]
         with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        print(f"Exported to {output_file}")
+            firewall_sets.write_set(cidrs, f, format_type)
+        saved = entries - total
+        print(
+            f"Exported {total:,} CIDRs to {output_file}, aggregated from"
+            f" {entries:,} addresses and networks ({saved:,} entries saved,"
+            f" {100 * saved / entries if entries else 0:.1f}%)"
+        )
+
+    elif format_type == "bloom":
+        fp_rate = fp_rate or bloom.DEFAULT_FP_RATE
+        bf = bloom.build_from_db(conn, fp_rate)
+        output_file = "bad_ips.bloom"
+        size = bf.save(output_file)
+        print(
+            f"Exported {bf.count:,} addresses and networks to {output_file}"
+            f" ({size / 1024:,.0f} KB,"
+            f" k={bf.k}, target false-positive rate {fp_rate:g})"
+        )
+
+    else:
+        print(f"Unknown export format: {format_type}")
 
     conn.close()
 
@@ -168,6 +419,9 @@ def reset_database():
         confirm = input(f"WARNING: This will delete {db_path}. Continue? (yes/no): ")
         if confirm.lower() == "yes":
             db_path.unlink()
+            # WAL mode leaves these next to the database while it is open
+            for suffix in ("-wal", "-shm"):
+                Path(str(db_path) + suffix).unlink(missing_ok=True)
             print("Database deleted.")
         else:
             print("Cancelled.")
@@ -182,7 +436,21 @@ def main():
         print("\nUsage:")
         print("  python utils.py stats              - Show database statistics")
         print("  python utils.py search <IP>        - Search for an IP address")
-        print("  python utils.py export [csv|json]  - Export database")
+        print("  python utils.py search <CIDR>      - List IPs inside a network")
+        print("  python utils.py search --file <path|-> [--format csv|jsonl]")
+        print("                                     - Check a file of IPs (or stdin)")
+        print("  python utils.py export [csv|json|jsonl] [--gzip] [--where EXPR ...]")
+        print("                                     - Export database, e.g.")
+        print(
+            "                                       --where severity>=4 --where country=US"
+        )
+        print("  python utils.py export [parquet|arrow] [--where EXPR ...]")
+        print(
+            "                                     - Columnar snapshot (needs pyarrow)"
+        )
+        print("  python utils.py export [ipset|nft|iptables|cidr] [--min-severity N]")
+        print("                                     - Aggregated firewall set")
+        print("  python utils.py export bloom [FP]  - Bloom filter of IPs and networks")
         print("  python utils.py reset              - Reset database")
         return
 
@@ -193,11 +461,33 @@ def main():
     elif command == "search":
         if len(sys.argv) < 3:
             print("Please provide an IP address to search.")
+        elif sys.argv[2] == "--file":
+            if len(sys.argv) < 4:
+                print("Please provide a file path, or - for stdin.")
+                return
+            args = sys.argv[4:]
+            format_type = "csv"
+            if "--format" in args and args.index("--format") + 1 < len(args):
+                format_type = args[args.index("--format") + 1].lower()
+            search_file(sys.argv[3], format_type)
         else:
             search_ip(sys.argv[2])
     elif command == "export":
-        format_type = sys.argv[2] if len(sys.argv) > 2 else "csv"
-        export_data(format_type)
+        args = sys.argv[2:]
+        format_type = args[0] if args and not args[0].startswith("--") else "csv"
+        if format_type == "bloom":
+            export_data("bloom", float(args[1]) if len(args) > 1 else None)
+            return
+        filters = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == "--where"]
+        min_severity = None
+        if "--min-severity" in args and args.index("--min-severity") + 1 < len(args):
+            min_severity = int(args[args.index("--min-severity") + 1])
+        export_data(
+            format_type,
+            filters=filters,
+            compress="--gzip" in args,
+            min_severity=min_severity,
+        )
     elif command == "reset":
         reset_database()
     else:
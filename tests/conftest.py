@@ -0,0 +1,36 @@
+"""Shared fixtures. The scripts import each other as top-level modules, so
+`scripts/` goes on the path just as when they are run from that directory."""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import http_cache  # noqa: E402
+import process_badips  # noqa: E402
+
+from .samples import LISTED_NETWORKS, random_ips  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(tmp_path, monkeypatch):
+    """Keep conditional-GET validators out of the repo's `.cache/`."""
+    path = tmp_path / "http"
+    monkeypatch.setattr(http_cache, "CACHE_DIR", path)
+    return path
+
+
+@pytest.fixture
+def listed_db(tmp_path):
+    """A database with 2,000 listed addresses and LISTED_NETWORKS; yields
+    (conn, {ip: severity})."""
+    rng = random.Random(1337)
+    listed = {ip: rng.randint(1, 5) for ip in random_ips(rng, 2000)}
+    conn = process_badips.create_database(tmp_path / "badips.db")
+    process_badips.insert_ips_to_database(conn, list(listed.items()))
+    process_badips.insert_networks_to_database(conn, LISTED_NETWORKS)
+    yield conn, listed
+    conn.close()
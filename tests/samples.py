@@ -0,0 +1,28 @@
+"""Sample data shared by the tests."""
+
+import ipaddress
+
+# Nested and adjacent blocks, both families, with different severities
+LISTED_NETWORKS = [
+    ("45.0.0.0/16", 2, "drop"),
+    ("45.0.128.0/24", 5, "drop"),
+    ("45.1.0.0/16", 1, "plain"),
+    ("80.0.0.0/12", 3, "drop"),
+    ("2a00:1450::/32", 3, "plain"),
+    ("2a00:1450:4000::/36", 4, "plain"),
+]
+
+
+def random_ips(rng, n):
+    """`n` distinct addresses: mostly IPv4, some inside LISTED_NETWORKS,
+    some IPv6."""
+    ips = set()
+    while len(ips) < n:
+        roll = rng.random()
+        if roll < 0.1:
+            ips.add(f"45.{rng.randrange(2)}.{rng.randrange(256)}.{rng.randrange(256)}")
+        elif roll < 0.2:
+            ips.add(f"2a00:1450:{rng.randrange(1 << 16):x}::{rng.randrange(1 << 16):x}")
+        else:
+            ips.add(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+    return sorted(ips)
@@ -0,0 +1,74 @@
+"""`badips_idx` against the database it was compiled from."""
+
+import ipaddress
+import random
+
+import pytest
+
+import badips_idx
+from .samples import LISTED_NETWORKS, random_ips
+
+
+def expected_severity(ip, listed):
+    """Ground truth: a listed address's own severity, else the highest
+    severity of the networks covering it."""
+    if ip in listed:
+        return listed[ip]
+    addr = ipaddress.ip_address(ip)
+    covering = [
+        sev
+        for net, sev, _ in LISTED_NETWORKS
+        if addr.version == ipaddress.ip_network(net).version
+        and addr in ipaddress.ip_network(net)
+    ]
+    return max(covering, default=None)
+
+
+@pytest.fixture
+def index(listed_db, tmp_path):
+    conn, _ = listed_db
+    path = tmp_path / "badips.idx"
+    badips_idx.write_index(conn, path)
+    with badips_idx.BadIpIndex(path) as index:
+        yield index
+
+
+def test_every_listed_address_has_its_severity(index, listed_db):
+    _, listed = listed_db
+
+    assert len(index) == len(listed)
+    assert [index.severity(ip) for ip in listed] == list(listed.values())
+
+
+def test_random_probes_match_the_database(index, listed_db):
+    _, listed = listed_db
+    probes = random_ips(random.Random(7), 5000) + [
+        "45.0.127.255",
+        "45.0.128.0",
+        "45.0.128.255",
+        "45.0.129.0",
+        "45.1.255.255",
+        "45.2.0.0",
+        "79.255.255.255",
+        "80.15.255.255",
+        "80.16.0.0",
+        "2a00:1450:3fff::1",
+        "2a00:1450:4fff:ffff::",
+        "2a00:1451::",
+    ]
+
+    errors = [
+        ip for ip in probes if index.severity(ip) != expected_severity(ip, listed)
+    ]
+    assert errors == []
+    assert index.severity("45.0.128.7") == 5
+    assert "45.0.128.7" in index and "8.8.8.8" not in index
+
+
+def test_invalid_address_and_wrong_file(index, tmp_path):
+    with pytest.raises(ValueError):
+        index.severity("not-an-ip")
+    other = tmp_path / "other.idx"
+    other.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        badips_idx.BadIpIndex(other)
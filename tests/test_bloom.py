@@ -0,0 +1,79 @@
+"""`bloom` filters built from the database: no false negatives, the target
+false-positive rate, and the documented file format."""
+
+import ipaddress
+import random
+
+import pytest
+
+import bloom
+from .samples import LISTED_NETWORKS, random_ips
+
+
+@pytest.fixture
+def built(listed_db):
+    conn, listed = listed_db
+    return bloom.build_from_db(conn, fp_rate=0.01), listed
+
+
+def _covered(ip):
+    addr = ipaddress.ip_address(ip)
+    return any(
+        addr.version == ipaddress.ip_network(net).version
+        and addr in ipaddress.ip_network(net)
+        for net, _, _ in LISTED_NETWORKS
+    )
+
+
+def test_no_false_negatives(built):
+    bf, listed = built
+    rng = random.Random(3)
+    inside = [
+        str(network[rng.randrange(network.num_addresses)])
+        for net, _, _ in LISTED_NETWORKS
+        for network in [ipaddress.ip_network(net)] * 50
+    ]
+
+    assert bf.count == len(listed) + len(LISTED_NETWORKS)
+    assert [ip for ip in listed if ip not in bf] == []
+    assert [ip for ip in inside if ip not in bf] == []
+
+
+def test_false_positive_rate_near_target(built):
+    bf, listed = built
+    probes = [
+        ip
+        for ip in random_ips(random.Random(11), 20_000)
+        if ip not in listed and not _covered(ip)
+    ]
+
+    rate = sum(ip in bf for ip in probes) / len(probes)
+    assert rate <= 0.02
+
+
+def test_save_and_load_round_trip(built, tmp_path):
+    bf, listed = built
+    path = tmp_path / "badips.bloom"
+    size = bf.save(path)
+    data = path.read_bytes()
+
+    assert size == len(data)
+    assert data[:8] == bloom.MAGIC
+    assert size == bloom.HEADER.size + len(bf.prefix_lens) + (bf.m + 7) // 8
+    assert data[bloom.HEADER.size : bloom.HEADER.size + len(bf.prefix_lens)] == bytes(
+        (12, 16, 24, 32, 36, 128)
+    )
+    loaded = bloom.BloomFilter.load(path)
+    assert (loaded.m, loaded.k, loaded.count) == (bf.m, bf.k, bf.count)
+    assert loaded.prefix_lens == bf.prefix_lens
+    assert all(ip in loaded for ip in list(listed)[:200])
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "old.bloom"
+    path.write_bytes(b"BADBLOOM\x01\x00\x00\x00" + b"\0" * 64)
+
+    with pytest.raises(ValueError):
+        bloom.BloomFilter.load(path)
+    with pytest.raises(ValueError):
+        bloom.BloomFilter(10).add_network(b"\0" * 16, 20)
@@ -0,0 +1,18 @@
+"""`db` connection settings and the shipped file's journal mode."""
+
+import db
+import process_badips
+
+
+def test_released_database_leaves_no_sidecar_files(tmp_path):
+    conn = process_badips.create_database(tmp_path / "badips.db")
+    process_badips.insert_ips_to_database(conn, [("198.51.100.7", 4)])
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.release_wal(conn)
+    conn.close()
+
+    reader = db.connect_readonly(tmp_path / "badips.db")
+    assert reader.execute("SELECT COUNT(*) FROM bad_ips").fetchone()[0] == 1
+    reader.close()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["badips.db"]
@@ -0,0 +1,75 @@
+"""`fetch_blacklists.fetch_all` against a local blocklist mirror."""
+
+import time
+
+import pytest
+
+import fetch_blacklists
+from stand_ins import local_http_server
+
+ROUTES = {
+    "/slow-a.txt": (b"203.0.113.1\n203.0.113.2\n", 1.0),
+    "/slow-b.txt": (b"198.51.100.7\t3\n", 1.0),
+    "/drop.txt": (b"1.10.16.0/22 ; SBL256894\n", 0.0),
+    "/missing.txt": (None, 0.0),
+    "/stalled.txt": (b"192.0.2.9\n", 10.0),
+}
+
+
+@pytest.fixture
+def mirror():
+    with local_http_server(dict(ROUTES)) as base:
+        yield base
+
+
+def _sources(base, *paths):
+    return [(path.strip("/"), base + path) for path in paths]
+
+
+def test_sources_download_concurrently(mirror):
+    start = time.perf_counter()
+    results = fetch_blacklists.fetch_all(
+        _sources(mirror, "/slow-a.txt", "/slow-b.txt", "/drop.txt"), deadline=5
+    )
+    elapsed = time.perf_counter() - start
+
+    # Two 1 s sources in parallel, not one after the other
+    assert elapsed < 1.9
+    assert [r["name"] for r in results] == ["slow-a.txt", "slow-b.txt", "drop.txt"]
+    assert all(r["ok"] and not r["unchanged"] for r in results)
+    assert results[0]["bytes"] == len(ROUTES["/slow-a.txt"][0])
+    assert results[0]["seconds"] >= 1.0
+    with open(results[2]["path"], "rb") as f:
+        assert f.read() == ROUTES["/drop.txt"][0]
+
+
+def test_deadline_fails_stalled_source_only(mirror):
+    start = time.perf_counter()
+    results = fetch_blacklists.fetch_all(
+        _sources(mirror, "/stalled.txt", "/drop.txt"), deadline=2
+    )
+
+    assert time.perf_counter() - start < 4
+    stalled, drop = results
+    assert not stalled["ok"] and stalled["path"] is None and stalled["bytes"] == 0
+    assert drop["ok"]
+
+
+def test_missing_source_is_reported_not_raised(mirror):
+    (missing,) = fetch_blacklists.fetch_all(
+        _sources(mirror, "/missing.txt"), deadline=5
+    )
+
+    assert not missing["ok"]
+    assert missing["bytes"] == 0
+
+
+def test_unchanged_source_is_revalidated(mirror):
+    sources = _sources(mirror, "/drop.txt")
+    (first,) = fetch_blacklists.fetch_all(sources, deadline=5)
+    (again,) = fetch_blacklists.fetch_all(sources, deadline=5)
+
+    assert first["ok"] and not first["unchanged"]
+    assert again["ok"] and again["unchanged"]
+    assert again["path"] == first["path"]
+    assert again["bytes"] == first["bytes"]
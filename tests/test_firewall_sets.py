@@ -0,0 +1,93 @@
+"""`firewall_sets` aggregation against `ipaddress.collapse_addresses`."""
+
+import io
+import ipaddress
+
+import pytest
+
+import firewall_sets
+from .samples import LISTED_NETWORKS
+
+
+def _expected(listed, min_severity=0):
+    """Collapsed networks per family, computed with `ipaddress`."""
+    entries = [ip for ip, sev in listed.items() if sev >= min_severity]
+    entries += [net for net, sev, _ in LISTED_NETWORKS if sev >= min_severity]
+    networks = [ipaddress.ip_network(entry) for entry in entries]
+    return {
+        bits: list(
+            ipaddress.collapse_addresses(n for n in networks if n.max_prefixlen == bits)
+        )
+        for bits in (32, 128)
+    }
+
+
+def _as_networks(cidrs):
+    return {
+        bits: [
+            ipaddress.ip_network(firewall_sets.format_cidr(net, prefix_len, bits))
+            for net, prefix_len in rows
+        ]
+        for bits, rows in cidrs.items()
+    }
+
+
+@pytest.mark.parametrize("min_severity", [None, 3])
+def test_aggregate_matches_collapse_addresses(listed_db, min_severity):
+    conn, listed = listed_db
+    floor = min_severity or 0
+    cidrs, entries = firewall_sets.aggregate(conn, min_severity)
+
+    assert _as_networks(cidrs) == _expected(listed, floor)
+    assert entries == sum(sev >= floor for sev in listed.values()) + sum(
+        sev >= floor for _, sev, _ in LISTED_NETWORKS
+    )
+
+
+@pytest.mark.parametrize(
+    "start, end, bits, expected",
+    [
+        ("10.0.0.0", "10.0.0.255", 32, ["10.0.0.0/24"]),
+        (
+            "10.0.0.1",
+            "10.0.0.6",
+            32,
+            ["10.0.0.1", "10.0.0.2/31", "10.0.0.4/31", "10.0.0.6"],
+        ),
+        ("0.0.0.0", "255.255.255.255", 32, ["0.0.0.0/0"]),
+        ("::", "::3", 128, ["::/126"]),
+    ],
+)
+def test_range_to_cidrs(start, end, bits, expected):
+    start = int(ipaddress.ip_address(start))
+    end = int(ipaddress.ip_address(end))
+    cidrs = [
+        firewall_sets.format_cidr(net, prefix_len, bits)
+        for net, prefix_len in firewall_sets.range_to_cidrs(start, end, bits)
+    ]
+    assert cidrs == expected
+
+
+def test_collapse_merges_overlapping_and_adjacent():
+    intervals = [(1, 3), (2, 5), (6, 6), (8, 9), (9, 9), (11, 20), (12, 13)]
+    assert list(firewall_sets.collapse(intervals)) == [(1, 6), (8, 9), (11, 20)]
+
+
+def test_write_set_formats():
+    cidrs = {
+        32: [(int(ipaddress.ip_address("45.0.0.0")), 16)],
+        128: [(int(ipaddress.ip_address("2a00:1450::")), 32)],
+    }
+    out = {}
+    for format_type in firewall_sets.FORMATS:
+        buf = io.StringIO()
+        firewall_sets.write_set(cidrs, buf, format_type)
+        out[format_type] = buf.getvalue()
+
+    assert out["cidr"] == "45.0.0.0/16\n2a00:1450::/32\n"
+    assert "add badips 45.0.0.0/16 -exist\n" in out["ipset"]
+    assert "create badips6 hash:net family inet6" in out["ipset"]
+    assert "add element inet badips badips { 45.0.0.0/16 }" in out["nft"]
+    assert "add element inet badips badips6 { 2a00:1450::/32 }" in out["nft"]
+    assert "-A BADIPS -s 45.0.0.0/16 -j DROP\n" in out["iptables"]
+    assert "2a00" not in out["iptables"]
@@ -0,0 +1,135 @@
+"""`geo_api` and the ip-api enrichment path against a mock ip-api."""
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+import geo_api
+import geo_cache
+import process_badips
+from ipkeys import ip_to_key
+from stand_ins import GeoApiHandler, geo_api_config, local_http_server
+
+
+@pytest.fixture
+def geo_cache_path(tmp_path, monkeypatch):
+    path = tmp_path / "geo.db"
+    monkeypatch.setattr(geo_cache, "CACHE_PATH", path)
+    return path
+
+
+def _mock_api(config):
+    return local_http_server(config, GeoApiHandler)
+
+
+def _ips(n, prefix="203.0"):
+    return [f"{prefix}.{i // 250}.{i % 250 + 1}" for i in range(n)]
+
+
+def _collect(ips, url, **kwargs):
+    batches = []
+    done = geo_api.lookup(
+        ips, lambda batch, rows: batches.append((batch, rows)), url=url, **kwargs
+    )
+    return done, batches
+
+
+def test_token_bucket_cold_start_stays_under_limit():
+    # As `_lookup` sizes it, scaled from a 60 s window to 1 s
+    limit, window, burst = 15, 1.0, 4
+    bucket = geo_api.TokenBucket((limit - burst) / window, burst)
+
+    async def count():
+        start, n = time.monotonic(), 0
+        while True:
+            await bucket.acquire()
+            if time.monotonic() - start >= window:
+                return n
+            n += 1
+
+    assert burst < asyncio.run(count()) <= limit
+
+
+def test_batches_come_back_in_order_and_skip_failures():
+    ips = _ips(25) + ["10.1.2.3"]
+    with _mock_api(geo_api_config(rate=100)) as base:
+        done, batches = _collect(ips, base + "/batch", batch_size=10)
+
+    assert done == 3
+    assert [batch for batch, _ in batches] == [ips[:10], ips[10:20], ips[20:]]
+    rows = [row for _, batch_rows in batches for row in batch_rows]
+    assert [row[0] for row in rows] == ips[:-1]
+    assert rows[0][1:] == (
+        "Mockland",
+        "Mock City",
+        1.0,
+        2.0,
+        "AS64500 Mock Networks",
+        "Mock ISP",
+    )
+
+
+def test_window_reported_by_x_rl_is_honoured():
+    config = geo_api_config(rate=2, window=1.0)
+    start = time.perf_counter()
+    with _mock_api(config) as base:
+        done, _ = _collect(
+            _ips(50),
+            base + "/batch",
+            batch_size=10,
+            rate_per_minute=6000,
+            concurrency=1,
+        )
+
+    # 5 batches at 2 per window: the client waits for two window resets
+    assert done == 5
+    assert config["limited"] == 0
+    assert time.perf_counter() - start >= 1.5
+
+
+def test_429_pauses_until_the_window_resets_then_retries():
+    config = geo_api_config(rate=1, window=1.0)
+    with _mock_api(config) as base:
+        # Someone else on this address used up the window
+        requests.post(base + "/batch", json=[], timeout=5)
+        start = time.perf_counter()
+        done, batches = _collect(
+            _ips(20),
+            base + "/batch",
+            batch_size=10,
+            rate_per_minute=6000,
+            concurrency=1,
+        )
+        elapsed = time.perf_counter() - start
+
+    assert done == 2
+    assert sum(len(rows) for _, rows in batches) == 20
+    assert config["limited"] == 1
+    assert elapsed >= 0.9
+
+
+def test_enrichment_resumes_where_the_last_run_stopped(tmp_path, geo_cache_path):
+    ips = _ips(300)
+    conn = process_badips.create_database(tmp_path / "badips.db")
+    process_badips.insert_ips_to_database(conn, [(ip, 3) for ip in ips])
+    config = geo_api_config(rate=100)
+    with _mock_api(config) as base:
+        first = process_badips.enrich_geolocation_data(
+            conn, limit=150, url=base + "/batch", use_cache=False
+        )
+        cursor = conn.cursor()
+        progress = process_badips._get_progress(cursor, "ip-api")
+        second = process_badips.enrich_geolocation_data(
+            conn, limit=150, url=base + "/batch", use_cache=False
+        )
+    stored = conn.execute("SELECT COUNT(*) FROM ip_geolocation").fetchone()[0]
+    conn.close()
+
+    assert (first, second) == (150, 150)
+    assert progress == ip_to_key(ips[149])
+    assert stored == 300
+    # 100 per batch: 100 + 50 in each run
+    assert config["requests"] == 4
+    assert not geo_cache_path.exists()
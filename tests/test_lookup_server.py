@@ -0,0 +1,136 @@
+"""`lookup_server` endpoints and hot reload over a small database."""
+
+import threading
+import time
+
+import pytest
+import requests
+
+import lookup_server
+import process_badips
+from ipkeys import ip_to_key
+
+LISTED = [("198.51.100.7", 5), ("198.51.100.8", 2), ("2001:db8::1", 4)]
+NETWORKS = [("203.0.113.0/24", 4, "drop")]
+
+
+@pytest.fixture
+def database(tmp_path):
+    conn = process_badips.create_database(tmp_path / "badips.db")
+    process_badips.insert_ips_to_database(conn, LISTED)
+    process_badips.insert_networks_to_database(conn, NETWORKS)
+    conn.execute(
+        "INSERT INTO ip_geolocation (ip_address, country, city, asn, ip_key)"
+        " VALUES (?, ?, ?, ?, ?)",
+        ("198.51.100.7", "Mockland", "Mock City", "AS64500", ip_to_key("198.51.100.7")),
+    )
+    conn.commit()
+    yield tmp_path / "badips.db", conn
+    conn.close()
+
+
+@pytest.fixture
+def server(database):
+    db_path, _ = database
+    server = lookup_server.LookupServer(("127.0.0.1", 0), db_path, reload_interval=0.1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_listed_ip(server):
+    r = requests.get(server + "/ip/198.51.100.7", timeout=5)
+
+    assert r.status_code == 200
+    assert r.json() == {
+        "listed": True,
+        "ip": "198.51.100.7",
+        "match": "ip",
+        "severity": 5,
+        "threat_count": 1,
+        "network": None,
+        "country": "Mockland",
+        "city": "Mock City",
+        "asn": "AS64500",
+    }
+
+
+def test_network_match_and_clean_ip(server):
+    inside = requests.get(server + "/ip/203.0.113.77", timeout=5).json()
+    clean = requests.get(server + "/ip/192.0.2.1", timeout=5).json()
+
+    assert inside["listed"] and inside["match"] == "network"
+    assert inside["network"] == "203.0.113.0/24"
+    assert inside["severity"] == 4
+    assert clean == {"ip": "192.0.2.1", "listed": False}
+
+
+def test_invalid_ip_is_400(server):
+    r = requests.get(server + "/ip/not-an-ip", timeout=5)
+
+    assert r.status_code == 400
+    assert r.json()["error"] == "invalid address"
+
+
+def test_network_query(server):
+    r = requests.get(server + "/network/198.51.100.0/24?limit=1", timeout=5)
+    body = r.json()
+
+    assert r.status_code == 200
+    assert body["network"] == "198.51.100.0/24"
+    assert body["listed_ips"] == 2
+    assert body["ips"] == ["198.51.100.7"]
+    assert body["networks"] == []
+    assert requests.get(server + "/network/nope", timeout=5).status_code == 400
+
+
+def test_bulk_accepts_json_and_text(server):
+    ips = ["198.51.100.7", "2001:db8::1", "203.0.113.5", "192.0.2.1", "bogus"]
+    as_json = requests.post(server + "/bulk", json=ips, timeout=5).json()
+    as_text = requests.post(server + "/bulk", data="\n".join(ips), timeout=5).json()
+
+    assert as_json == as_text
+    assert as_json["checked"] == 5 and as_json["listed"] == 3
+    assert [r.get("listed") for r in as_json["results"]] == [
+        True,
+        True,
+        True,
+        False,
+        None,
+    ]
+    assert as_json["results"][-1]["error"] == "invalid address"
+
+
+def test_bulk_rejects_bad_and_oversized_bodies(server, monkeypatch):
+    monkeypatch.setattr(lookup_server, "MAX_BULK", 2)
+    not_a_list = requests.post(server + "/bulk", json={"ip": "1.2.3.4"}, timeout=5)
+    too_many = requests.post(server + "/bulk", json=["1.1.1.1"] * 3, timeout=5)
+
+    assert not_a_list.status_code == 400
+    assert too_many.status_code == 413
+
+
+def test_database_changes_are_picked_up(server, database):
+    _, conn = database
+    assert not requests.get(server + "/ip/192.0.2.55", timeout=5).json()["listed"]
+
+    process_badips.insert_ips_to_database(conn, [("192.0.2.55", 3)])
+    deadline = time.monotonic() + 5
+    while not requests.get(server + "/ip/192.0.2.55", timeout=5).json()["listed"]:
+        assert time.monotonic() < deadline, "reload not seen within 5s"
+        time.sleep(0.05)
+
+    health = requests.get(server + "/health", timeout=5).json()
+    assert health["ips"] == len(LISTED) + 1
+
+
+def test_metrics_count_requests_per_endpoint(server):
+    for _ in range(3):
+        requests.get(server + "/ip/198.51.100.7", timeout=5)
+    requests.post(server + "/bulk", json=[], timeout=5)
+    metrics = requests.get(server + "/metrics", timeout=5).json()
+
+    assert metrics["/ip"]["count"] == 3
+    assert sum(metrics["/ip"]["buckets"].values()) == 3
+    assert metrics["/bulk"]["count"] == 1
@@ -0,0 +1,144 @@
+"""Format adapters in `fetch_blacklists.PARSERS` and the network filters."""
+
+import json
+
+import pytest
+
+import fetch_blacklists
+from fetch_blacklists import Record, iter_records
+from ipkeys import is_public_network
+
+
+def _parse(fmt, text):
+    return list(iter_records(text.splitlines(), fmt))
+
+
+def test_every_source_has_a_registered_adapter():
+    assert set(fetch_blacklists.SOURCE_FORMATS.values()) <= set(
+        fetch_blacklists.PARSERS
+    )
+    assert {"text", "plain", "ipsum", "drop", "json"} <= set(fetch_blacklists.PARSERS)
+
+
+def test_text_keeps_addresses_and_skips_cidrs():
+    text = """
+    # Incident notes
+    Scanner at 1.2.3.4 hit us, then 5.6.7.8:443 and 999.1.1.1.
+
+    Block 45.0.0.0/16 as well; 9.9.9.9/32 is a single host.
+    """
+    assert _parse("text", text) == [
+        Record("ip", "1.2.3.4"),
+        Record("ip", "5.6.7.8"),
+        Record("ip", "9.9.9.9"),
+    ]
+
+
+def test_ipsum_keeps_the_report_count_as_score():
+    text = "# IPsum Threat Intelligence Feed\n#\n\n45.148.10.121\t10\n1.2.3.4\t1\n"
+    assert _parse("ipsum", text) == [
+        Record("ip", "45.148.10.121", "10"),
+        Record("ip", "1.2.3.4", "1"),
+    ]
+
+
+def test_drop_keeps_networks_and_sbl_refs():
+    text = """; Spamhaus DROP List 2026/01/04
+; Last-Modified: Sun, 04 Jan 2026 00:00:00 GMT
+
+1.10.16.0/20 ; SBL256894
+2.56.0.0/9 ; SBL000001
+23.0.0.0/7 ; SBL000002
+10.0.0.0/8 ; SBL000003
+"""
+    assert _parse("drop", text) == [
+        Record("network", "1.10.16.0/20", "", "SBL256894"),
+        Record("network", "2.0.0.0/9", "", "SBL000001"),
+    ]
+
+
+def test_plain_cidr_list():
+    text = """# Emerging Threats block list
+
+1.19.0.0/16
+5.188.10.0/23   # spam
+45.0.0.0/15
+9.9.9.9/32
+192.168.0.0/16
+100.64.0.0/16
+bogus
+8.8.8.8
+"""
+    assert _parse("plain", text) == [
+        Record("network", "1.19.0.0/16"),
+        Record("network", "5.188.10.0/23"),
+        Record("ip", "9.9.9.9"),
+        Record("ip", "8.8.8.8"),
+    ]
+
+
+def test_json_feed_refs_and_no_networks():
+    doc = {
+        "items": [
+            {"title": "Botnet C2 at 5.6.7.8", "url": "https://example.com/a"},
+            {"content_text": "Range 45.0.0.0/16 abused", "id": "b"},
+            "not an item",
+        ]
+    }
+    assert _parse("json", json.dumps(doc)) == [
+        Record("ip", "5.6.7.8", "", "https://example.com/a")
+    ]
+    assert _parse("json", "not json") == []
+
+
+@pytest.mark.parametrize(
+    "token, min_prefix, expected",
+    [
+        ("1.2.3.4", None, Record("ip", "1.2.3.4")),
+        ("1.2.3.4/32", None, Record("ip", "1.2.3.4")),
+        ("1.2.3.77/24", 16, Record("network", "1.2.3.0/24")),
+        ("1.2.3.0/24", None, None),
+        ("1.2.0.0/15", fetch_blacklists.MIN_PREFIX_LEN, None),
+        (
+            "1.2.0.0/16",
+            fetch_blacklists.MIN_PREFIX_LEN,
+            Record("network", "1.2.0.0/16"),
+        ),
+        (
+            "2.0.0.0/8",
+            fetch_blacklists.DROP_MIN_PREFIX_LEN,
+            Record("network", "2.0.0.0/8"),
+        ),
+        ("2.0.0.0/7", fetch_blacklists.DROP_MIN_PREFIX_LEN, None),
+        ("0.0.0.0/0", 0, None),
+        ("1.2.3.0/33", 16, None),
+        ("1.2.3.0/x", 16, None),
+        ("256.1.1.1", None, None),
+    ],
+)
+def test_parse_entry(token, min_prefix, expected):
+    assert fetch_blacklists.parse_entry(token, min_prefix=min_prefix) == expected
+
+
+@pytest.mark.parametrize(
+    "cidr, public",
+    [
+        ("1.10.16.0/20", True),
+        ("10.1.0.0/16", False),
+        ("172.16.0.0/12", False),
+        ("192.168.1.0/24", False),
+        ("127.0.0.0/8", False),
+        ("169.254.0.0/16", False),
+        ("100.64.0.0/10", False),
+        ("198.51.100.0/24", False),
+        ("224.0.0.0/4", False),
+        # Overlapping reserved space is enough
+        ("172.0.0.0/8", False),
+        ("2a00:1450::/32", True),
+        ("2001:db8::/32", False),
+        ("fc00::/7", False),
+        ("::/0", False),
+    ],
+)
+def test_is_public_network(cidr, public):
+    assert is_public_network(cidr) is public
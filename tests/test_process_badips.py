@@ -0,0 +1,52 @@
+"""Severity ingestion from the per-source CSVs in `data/`."""
+
+import csv
+
+import fetch_blacklists
+import process_badips
+
+IPSUM = "# IPsum\n198.51.100.1\t1\n198.51.100.2\t10\n198.51.100.3\t60\n"
+
+
+def _write_summary(path, ips):
+    # As fetch_blacklists.main writes fetched_ips.csv and new_ips.csv
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["ip", "sources", "collected_at"])
+        for ip in ips:
+            w.writerow([ip, "stamparm_ipsum", "2026-01-04T00:00:00+00:00"])
+
+
+def test_ipsum_counts_set_severity_despite_summary_files(tmp_path):
+    fetch_blacklists.stream_source(
+        "stamparm_ipsum",
+        IPSUM.splitlines(),
+        tmp_path / "stamparm_ipsum.csv",
+        tmp_path / "stamparm_ipsum_networks.csv",
+        "ipsum",
+    )
+    listed = ["198.51.100.1", "198.51.100.2", "198.51.100.3"]
+    _write_summary(tmp_path / "fetched_ips.csv", listed)
+    _write_summary(tmp_path / "new_ips.csv", listed)
+
+    ips, networks = process_badips.load_source_csvs(tmp_path)
+    severity = dict(process_badips.merge_ips(ips))
+
+    assert networks == {}
+    assert severity["198.51.100.1"] < 3
+    assert severity == {"198.51.100.1": 1, "198.51.100.2": 2, "198.51.100.3": 5}
+
+
+def test_only_a_score_column_sets_severity(tmp_path):
+    headerless = tmp_path / "badip_list.csv"
+    headerless.write_text("198.51.100.1,60\n198.51.100.2\n", encoding="utf-8")
+    unscored = tmp_path / "feed.csv"
+    unscored.write_text(
+        "ip,collected_at,source\n198.51.100.3,60,feed\n", encoding="utf-8"
+    )
+
+    assert process_badips.load_ips_from_csv(str(headerless)) == [
+        ("198.51.100.1", 5),
+        ("198.51.100.2", 3),
+    ]
+    assert process_badips.load_ips_from_csv(str(unscored)) == [("198.51.100.3", 3)]
@@ -0,0 +1,98 @@
+"""Trigger-maintained rollups stay equal to a full recount through inserts,
+upserts, updates and deletes."""
+
+import random
+
+import process_badips
+import rollups
+
+GEO_UPSERT = """
+    INSERT INTO ip_geolocation
+    (ip_address, country, city, latitude, longitude, asn, ip_key)
+    SELECT ip_address, ?, ?, ?, ?, ?, ip_key FROM bad_ips WHERE ip_address = ?
+    ON CONFLICT(ip_address) DO UPDATE SET
+        country = excluded.country,
+        city = excluded.city,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        asn = excluded.asn
+"""
+COUNTRIES = ["US", "CN", "RU", "DE", None]
+CITIES = ["Springfield", "Berlin", None]
+ASNS = ["AS13335", "AS4134", None]
+
+
+def _geo_rows(rng, ips):
+    for ip in ips:
+        located = rng.random() < 0.8
+        yield (
+            rng.choice(COUNTRIES),
+            rng.choice(CITIES),
+            rng.uniform(-60, 60) if located else None,
+            rng.uniform(-180, 180) if located else None,
+            rng.choice(ASNS),
+            ip,
+        )
+
+
+def _readers(conn):
+    return (
+        rollups.severity_counts(conn),
+        rollups.country_counts(conn),
+        rollups.city_counts(conn),
+        rollups.asn_counts(conn),
+        rollups.geo_total(conn),
+    )
+
+
+def _check(conn):
+    assert rollups.verify(conn) == []
+    incremental = _readers(conn)
+    rollups.rebuild(conn)
+    assert _readers(conn) == incremental
+
+
+def test_rollups_track_every_kind_of_write(listed_db):
+    conn, listed = listed_db
+    rng = random.Random(5)
+    ips = list(listed)
+    assert rollups.available(conn)
+    _check(conn)
+
+    # Upsert listed addresses again (threat_count + 1) alongside new ones
+    process_badips.insert_ips_to_database(
+        conn, [(ip, 4) for ip in ips[:500]] + [("192.0.2.1", 4), ("192.0.2.2", 1)]
+    )
+    _check(conn)
+
+    # Insert geolocation for most addresses, then re-upsert some with new values
+    conn.executemany(GEO_UPSERT, _geo_rows(rng, ips[:1500]))
+    conn.commit()
+    _check(conn)
+    conn.executemany(GEO_UPSERT, _geo_rows(rng, rng.sample(ips[:1500], 400)))
+    conn.commit()
+    _check(conn)
+
+    # Plain updates, including to and from NULL and unwatched columns
+    conn.executemany(
+        "UPDATE bad_ips SET severity = ? WHERE ip_address = ?",
+        [(rng.choice([1, 5, None]), ip) for ip in rng.sample(ips, 300)],
+    )
+    conn.executemany(
+        "UPDATE ip_geolocation SET country = NULL, isp = 'x' WHERE ip_address = ?",
+        [(ip,) for ip in rng.sample(ips[:1500], 100)],
+    )
+    conn.commit()
+    _check(conn)
+
+    # Deletes that empty whole groups
+    conn.execute("DELETE FROM ip_geolocation WHERE country = 'DE'")
+    conn.execute("DELETE FROM bad_ips WHERE severity = 5")
+    conn.executemany(
+        "DELETE FROM ip_geolocation WHERE ip_address = ?",
+        [(ip,) for ip in rng.sample(ips[:1500], 200)],
+    )
+    conn.commit()
+    _check(conn)
+    assert all(country != "DE" for country, *_ in rollups.country_counts(conn))
+    assert all(severity != 5 for severity, _ in rollups.severity_counts(conn))